@@ -1,5 +1,6 @@
 import streamlit as st
 from hut_collection import HutCollection
+from spatial_index import parse_coordinates
 from datetime import datetime, date, timedelta
 import time
 import pickle
@@ -7,13 +8,11 @@ import pandas as pd
 import folium
 from streamlit_folium import st_folium
 import os
-import json
 
 # Storage constants
 DATA_DIR = "data"
-HUT_DATA_FILE = os.path.join(DATA_DIR, "hut_data.json")
-CACHE_METADATA_FILE = os.path.join(DATA_DIR, "cache_metadata.json")
-CACHE_DURATION = 3600  # 1 hour in seconds
+HUT_STORE_FILE = HutCollection.cache_file  # Shared with HutCollection and update_huts.py
+STALE_AFTER = 3600  # Refresh a hut's availability once it is older than 1 hour
 
 
 def format_availability(availability):
@@ -22,6 +21,19 @@ def format_availability(availability):
         return f"{availability.places} places available"
     return "No availability information"
 
+def format_data_age(seconds):
+    """Format how old a hut's data is, e.g. 'updated 5 min ago'"""
+    if seconds is None:
+        return "update time unknown"
+    if seconds < 60:
+        return "updated just now"
+    if seconds < 3600:
+        return f"updated {int(seconds // 60)} min ago"
+    if seconds < 48 * 3600:
+        return f"updated {int(seconds // 3600)} h ago"
+    return f"updated {int(seconds // 86400)} days ago"
+
+@st.cache_resource  # One collection, background worker and refresh schedule shared by all reruns and sessions
 def get_hut_collection():
     """
     Get the HutCollection object, either from cache or by creating a new one.
@@ -32,35 +44,10 @@ def get_hut_collection():
     os.makedirs(DATA_DIR, exist_ok=True)
     
     # Check if we have a cached version
-    if os.path.exists(HUT_DATA_FILE) and os.path.exists(CACHE_METADATA_FILE):
+    if os.path.exists(HUT_STORE_FILE):
         try:
-            # Check cache metadata to see if it's still valid
-            with open(CACHE_METADATA_FILE, 'r') as f:
-                metadata = json.load(f)
-                last_update = metadata.get('timestamp', 0)
-                current_time = time.time()
-                
-                # If cache is still valid, load from it
-                if current_time - last_update < CACHE_DURATION:
-                    # Create a new HutCollection with background updates
-                    hut_collection = HutCollection(use_cache=True, background_updates=True)
-                    
-                    # Load the cached hut data
-                    with open(HUT_DATA_FILE, 'r') as f:
-                        hut_data = json.load(f)
-                        
-                        # If the hut_collection doesn't have any huts yet, load them from cache
-                        if not hut_collection.huts and hut_data:
-                            print(f"Loading {len(hut_data)} huts from JSON cache")
-                            # You might need to implement a method in HutCollection to load from JSON
-                            # For now, we'll return the collection and let background updates handle it
-                    
-                    return hut_collection
-            
-            # If we get here, cache is expired or metadata is missing
-            print("Cache expired, updating hut collection")
-            return update_hut_collection()
-            
+            # Staleness is decided per hut: the background updates only refresh huts older than STALE_AFTER
+            return HutCollection(use_cache=True, background_updates=True, lazy=True)
         except Exception as e:
             st.sidebar.error(f"Error loading cached data: {e}")
             return update_hut_collection()
@@ -77,7 +64,7 @@ def update_hut_collection():
     """
     try:
         # Create a new HutCollection with background updates enabled
-        hut_collection = HutCollection(use_cache=True, background_updates=True)
+        hut_collection = HutCollection(use_cache=True, background_updates=True, lazy=True)
         
         # Save to cache
         save_huts_to_cache(hut_collection)
@@ -90,51 +77,12 @@ def update_hut_collection():
 
 def save_huts_to_cache(hut_collection):
     """
-    Save the HutCollection to cache files
+    Save the HutCollection to the hut store
     Args:
         hut_collection: HutCollection object to save
     """
-    try:
-        # Create data directory if it doesn't exist
-        os.makedirs(DATA_DIR, exist_ok=True)
-        
-        # Save hut data in a serializable format
-        hut_data = {}
-        for name, hut in hut_collection.huts.items():
-            # Convert each hut to a dictionary with essential data
-            hut_dict = {
-                "name": hut.name,
-                "id": hut.id,
-                "coordinates": hut.coordinates,
-                "website": hut.website,
-                "img_url": hut.img_url,
-                "availability": []
-            }
-            
-            # Add availability data
-            for avail in hut.availability:
-                hut_dict["availability"].append({
-                    "date": avail.get_iso_date(),
-                    "places": avail.places
-                })
-            
-            hut_data[name] = hut_dict
-        
-        # Save the actual hut data instead of just a placeholder
-        with open(HUT_DATA_FILE, 'w') as f:
-            json.dump(hut_data, f, indent=2)
-        
-        # Update metadata with current timestamp
-        with open(CACHE_METADATA_FILE, 'w') as f:
-            metadata = {
-                "timestamp": time.time(),
-                "version": "1.0",
-                "hut_count": len(hut_collection.huts)
-            }
-            json.dump(metadata, f, indent=2)
-            
-    except Exception as e:
-        st.sidebar.error(f"Error saving to cache: {e}")
+    if not hut_collection.save(HUT_STORE_FILE):
+        st.sidebar.error("Error saving to cache, see hut_scraping.log")
 
 def main():
     st.title("Are there places in SAC huts available?")
@@ -142,9 +90,10 @@ def main():
     # Initialize or load hut collection
     hut_collection = get_hut_collection()
     hut_collection.background_updates = True
-    hut_collection.update_interval = 3600 * 2  # every 2 hours
+    hut_collection.update_interval = 3600 * 2  # look for new huts every 2 hours; known huts follow the refresh schedule
+    hut_collection.stale_after = STALE_AFTER
     hut_collection.start_background_updates()
-    save_huts_to_cache(hut_collection)
+    # The collection saves itself after every parse and refresh, so reruns do not write the store
     
     # Get all huts for comparison
     all_huts = hut_collection.huts if hasattr(hut_collection, 'huts') else {}
@@ -166,13 +115,14 @@ def main():
         # Try to reinitialize
         if st.button("Attempt to reinitialize hut collection"):
             # Force a fresh update
-            if os.path.exists(HUT_DATA_FILE):
-                os.remove(HUT_DATA_FILE)
-            if os.path.exists(CACHE_METADATA_FILE):
-                os.remove(CACHE_METADATA_FILE)
+            for cache_file in (HUT_STORE_FILE, HutCollection.legacy_cache_file):
+                if os.path.exists(cache_file):
+                    os.remove(cache_file)
             st.info("Cache files deleted")
             
-            hut_collection = update_hut_collection()
+            hut_collection.stop_background_updates()
+            # The rerun builds the new collection through the cache, which then owns its worker
+            get_hut_collection.clear()
             st.experimental_rerun()
         return
 
@@ -196,6 +146,8 @@ def main():
     except Exception as e:
         st.sidebar.error(f"Error getting available huts: {e}")
         available_huts = []
+    # Places per hut from the matrix column, so drawing the map does not load every hut's series
+    places_by_name = {hut.name: avail.places for hut, avail in available_huts}
     
     # Create map data for all huts
     map_data = []
@@ -206,28 +158,14 @@ def main():
         
         for hut in huts_to_process:
             try:
-                # Skip huts without valid coordinates
-                if not hasattr(hut, 'coordinates') or not hut.coordinates:
-                    continue
-                
-                # Handle different coordinate formats (comma or slash separator)
-                if ',' in hut.coordinates:
-                    lat, lon = map(float, hut.coordinates.split(','))
-                elif '/' in hut.coordinates:
-                    lat, lon = map(float, hut.coordinates.split('/'))
-                else:
-                    # Skip if coordinates don't have a recognized separator
+                # Skip huts without valid coordinates (comma or slash separated)
+                point = parse_coordinates(getattr(hut, 'coordinates', None))
+                if point is None:
                     continue
+                lat, lon = point
                     
-                # Get availability for this hut on the selected date
-                avail = None
-                try:
-                    avail = hut.get_availability_for_date(date_str)
-                except Exception as e:
-                    # Silently continue if availability can't be determined
-                    pass
-                
-                places = avail.places if avail else 0
+                # Availability for this hut on the selected date (0 if unknown)
+                places = places_by_name.get(getattr(hut, 'name', None), 0)
                 
                 map_data.append({
                     "lat": lat,
@@ -281,6 +219,7 @@ def main():
                     popup_content += f"<br>{row['availability']} places available"
                 else:
                     popup_content += "<br>Not available for selected date"
+                popup_content += f"<br><small>{format_data_age(hut_collection.data_age(row['name']))}</small>"
                 
                 # Add website link if available
                 if hut_obj and hasattr(hut_obj, 'website') and hut_obj.website:
@@ -320,7 +259,13 @@ def main():
                 ).add_to(m)
             
             # Display the map with explicit width and height
-            st_folium(m, width=800, height=600, returned_objects=[])
+            map_state = st_folium(m, width=800, height=600, returned_objects=["last_object_clicked_tooltip"])
+            # A clicked marker (its tooltip is the hut name) is someone looking at that hut:
+            # the refresh schedule keeps huts people look at fresher
+            clicked = (map_state or {}).get("last_object_clicked_tooltip")
+            if clicked and clicked != st.session_state.get("last_clicked_hut"):
+                st.session_state["last_clicked_hut"] = clicked
+                hut_collection.record_demand(clicked)
         else:
             st.warning("No huts found with valid location data")
     else:
@@ -0,0 +1,414 @@
+import logging
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from array import array
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; appends are then only safe from a single process
+    fcntl = None
+
+from availability_series import AvailabilitySeries, MISSING
+from availability_matrix import to_ordinal
+
+
+CHECKPOINT = 1  # Record holding a hut's whole series
+DELTA = 2  # Record holding only the cells that changed since the previous record of the hut
+# kind, timestamp, name length, base ordinal, number of cells
+RECORD_HEADER = struct.Struct("<BdHiI")
+CRC = struct.Struct("<I")
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".log"
+SEGMENT_NUMBER = re.compile(re.escape(SEGMENT_PREFIX) + r'(\d+)' + re.escape(SEGMENT_SUFFIX) + '$')
+LOCK_FILE = "history.lock"
+
+
+def _timestamp(value):
+    """Unix timestamp of a datetime or number (None means now)"""
+    if value is None:
+        return time.time()
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return float(value)
+
+
+def _dense(series, first, last):
+    """int16 array of a series over the ordinals first..last, MISSING where it has no data"""
+    values = np.full(last - first + 1, MISSING, dtype=np.int16)
+    if len(series.values):
+        start = series.base_ordinal - first
+        values[start:start + len(series.values)] = np.frombuffer(series.values, dtype=np.int16)
+    return values
+
+
+def _materialize(records):
+    """Series after a checkpoint record and the delta records that followed it"""
+    records = [record for record in records if len(record[2])]
+    if not records:
+        return AvailabilitySeries()
+    first = min(int(base_ordinal) + int(offsets[0]) for _, base_ordinal, offsets, _ in records)
+    last = max(int(base_ordinal) + int(offsets[-1]) for _, base_ordinal, offsets, _ in records)
+    dense = np.full(last - first + 1, MISSING, dtype=np.int16)
+    for _, base_ordinal, offsets, values in records:
+        dense[base_ordinal - first + offsets.astype(np.int64)] = values
+    known = np.flatnonzero(dense != MISSING)
+    if not len(known):
+        return AvailabilitySeries()
+    values = array('h')
+    values.frombytes(dense[known[0]:known[-1] + 1].tobytes())
+    return AvailabilitySeries(first + int(known[0]), values)
+
+
+def _apply(state, kind, base_ordinal, offsets, values):
+    """Apply one record to a hut's state (dict ordinal -> places)"""
+    if kind == CHECKPOINT:
+        state.clear()
+    for offset, places in zip(offsets.tolist(), values.tolist()):
+        if places == MISSING:
+            state.pop(base_ordinal + offset, None)
+        else:
+            state[base_ordinal + offset] = places
+
+
+class AvailabilityHistory:
+    """
+    Append-only log of how the availability of every hut changed over time.
+
+    Each save appends, per hut, only the cells that changed since the previous
+    save (a delta record); every checkpoint_every records, and at the start of
+    every segment file, the hut's whole series is written instead (a checkpoint).
+    Because each segment starts with checkpoints of all huts, a query as of some
+    time only replays the one segment that covers it. Every record carries a
+    CRC, so a record torn by a crash is ignored on read.
+
+    Several processes may append to the same directory: appends hold an
+    exclusive flock on LOCK_FILE, and before computing its deltas a writer
+    first reads the records the others appended since it last looked.
+    """
+
+    def __init__(self, directory, segment_max_bytes=4 * 1024 * 1024, checkpoint_every=50, fsync=True):
+        """
+        Args:
+            directory: Directory holding the segment files
+            segment_max_bytes: Size after which a new segment is started
+            checkpoint_every: Records per hut between two checkpoints
+            fsync: Flush every save to disk before returning
+        """
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.checkpoint_every = checkpoint_every
+        self.fsync = fsync
+        self.logger = logging.getLogger('AvailabilityHistory')
+        self._lock = threading.Lock()
+        self._latest = {}  # name -> AvailabilitySeries last written
+        self._pending = {}  # name -> records since its last checkpoint, not yet turned into a series
+        self._updated_at = {}  # name -> timestamp of the last record of the hut
+        self._since_checkpoint = {}  # name -> delta records since the last checkpoint
+        self._segments = []  # [(timestamp of the first record, path)], oldest first
+        self._indexed_end = 0  # Bytes of the newest segment read into the state above
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _segment_paths(self):
+        names = sorted(name for name in os.listdir(self.directory)
+                       if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX))
+        return [os.path.join(self.directory, name) for name in names]
+
+    @contextmanager
+    def _file_lock(self):
+        """Hold the lock that serializes appends across processes"""
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, LOCK_FILE), 'a+b') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _load(self):
+        """
+        Find the segments and index the records of the newest one.
+
+        The series of a hut is only built from its records when it is needed,
+        so opening a large history costs one scan of the newest segment. A torn
+        tail is cut off, so later appends stay readable.
+        """
+        with self._lock, self._file_lock():
+            self._sync(repair=True)
+        self.logger.info(f"Loaded availability history of {len(self._updated_at)} huts from {len(self._segments)} segments")
+
+    def _index(self, kind, timestamp, name, base_ordinal, offsets, values):
+        """Add one record of the newest segment to the state (caller holds the lock)"""
+        if kind == CHECKPOINT:
+            self._pending[name] = []
+            self._since_checkpoint[name] = 0
+        else:
+            if name not in self._pending and name in self._latest:
+                # Continue from the series already built for this hut
+                latest = self._latest[name]
+                self._pending[name] = [(CHECKPOINT, latest.base_ordinal, np.arange(len(latest.values), dtype=np.uint32),
+                                        np.frombuffer(latest.values, dtype=np.int16))]
+            self._since_checkpoint[name] = self._since_checkpoint.get(name, 0) + 1
+        self._pending.setdefault(name, []).append((kind, base_ordinal, offsets, values))
+        self._updated_at[name] = timestamp
+
+    def _sync(self, repair=False):
+        """
+        Catch up with the records appended since the state was last read, e.g. by another process
+        (caller holds the lock)
+        Args:
+            repair: Cut off a torn tail and remove segments without a complete record; only
+                    with the file lock held, when no other process can be halfway through an append
+        """
+        paths = self._segment_paths()
+        newest = self._segments[-1][1] if self._segments else None
+        # Another writer may have removed a segment it found torn
+        self._segments = [(first, path) for first, path in self._segments if path in paths]
+        known = {path for _, path in self._segments}
+        for path in paths:
+            if path in known:
+                continue
+            with open(path, 'rb') as f:
+                header = f.read(RECORD_HEADER.size)
+            if len(header) == RECORD_HEADER.size:
+                self._segments.append((RECORD_HEADER.unpack(header)[1], path))
+            elif repair:
+                os.remove(path)
+        while self._segments:
+            path = self._segments[-1][1]
+            if path != newest:
+                # A new segment starts with checkpoints of all huts, so it replaces the whole state
+                self._latest.clear()
+                self._pending.clear()
+                self._updated_at.clear()
+                self._since_checkpoint.clear()
+                self._indexed_end = 0
+                newest = path
+            for self._indexed_end, record in self._scan(path, self._indexed_end):
+                self._index(*record)
+            if self._indexed_end:
+                if repair and self._indexed_end < os.path.getsize(path):
+                    with open(path, 'r+b') as f:
+                        f.truncate(self._indexed_end)
+                break
+            if not repair:
+                break
+            # Not a single complete record: the segment was torn while it was started
+            os.remove(path)
+            self._segments.pop()
+
+    def _series(self, name):
+        """Latest series of a hut, built from its pending records if needed (caller holds the lock)"""
+        records = self._pending.pop(name, None)
+        if records:
+            self._latest[name] = _materialize(records)
+        return self._latest.get(name)
+
+    def _read_records(self, path):
+        """Yield (kind, timestamp, name, base ordinal, offsets, values) of a segment, stopping at a torn record"""
+        for _, record in self._scan(path):
+            yield record
+
+    def _scan(self, path, start=0):
+        """Yield (end position, record) of a segment from byte start, stopping at a torn record"""
+        with open(path, 'rb') as f:
+            data = f.read()
+        position = start
+        while position + RECORD_HEADER.size <= len(data):
+            kind, timestamp, name_length, base_ordinal, count = RECORD_HEADER.unpack_from(data, position)
+            start = position + RECORD_HEADER.size
+            cells = start + name_length
+            offsets_size = count * 4 if kind == DELTA else 0
+            end = cells + offsets_size + count * 2
+            if end + CRC.size > len(data) or CRC.unpack_from(data, end)[0] != zlib.crc32(data[position:end]):
+                self.logger.warning(f"Ignoring torn record at byte {position} of {path}")
+                return
+            name = data[start:cells].decode('utf-8')
+            if kind == DELTA:
+                offsets = np.frombuffer(data, dtype='<u4', count=count, offset=cells)
+            else:
+                offsets = np.arange(count, dtype=np.uint32)
+            values = np.frombuffer(data, dtype='<i2', count=count, offset=cells + offsets_size)
+            position = end + CRC.size
+            yield position, (kind, timestamp, name, base_ordinal, offsets, values)
+
+    @staticmethod
+    def _encode(kind, timestamp, name, base_ordinal, offsets, values):
+        name_bytes = name.encode('utf-8')
+        record = b"".join((
+            RECORD_HEADER.pack(kind, timestamp, len(name_bytes), base_ordinal, len(values)),
+            name_bytes,
+            offsets.astype('<u4').tobytes() if kind == DELTA else b"",
+            values.astype('<i2').tobytes(),
+        ))
+        return record + CRC.pack(zlib.crc32(record))
+
+    def _checkpoint(self, timestamp, name, series):
+        values = np.frombuffer(series.values, dtype=np.int16) if len(series.values) else np.empty(0, dtype=np.int16)
+        return self._encode(CHECKPOINT, timestamp, name, series.base_ordinal, None, values)
+
+    def _record_hut(self, timestamp, name, series):
+        """Encode the change of one hut, or return None if nothing changed (caller holds the lock)"""
+        previous = self._series(name)
+        if previous is None or self._since_checkpoint.get(name, 0) + 1 >= self.checkpoint_every:
+            if previous is not None and previous.base_ordinal == series.base_ordinal \
+                    and previous.values == series.values:
+                return None
+            self._since_checkpoint[name] = 0
+            return self._checkpoint(timestamp, name, series)
+        spans = [(s.base_ordinal, s.base_ordinal + len(s.values) - 1) for s in (previous, series) if len(s.values)]
+        if not spans:
+            return None
+        first, last = min(start for start, _ in spans), max(end for _, end in spans)
+        new_values = _dense(series, first, last)
+        changed = np.flatnonzero(_dense(previous, first, last) != new_values)
+        if not len(changed):
+            return None
+        self._since_checkpoint[name] += 1
+        return self._encode(DELTA, timestamp, name, first, changed, new_values[changed])
+
+    def record(self, huts, timestamp=None):
+        """
+        Append the changes of a collection since its last save
+        Args:
+            huts: Dictionary mapping hut names to Hut objects
+            timestamp: Time of the observation (datetime or Unix timestamp, default now)
+        Returns:
+            Number of bytes appended
+        """
+        timestamp = _timestamp(timestamp)
+        current = {name: AvailabilitySeries.from_availability(hut.availability) for name, hut in list(huts.items())}
+        with self._lock, self._file_lock():
+            # Deltas must be computed against what is in the file, including other writers' records
+            self._sync(repair=True)
+            records = []
+            new_segment = not self._segments or os.path.getsize(self._segments[-1][1]) >= self.segment_max_bytes
+            if new_segment:
+                # Every segment starts with checkpoints of all huts, so it can be replayed on its own
+                latest = {name: self._series(name) for name in self._updated_at}
+                latest.update(current)
+                for name, series in latest.items():
+                    records.append(self._checkpoint(timestamp, name, series))
+                    self._since_checkpoint[name] = 0
+                changed = latest
+            else:
+                changed = {}
+                for name, series in current.items():
+                    record = self._record_hut(timestamp, name, series)
+                    if record is not None:
+                        records.append(record)
+                        changed[name] = series
+            if not records:
+                return 0
+            if new_segment:
+                number = int(SEGMENT_NUMBER.search(self._segments[-1][1]).group(1)) + 1 if self._segments else 1
+                path = os.path.join(self.directory, f"{SEGMENT_PREFIX}{number:06d}{SEGMENT_SUFFIX}")
+                self._segments.append((timestamp, path))
+            data = b"".join(records)
+            with open(self._segments[-1][1], 'ab') as f:
+                f.write(data)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+                self._indexed_end = f.tell()
+            for name, series in changed.items():
+                self._latest[name] = series
+                self._updated_at[name] = timestamp
+        return len(data)
+
+    def latest(self, name):
+        """
+        Last recorded series of a hut
+        Returns:
+            Tuple (AvailabilitySeries, timestamp of the record), or None if the hut was never recorded
+        """
+        with self._lock:
+            self._sync()
+            if name not in self._updated_at:
+                return None
+            return self._series(name), self._updated_at[name]
+
+    def updated_since(self, timestamp):
+        """Names of the huts with a record newer than timestamp"""
+        with self._lock:
+            self._sync()
+            return [name for name, updated_at in self._updated_at.items() if updated_at > timestamp]
+
+    def _replay(self, name, as_of):
+        """Yield (timestamp, state) of a hut after each of its records up to as_of, from the covering segment"""
+        with self._lock:
+            segments = list(self._segments)
+        covering = [path for first, path in segments if first <= as_of]
+        if not covering:
+            return
+        state = {}
+        for kind, timestamp, record_name, base_ordinal, offsets, values in self._read_records(covering[-1]):
+            if timestamp > as_of:
+                break
+            if record_name == name:
+                _apply(state, kind, base_ordinal, offsets, values)
+                yield timestamp, state
+
+    def series_as_of(self, name, as_of):
+        """
+        Series of a hut as it was known at a point in time
+        Args:
+            name: Hut name
+            as_of: datetime or Unix timestamp
+        Returns:
+            AvailabilitySeries (empty if the hut was not recorded yet)
+        """
+        state = {}
+        for _, state in self._replay(name, _timestamp(as_of)):
+            pass
+        return AvailabilitySeries.from_pairs(state.items())
+
+    def places_as_of(self, name, target_date, as_of):
+        """
+        Places of a hut on a date as they were known at a point in time
+        Args:
+            name: Hut name
+            target_date: Date string in YYYY-MM-DD format or datetime.date object
+            as_of: datetime or Unix timestamp
+        Returns:
+            Number of places, or None if there was no data for that day
+        """
+        ordinal = to_ordinal(target_date)
+        places = None
+        for _, state in self._replay(name, _timestamp(as_of)):
+            places = state.get(ordinal)
+        return places
+
+    def changes(self, name, target_date):
+        """
+        How the places of a hut on one date changed over time, e.g. to see how fast it fills up
+        Args:
+            name: Hut name
+            target_date: Date string in YYYY-MM-DD format or datetime.date object
+        Returns:
+            List of (datetime, places) tuples, oldest first; places is None while the day had no data
+        """
+        ordinal = to_ordinal(target_date)
+        with self._lock:
+            paths = [path for _, path in self._segments]
+        result = []
+        for path in paths:
+            state = {}
+            for kind, timestamp, record_name, base_ordinal, offsets, values in self._read_records(path):
+                if record_name != name:
+                    continue
+                _apply(state, kind, base_ordinal, offsets, values)
+                places = state.get(ordinal)
+                if not result or result[-1][1] != places:
+                    result.append((datetime.fromtimestamp(timestamp), places))
+        return result
@@ -0,0 +1,269 @@
+import threading
+from datetime import date, datetime
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from availability_series import AvailabilitySeries, MISSING
+
+
+def to_ordinal(target_date):
+    """Convert a YYYY-MM-DD string, datetime or date to a date ordinal"""
+    if isinstance(target_date, str):
+        try:
+            target_date = date.fromisoformat(target_date)
+        except ValueError:
+            raise ValueError(f"Invalid date format. Please use YYYY-MM-DD: {target_date}")
+    elif isinstance(target_date, datetime):
+        target_date = target_date.date()
+    return target_date.toordinal()
+
+
+class AvailabilityMatrix:
+    """
+    Dense huts x days matrix of free places for collection-wide queries.
+
+    Row r holds the hut hut_names[r], column c the day base_ordinal + c.
+    Days without data are MISSING. The matrix grows as huts and days are
+    added, and a single hut can be replaced without touching the other rows.
+    """
+
+    def __init__(self, initial_rows=64, initial_days=365):
+        """
+        Args:
+            initial_rows: Number of hut rows allocated up front
+            initial_days: Number of day columns allocated up front
+        """
+        self.places = np.full((initial_rows, initial_days), MISSING, dtype=np.int16)
+        self.base_ordinal = None
+        self.hut_names = []
+        self.row_of = {}
+        self._free_rows = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.row_of)
+
+    def _ensure_days(self, first, last):
+        """Grow or shift the columns so the ordinals first..last fit (caller holds the lock)"""
+        if self.base_ordinal is None:
+            self.base_ordinal = first
+        rows, days = self.places.shape
+        new_base = min(self.base_ordinal, first)
+        needed = max(self.base_ordinal + days, last + 1) - new_base
+        if new_base == self.base_ordinal and needed <= days:
+            return
+        # Over-allocate so a rolling horizon does not reallocate every day
+        grown = np.full((rows, max(needed, days * 2)), MISSING, dtype=np.int16)
+        shift = self.base_ordinal - new_base
+        grown[:, shift:shift + days] = self.places
+        self.places = grown
+        self.base_ordinal = new_base
+
+    def _row_for(self, name):
+        """Row of a hut, allocating one if it is new (caller holds the lock)"""
+        row = self.row_of.get(name)
+        if row is not None:
+            return row
+        if self._free_rows:
+            row = self._free_rows.pop()
+            self.hut_names[row] = name
+        else:
+            row = len(self.hut_names)
+            self.hut_names.append(name)
+            if row >= self.places.shape[0]:
+                grown = np.full((max(row * 2, 1), self.places.shape[1]), MISSING, dtype=np.int16)
+                grown[:row] = self.places
+                self.places = grown
+        self.row_of[name] = row
+        return row
+
+    def adopt(self, names, base_ordinal, places):
+        """
+        Use an existing huts x days block, e.g. the memory-mapped block of a hut store, without copying it
+        Args:
+            names: Hut name of every row
+            base_ordinal: Date ordinal of column 0
+            places: int16 array of shape (len(names), days); must be writable, e.g. a copy-on-write memmap
+        """
+        with self._lock:
+            self.places = places
+            self.base_ordinal = base_ordinal if places.shape[1] else None
+            self.hut_names = list(names)
+            self.row_of = {name: row for row, name in enumerate(self.hut_names)}
+            self._free_rows = []
+
+    def update_hut(self, name, hut_availability):
+        """
+        Replace the row of one hut
+        Args:
+            name: Hut name (the key in HutCollection.huts)
+            hut_availability: AvailabilitySeries or iterable of availability objects
+        Returns:
+            Sorted list of the date ordinals whose places changed (for a new hut: all days
+            with data); empty, so false, if nothing changed
+        """
+        if isinstance(hut_availability, AvailabilitySeries):
+            return self._update_from_series(name, hut_availability)
+        days = [(avail.date.toordinal(), avail.places) for avail in hut_availability]
+        with self._lock:
+            is_new = name not in self.row_of
+            row = self._row_for(name)
+            previous = self.places[row].copy()
+            self.places[row] = MISSING
+            if days:
+                ordinals = np.fromiter((day for day, _ in days), dtype=np.int64, count=len(days))
+                values = np.fromiter((places for _, places in days), dtype=np.int64, count=len(days))
+                shift = self.base_ordinal
+                self._ensure_days(int(ordinals.min()), int(ordinals.max()))
+                previous = self._shifted(previous, shift)
+                self.places[row, ordinals - self.base_ordinal] = np.clip(values, 0, np.iinfo(np.int16).max)
+            return self._changed_days(previous, row, is_new)
+
+    def _changed_days(self, previous, row, is_new):
+        """Date ordinals where a row differs from its previous values (caller holds the lock)"""
+        current = self.places[row]
+        changed = current != MISSING if is_new else previous != current
+        return [self.base_ordinal + int(column) for column in np.flatnonzero(changed)]
+
+    def _shifted(self, row_values, old_base):
+        """A row copied before _ensure_days, laid out on the current columns (caller holds the lock)"""
+        days = self.places.shape[1]
+        if old_base == self.base_ordinal and len(row_values) == days:
+            return row_values
+        shifted = np.full(days, MISSING, dtype=np.int16)
+        if old_base is not None:
+            start = old_base - self.base_ordinal
+            shifted[start:start + len(row_values)] = row_values
+        return shifted
+
+    def _update_from_series(self, name, series):
+        """Copy a hut's series into its row with one slice assignment; returns the changed date ordinals"""
+        values = np.frombuffer(series.values, dtype=np.int16) if len(series.values) else None
+        with self._lock:
+            is_new = name not in self.row_of
+            row = self._row_for(name)
+            previous = self.places[row].copy()
+            self.places[row] = MISSING
+            if values is not None:
+                first = series.base_ordinal
+                shift = self.base_ordinal
+                self._ensure_days(first, first + len(values) - 1)
+                previous = self._shifted(previous, shift)
+                start = first - self.base_ordinal
+                self.places[row, start:start + len(values)] = values
+            return self._changed_days(previous, row, is_new)
+
+    def remove_hut(self, name):
+        """Drop the row of a hut; the row is reused by the next new hut"""
+        with self._lock:
+            row = self.row_of.pop(name, None)
+            if row is None:
+                return
+            self.places[row] = MISSING
+            self.hut_names[row] = None
+            self._free_rows.append(row)
+
+    def rebuild(self, huts):
+        """
+        Build the matrix from scratch
+        Args:
+            huts: Dictionary mapping hut names to Hut objects
+        """
+        with self._lock:
+            self.places = np.full((max(len(huts), 1), self.places.shape[1]), MISSING, dtype=np.int16)
+            self.base_ordinal = None
+            self.hut_names = []
+            self.row_of = {}
+            self._free_rows = []
+        for name, hut in huts.items():
+            self.update_hut(name, hut.availability)
+
+    def places_on(self, target_date):
+        """
+        Places of every row on one day
+        Args:
+            target_date: Date string in YYYY-MM-DD format or datetime.date object
+        Returns:
+            int16 array with one entry per row (MISSING where unknown)
+        """
+        ordinal = to_ordinal(target_date)
+        with self._lock:
+            rows = len(self.hut_names)
+            if self.base_ordinal is None:
+                return np.full(rows, MISSING, dtype=np.int16)
+            column = ordinal - self.base_ordinal
+            if not 0 <= column < self.places.shape[1]:
+                return np.full(rows, MISSING, dtype=np.int16)
+            return self.places[:rows, column].copy()
+
+    def huts_with_min_places(self, target_date, min_places=1, sort=False):
+        """
+        Find the huts with at least min_places free on a day
+        Args:
+            target_date: Date string in YYYY-MM-DD format or datetime.date object
+            min_places: Minimum number of places needed
+            sort: Order the result by places, most first
+        Returns:
+            List of (hut name, places) tuples
+        """
+        column = self.places_on(target_date)
+        rows = np.flatnonzero(column >= max(min_places, 0))
+        if sort:
+            rows = rows[np.argsort(-column[rows].astype(np.int32), kind='stable')]
+        names = self.hut_names
+        return [(names[row], int(column[row])) for row in rows]
+
+    def window_minimum(self, first_start, last_start, num_nights):
+        """
+        Minimum places over every window of num_nights consecutive nights
+        Args:
+            first_start: First start date (YYYY-MM-DD string or datetime.date)
+            last_start: Last start date, inclusive
+            num_nights: Number of consecutive nights per window
+        Returns:
+            int16 array of shape (rows, start dates); MISSING if any night lacks data
+        """
+        first = to_ordinal(first_start)
+        starts = to_ordinal(last_start) - first + 1
+        with self._lock:
+            rows = len(self.hut_names)
+            if starts <= 0 or num_nights < 1:
+                return np.empty((rows, 0), dtype=np.int16)
+            span = starts + num_nights - 1
+            block = np.full((rows, span), MISSING, dtype=np.int16)
+            if self.base_ordinal is not None:
+                low = max(first, self.base_ordinal)
+                high = min(first + span, self.base_ordinal + self.places.shape[1])
+                if low < high:
+                    block[:, low - first:high - first] = self.places[:rows, low - self.base_ordinal:high - self.base_ordinal]
+        return sliding_window_view(block, num_nights, axis=1).min(axis=2)
+
+    def huts_with_consecutive_places(self, first_start, last_start, num_nights, min_places=1):
+        """
+        Find, per hut, the start dates from which every night of a stay has enough places
+        Args:
+            first_start: First start date (YYYY-MM-DD string or datetime.date)
+            last_start: Last start date, inclusive
+            num_nights: Number of consecutive nights
+            min_places: Minimum number of places needed every night
+        Returns:
+            List of (hut name, list of start dates) tuples for huts with at least one start date
+        """
+        first = to_ordinal(first_start)
+        minimum = self.window_minimum(first_start, last_start, num_nights)
+        rows, starts = np.nonzero(minimum >= max(min_places, 0))
+        result = {}
+        for row, start in zip(rows.tolist(), starts.tolist()):
+            result.setdefault(row, []).append(date.fromordinal(first + start))
+        names = self.hut_names
+        return [(names[row], start_dates) for row, start_dates in result.items()]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
@@ -0,0 +1,246 @@
+from array import array
+from datetime import datetime, date
+import calendar
+import re
+
+
+MISSING = -1  # Places value of a day without data
+MAX_PLACES = 32767  # Largest value an array('h') slot holds
+
+_ISO_DATE = re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})$')  # 2024-03-21
+_DOTTED_DATE = re.compile(r'(\d{1,2})\.(\d{1,2})\.(\d{4})$')  # 21.03.2024
+_SLASHED_DATE = re.compile(r'(\d{1,2})/(\d{1,2})/(\d{4})$')  # 21/03/2024
+_MONTH_NAME_DATE = re.compile(r'([^\W\d_]+)\s+(\d{1,2}),\s+(\d{4})$')  # March 21, 2024
+
+# Lower-case month name -> month number; names of other locales are added as strptime resolves them
+_MONTH_NUMBERS = {name.lower(): number for number, name in enumerate(calendar.month_name) if name}
+
+
+def _month_number(name):
+    """Look up a month name, asking strptime (and remembering the answer) for unknown ones"""
+    key = name.lower()
+    number = _MONTH_NUMBERS.get(key)
+    if number is None:
+        number = datetime.strptime(name, "%B").month
+        _MONTH_NUMBERS[key] = number
+    return number
+
+
+def _parse_numeric(pattern, year_group, month_group, day_group):
+    def parse(text):
+        match = pattern.match(text)
+        if match is None:
+            raise ValueError(text)
+        return date(int(match.group(year_group)), int(match.group(month_group)), int(match.group(day_group)))
+    return parse
+
+
+def _parse_month_name(text):
+    match = _MONTH_NAME_DATE.match(text)
+    if match is None:
+        raise ValueError(text)
+    return date(int(match.group(3)), _month_number(match.group(1)), int(match.group(2)))
+
+
+# Same formats, in the same order, as availability used to try with strptime
+_DATE_PARSERS = [
+    _parse_numeric(_ISO_DATE, 1, 2, 3),
+    _parse_numeric(_DOTTED_DATE, 3, 2, 1),
+    _parse_numeric(_SLASHED_DATE, 3, 2, 1),
+    _parse_month_name,
+]
+
+
+class DateParser:
+    """
+    Parser for the date strings of one source, e.g. the aria-labels of one calendar.
+
+    The format that matched last is tried first, so a run of dates in the same
+    format costs one regex match each instead of a series of failing strptime calls.
+    """
+
+    def __init__(self):
+        self._format = None  # Index into _DATE_PARSERS of the last format that matched
+
+    def parse(self, text):
+        """
+        Parse a date string
+        Args:
+            text: Date in one of the formats 2024-03-21, 21.03.2024, 21/03/2024 or March 21, 2024
+        Returns:
+            datetime.date
+        """
+        if self._format is not None:
+            try:
+                return _DATE_PARSERS[self._format](text)
+            except ValueError:
+                pass
+        for index, parse in enumerate(_DATE_PARSERS):
+            try:
+                parsed = parse(text)
+            except ValueError:
+                continue
+            self._format = index
+            return parsed
+        raise ValueError(f"Unable to parse date: {text}")
+
+    def ordinal(self, value):
+        """Date ordinal of a date string, datetime, date or an ordinal passed through as is"""
+        if isinstance(value, int):
+            return value
+        if isinstance(value, str):
+            value = self.parse(value)
+        elif isinstance(value, datetime):
+            value = value.date()
+        return value.toordinal()
+
+
+_default_parser = DateParser()
+_date_from_ordinal = date.fromordinal
+
+
+class availability:
+    __slots__ = ('date', 'places')
+
+    def __init__(self, date, places):
+        # Convert date string to datetime object if it's a string
+        if isinstance(date, str):
+            # 2024-03-21, 21.03.2024, 21/03/2024 or March 21, 2024
+            self.date = _default_parser.parse(date)
+        elif isinstance(date, int):
+            self.date = _date_from_ordinal(date)  # Pre-parsed date ordinal
+        else:
+            self.date = date
+        self.places = places
+
+    @classmethod
+    def from_ordinal(cls, ordinal, places):
+        """Create an availability for a date ordinal without parsing a string"""
+        avail = cls.__new__(cls)
+        avail.date = date.fromordinal(ordinal)
+        avail.places = places
+        return avail
+
+    def __str__(self):
+        return f"{self.date.strftime('%Y-%m-%d')} - {self.places}"
+
+    def get_iso_date(self):
+        """Return date in ISO format (YYYY-MM-DD)"""
+        return self.date.strftime("%Y-%m-%d")
+
+    def __getstate__(self):
+        return {'date': self.date, 'places': self.places}
+
+    def __setstate__(self, state):
+        # Instances pickled before __slots__ carry a plain __dict__
+        if isinstance(state, tuple):
+            state = {**(state[0] or {}), **(state[1] or {})}
+        self.date = state['date']
+        self.places = state['places']
+
+
+class AvailabilitySeries:
+    """
+    Compact free-places series of one hut.
+
+    Day base_ordinal + i has values[i] places, or MISSING. Iterating yields
+    availability objects in date order, created on demand, so the series can
+    stand in for the list of availability objects it replaces.
+    """
+    __slots__ = ('base_ordinal', 'values', '_count')
+
+    def __init__(self, base_ordinal=0, values=None):
+        """
+        Args:
+            base_ordinal: Date ordinal of values[0]
+            values: array('h') of places per day, MISSING where unknown
+        """
+        self.base_ordinal = base_ordinal
+        self.values = values if values is not None else array('h')
+        self._count = sum(1 for places in self.values if places != MISSING)
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        """
+        Build a series from (date ordinal, places) pairs; a later pair wins for a repeated day
+        """
+        pairs = list(pairs)
+        if not pairs:
+            return cls()
+        first = min(ordinal for ordinal, _ in pairs)
+        last = max(ordinal for ordinal, _ in pairs)
+        values = array('h', [MISSING]) * (last - first + 1)
+        for ordinal, places in pairs:
+            values[ordinal - first] = min(max(int(places), 0), MAX_PLACES)
+        return cls(first, values)
+
+    @classmethod
+    def from_records(cls, records, parser=None):
+        """
+        Build a series from (date, places) records without creating availability objects
+        Args:
+            records: Iterable of (date, places); date can be a string, datetime.date or date ordinal
+            parser: DateParser for the date strings (default: a new one for this batch)
+        """
+        parser = parser or DateParser()
+        return cls.from_pairs((parser.ordinal(day), places) for day, places in records)
+
+    @classmethod
+    def from_availability(cls, items):
+        """Build a series from availability objects (a series is returned as is)"""
+        if isinstance(items, cls):
+            return items
+        return cls.from_pairs((avail.date.toordinal(), avail.places) for avail in items)
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        base = self.base_ordinal
+        for offset, places in enumerate(self.values):
+            if places != MISSING:
+                yield availability.from_ordinal(base + offset, places)
+
+    def __contains__(self, target_date):
+        if isinstance(target_date, availability):
+            target_date = target_date.date
+        if isinstance(target_date, str):
+            try:
+                target_date = date.fromisoformat(target_date)
+            except ValueError:
+                return False
+        if not isinstance(target_date, date):
+            return False
+        if isinstance(target_date, datetime):
+            target_date = target_date.date()
+        return self.get(target_date.toordinal()) is not None
+
+    def places_on(self, ordinal):
+        """Places on a date ordinal, or MISSING"""
+        offset = ordinal - self.base_ordinal
+        if 0 <= offset < len(self.values):
+            return self.values[offset]
+        return MISSING
+
+    def get(self, ordinal):
+        """availability object for a date ordinal, or None if the day has no data"""
+        places = self.places_on(ordinal)
+        return None if places == MISSING else availability.from_ordinal(ordinal, places)
+
+    def range(self, first_ordinal, last_ordinal):
+        """availability objects from first_ordinal to last_ordinal (inclusive), in date order"""
+        start = max(first_ordinal - self.base_ordinal, 0)
+        end = min(last_ordinal - self.base_ordinal + 1, len(self.values))
+        return [availability.from_ordinal(self.base_ordinal + offset, self.values[offset])
+                for offset in range(start, end) if self.values[offset] != MISSING]
+
+    def __getstate__(self):
+        return (self.base_ordinal, self.values.tobytes())
+
+    def __setstate__(self, state):
+        base_ordinal, raw = state
+        values = array('h')
+        values.frombytes(raw)
+        self.base_ordinal = base_ordinal
+        self.values = values
+        self._count = sum(1 for places in values if places != MISSING)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Check that both metadata extraction paths of Hut read the same fields from the
+hut pages in fixtures/hut_pages, and that they match the expected fields.
+
+Each fixture is a page (<name>.html) with the expected fields (<name>.json).
+Every page is opened in headless Chrome and read with HUT_METADATA_SCRIPT
+(metadata_extraction = "script") and from the page source with BeautifulSoup
+(metadata_extraction = "soup"), just like a scrape does.
+
+Usage:
+    python check_metadata_extraction.py               # both paths, needs Chrome
+    python check_metadata_extraction.py --soup-only   # only the page-source path, no browser
+    python check_metadata_extraction.py --record 12 34
+        Save the live pages of these hut IDs as new fixtures; the expected fields are
+        taken from the script path, so review the .json files before committing them
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+from driver_pool import create_chrome_driver
+from hut_collection import Hut, HutCollection, HTML_PARSER
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "hut_pages")
+FIELDS = ("name", "coordinates", "website", "img_src", "img_srcset")
+
+
+def fixture_pages():
+    """
+    Find the fixture pages
+    Returns:
+        List of (fixture name, path of the page, expected fields) tuples
+    """
+    pages = []
+    for name in sorted(os.listdir(FIXTURE_DIR)):
+        if not name.endswith(".html"):
+            continue
+        path = os.path.join(FIXTURE_DIR, name)
+        with open(path[:-len(".html")] + ".json", encoding="utf-8") as f:
+            pages.append((name[:-len(".html")], path, json.load(f)))
+    return pages
+
+
+def read_by_soup(html):
+    """Fields read from a page source by Hut._read_metadata_by_soup"""
+    soup = BeautifulSoup(html, HTML_PARSER)
+    try:
+        return Hut.__new__(Hut)._read_metadata_by_soup(soup)
+    finally:
+        soup.decompose()
+
+
+def read_by_script(driver):
+    """Fields read from the page loaded in driver by Hut._read_metadata_by_script"""
+    return Hut.__new__(Hut)._read_metadata_by_script(driver)
+
+
+def compare(fixture, path_name, fields, expected):
+    """Print the fields that differ from the expected ones; returns True if there are none"""
+    ok = True
+    for field in FIELDS:
+        if fields.get(field) != expected.get(field):
+            print(f"{fixture} [{path_name}] {field}: got {fields.get(field)!r}, expected {expected.get(field)!r}")
+            ok = False
+    return ok
+
+
+def check(use_browser=True):
+    """
+    Read every fixture page with each extraction path
+    Args:
+        use_browser: Also check the script path, and the soup path on the page source
+                     Chrome serializes, in headless Chrome
+    Returns:
+        True if every path matched the expected fields on every page
+    """
+    pages = fixture_pages()
+    ok = True
+    driver = create_chrome_driver() if use_browser else None
+    try:
+        for fixture, path, expected in pages:
+            with open(path, encoding="utf-8") as f:
+                ok &= compare(fixture, "soup, file", read_by_soup(f.read()), expected)
+            if driver is not None:
+                driver.get(Path(path).as_uri())
+                ok &= compare(fixture, "script", read_by_script(driver), expected)
+                ok &= compare(fixture, "soup, page source", read_by_soup(driver.page_source), expected)
+    finally:
+        if driver is not None:
+            driver.quit()
+    print(f"Checked {len(pages)} fixture pages: {'OK' if ok else 'MISMATCH'}")
+    return ok
+
+
+def record(hut_ids):
+    """
+    Save the live pages of hut IDs as fixtures, with the fields the script path reads as expected values
+    Args:
+        hut_ids: IDs on hut-reservation.org
+    """
+    driver = create_chrome_driver()
+    try:
+        for hut_id in hut_ids:
+            hut = Hut(f"{HutCollection.base_url}{hut_id}/wizard/", driver=driver, keep_html=True)
+            soup = BeautifulSoup(hut.html_snapshot, HTML_PARSER)
+            # Without its scripts the saved page cannot re-render (and so change) when opened from disk
+            for script in soup.find_all("script"):
+                script.decompose()
+            base = os.path.join(FIXTURE_DIR, f"hut-{hut_id}")
+            with open(base + ".html", "w", encoding="utf-8") as f:
+                f.write(str(soup))
+            driver.get(Path(base + ".html").as_uri())
+            with open(base + ".json", "w", encoding="utf-8") as f:
+                json.dump(read_by_script(driver), f, indent=2)
+                f.write("\n")
+            print(f"Recorded {base}.html")
+    finally:
+        driver.quit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the hut metadata extraction against recorded pages")
+    parser.add_argument("--soup-only", action="store_true", help="Only check the page-source path (no Chrome)")
+    parser.add_argument("--record", nargs="+", metavar="HUT_ID", help="Record the live pages of these huts")
+    args = parser.parse_args()
+    if args.record:
+        record(args.record)
+    else:
+        sys.exit(0 if check(use_browser=not args.soup_only) else 1)
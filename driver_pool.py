@@ -0,0 +1,272 @@
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.common.exceptions import InvalidSessionIdException, NoSuchWindowException
+from contextlib import contextmanager
+import threading
+import queue
+import time
+import logging
+import json
+
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+# URL patterns per resource type that the scraper never needs to download
+BLOCKED_RESOURCE_PATTERNS = {
+    "image": ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico"],
+    "font": ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot"],
+    "stylesheet": ["*.css"],
+}
+
+# Third-party hosts (analytics, tracking, web fonts) that the booking page loads
+BLOCKED_HOSTS = [
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*doubleclick.net*",
+    "*fonts.googleapis.com*",
+    "*fonts.gstatic.com*",
+    "*facebook.net*",
+    "*hotjar.com*",
+]
+
+# Blocked requests are never downloaded, so savings are estimated from typical sizes
+TYPICAL_RESOURCE_BYTES = {
+    "Image": 150_000,
+    "Font": 40_000,
+    "Stylesheet": 30_000,
+    "Script": 50_000,
+    "Other": 10_000,
+}
+
+
+def create_chrome_driver(block_resources=False, blocked_types=("image", "font", "stylesheet"), blocked_hosts=None):
+    """
+    Start a headless Chrome instance configured for scraping hut pages
+    Args:
+        block_resources: Drop non-essential requests through the DevTools protocol
+                         and record network events for page_resource_stats
+        blocked_types: Keys of BLOCKED_RESOURCE_PATTERNS to block
+        blocked_hosts: URL patterns of hosts to block (default: BLOCKED_HOSTS)
+    Returns:
+        selenium Chrome WebDriver
+    """
+    chrome_options = Options()
+    chrome_options.add_argument('--headless')
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    chrome_options.add_argument(f'--user-agent={USER_AGENT}')
+    if block_resources:
+        chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+        if "image" in blocked_types:
+            # img src/srcset attributes stay in the DOM, only the downloads are skipped
+            chrome_options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+
+    driver = webdriver.Chrome(options=chrome_options)
+
+    if block_resources:
+        patterns = list(BLOCKED_HOSTS if blocked_hosts is None else blocked_hosts)
+        for resource_type in blocked_types:
+            for pattern in BLOCKED_RESOURCE_PATTERNS[resource_type]:
+                patterns.extend([pattern, f"{pattern}?*"])
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+    return driver
+
+
+def page_resource_stats(driver):
+    """
+    Summarize the network activity recorded since the last call, i.e. for the last page
+    Args:
+        driver: WebDriver created with block_resources=True
+    Returns:
+        Dictionary with transferred_bytes, blocked_requests, blocked_by_type and estimated_bytes_saved
+    """
+    request_types = {}
+    transferred_bytes = 0
+    blocked_by_type = {}
+    for entry in driver.get_log('performance'):
+        message = json.loads(entry['message'])['message']
+        method = message.get('method')
+        params = message.get('params', {})
+        if method == 'Network.requestWillBeSent':
+            request_types[params.get('requestId')] = params.get('type', 'Other')
+        elif method == 'Network.loadingFinished':
+            transferred_bytes += int(params.get('encodedDataLength', 0))
+        elif method == 'Network.loadingFailed' and params.get('blockedReason'):
+            resource_type = params.get('type') or request_types.get(params.get('requestId'), 'Other')
+            blocked_by_type[resource_type] = blocked_by_type.get(resource_type, 0) + 1
+
+    estimated_bytes_saved = sum(
+        count * TYPICAL_RESOURCE_BYTES.get(resource_type, TYPICAL_RESOURCE_BYTES['Other'])
+        for resource_type, count in blocked_by_type.items()
+    )
+    return {
+        "transferred_bytes": transferred_bytes,
+        "blocked_requests": sum(blocked_by_type.values()),
+        "blocked_by_type": blocked_by_type,
+        "estimated_bytes_saved": estimated_bytes_saved,
+    }
+
+
+class PooledDriver:
+    """A WebDriver owned by a DriverPool, together with its usage bookkeeping"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+        self.broken = False
+
+    def mark_broken(self):
+        """Flag the driver so the pool replaces it instead of reusing it"""
+        self.broken = True
+
+
+class DriverPool:
+    """
+    Bounded, thread-safe pool of headless Chrome drivers.
+
+    Drivers are started lazily up to max_size and handed out with lease().
+    A driver is recycled once it has served max_pages pages, when it was
+    marked broken by the caller, or when it fails a health check on lease or
+    after the lease body raised. Ordinary page errors (e.g. a TimeoutException
+    on a slow page) keep the browser.
+    """
+
+    def __init__(self, max_size=4, max_pages=50, driver_factory=None, lease_timeout=None,
+                 block_resources=False, on_page_stats=None, metrics=None):
+        """
+        Args:
+            max_size: Maximum number of browsers running at once
+            max_pages: Number of pages after which a browser is restarted
+            driver_factory: Callable starting a new WebDriver (default: create_chrome_driver)
+            lease_timeout: Seconds to wait for a free driver (None waits forever)
+            block_resources: Start browsers that skip images, fonts, stylesheets and trackers
+            on_page_stats: Callback receiving page_resource_stats for every page served
+                           while blocking resources
+            metrics: Optional ScrapeMetrics receiving how long each browser took to start
+        """
+        self.max_size = max_size
+        self.max_pages = max_pages
+        if driver_factory is None:
+            driver_factory = lambda: create_chrome_driver(block_resources=block_resources)
+        self.driver_factory = driver_factory
+        self.lease_timeout = lease_timeout
+        self.block_resources = block_resources
+        self.on_page_stats = on_page_stats
+        self.metrics = metrics
+        self.logger = logging.getLogger('DriverPool')
+
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._all = set()
+        self._closed = False
+
+    @contextmanager
+    def lease(self):
+        """
+        Lease a healthy driver for the duration of a with-block
+        Yields:
+            PooledDriver whose .driver attribute is the WebDriver to use
+        """
+        if not self._slots.acquire(timeout=self.lease_timeout):
+            raise TimeoutError("Timed out waiting for a free WebDriver")
+        pooled = None
+        try:
+            pooled = self._checkout()
+            if self.block_resources:
+                # Drop network events left over from the previous page
+                pooled.driver.get_log('performance')
+            yield pooled
+            pooled.pages += 1
+            if self.block_resources:
+                self._report_page_stats(pooled)
+        except Exception as e:
+            # Timeouts and parse errors leave a usable browser; only a dead session needs a new Chrome
+            if pooled is not None and (isinstance(e, (InvalidSessionIdException, NoSuchWindowException))
+                                       or not self._is_healthy(pooled)):
+                pooled.mark_broken()
+            raise
+        finally:
+            if pooled is not None:
+                self._checkin(pooled)
+            self._slots.release()
+
+    def _report_page_stats(self, pooled):
+        """Log the bytes saved on the page just served and pass them to on_page_stats"""
+        try:
+            stats = page_resource_stats(pooled.driver)
+        except Exception as e:
+            self.logger.warning(f"Could not read page resource stats: {str(e)}")
+            return
+        self.logger.info(f"Blocked {stats['blocked_requests']} requests, "
+                         f"saved ~{stats['estimated_bytes_saved'] // 1024} KB, "
+                         f"transferred {stats['transferred_bytes'] // 1024} KB")
+        if self.on_page_stats:
+            self.on_page_stats(stats)
+
+    def _checkout(self):
+        """Take an idle healthy driver from the pool or start a new one"""
+        if self._closed:
+            raise RuntimeError("DriverPool has been shut down")
+
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if self._is_healthy(pooled):
+                return pooled
+            self.logger.info("Discarding unhealthy WebDriver")
+            self._discard(pooled)
+
+        start = time.monotonic()
+        pooled = PooledDriver(self.driver_factory())
+        if self.metrics is not None:
+            self.metrics.record('driver_start', time.monotonic() - start)
+        with self._lock:
+            self._all.add(pooled)
+        return pooled
+
+    def _checkin(self, pooled):
+        """Return a driver to the pool, recycling it if it is worn out or broken"""
+        if self._closed or pooled.broken or pooled.pages >= self.max_pages:
+            if pooled.pages >= self.max_pages:
+                self.logger.info(f"Recycling WebDriver after {pooled.pages} pages")
+            self._discard(pooled)
+        else:
+            self._idle.put(pooled)
+
+    def _is_healthy(self, pooled):
+        """Check that the browser session still responds"""
+        try:
+            pooled.driver.execute_script('return 1')
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, pooled):
+        """Quit a driver and forget about it"""
+        with self._lock:
+            self._all.discard(pooled)
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            self.logger.warning(f"Error quitting WebDriver: {str(e)}")
+
+    def shutdown(self):
+        """Quit every driver started by the pool; leased drivers are quit when returned"""
+        self._closed = True
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(pooled)
+        self.logger.info("WebDriver pool shut down")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
@@ -1,10 +1,9 @@
 from bs4 import BeautifulSoup
 import requests
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
 import time
 from datetime import datetime, timedelta
 import pickle
@@ -14,76 +13,372 @@ import random
 from tqdm import tqdm
 import logging
 import threading
+import re
+from driver_pool import DriverPool, create_chrome_driver
+from hut_fetchers import HutNotFoundError
+from scrape_engine import AsyncScrapeEngine
+from rate_limiter import AdaptiveRateLimiter
+from hut_index import HutIdIndex
+from scrape_metrics import ScrapeMetrics, deep_getsizeof
+from availability_matrix import AvailabilityMatrix, to_ordinal
+from availability_series import availability, AvailabilitySeries, DateParser
+from spatial_index import SpatialIndex
+from hut_store import read_store, write_store
+from availability_history import AvailabilityHistory
+from hut_database import HutDatabase
+from refresh_scheduler import RefreshScheduler
+from tour_planner import TourPlanner
+from contextlib import contextmanager, nullcontext
+from functools import partial
+import asyncio
+from urllib.parse import urlparse
 
+try:
+    import lxml  # noqa: F401  Optional, parses pages several times faster than html.parser
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
 
-class availability:
-    def __init__(self, date, places):
-        # Convert date string to datetime object if it's a string
-        if isinstance(date, str):
-            # Try common date formats
-            date_formats = [
-                "%Y-%m-%d",  # 2024-03-21
-                "%d.%m.%Y",  # 21.03.2024
-                "%d/%m/%Y",  # 21/03/2024
-                "%B %d, %Y"  # March 21, 2024
-            ]
-            
-            for fmt in date_formats:
-                try:
-                    self.date = datetime.strptime(date, fmt).date()
-                    break
-                except ValueError:
-                    continue
-            else:
-                raise ValueError(f"Unable to parse date: {date}")
-        else:
-            self.date = date
-        self.places = places
+
+# Selectors for the day cells of an opened calendar, tried in order
+CALENDAR_CELL_SELECTORS = [
+    ".mat-calendar-body-cell",
+    "td[role='gridcell'] button",
+    ".calendar-day:not(.disabled)",
+    "[aria-label*='202']"  # Matches dates with year 202x
+]
+
+# Selectors for the free places preview inside a day cell, tried in order
+CALENDAR_PREVIEW_SELECTORS = [
+    '.custom-preview',
+    '.availability-count',
+    '[class*="places-left"]'
+]
+
+# Selectors for the hut metadata, tried in order
+HUT_NAME_SELECTORS = [
+    '.hutTitle',  # Add the class from the HTML snippet
+    'h2.hutTitle',  # More specific selector
+    '.hut_information h2',  # Parent-child relationship
+]
+
+# Headings of the description blocks; the coordinates follow the "Coordinates:" heading
+COORDINATES_HEADING_SELECTOR = '.description h3.title'
+
+HUT_WEBSITE_SELECTORS = [
+    '.hutWebsite .hyperLink',  # Based on the provided HTML
+    '.hutWebsite a',  # More general selector
+    'a[target="_blank"]',  # Links that open in new tab
+    '[data-test="hut-website"]'
+]
+
+HUT_IMAGE_SELECTORS = [
+    '.hero .hut_picture',  # Based on the provided HTML
+    '.hero img',  # More general hero image selector
+    'img[alt="hut"]',  # Image with alt text
+    '.hut_picture',  # Direct class selector
+    '.hut-image img',  # Keep some fallbacks
+    '.main-image img',
+    '.featured-image'
+]
+
+# Returns [name, coordinates, website, img src, img srcset] in one round-trip, null where not found.
+# Mirrors the selector fallback of Hut._read_metadata_by_soup.
+HUT_METADATA_SCRIPT = """
+var nameSelectors = arguments[0], headingSelector = arguments[1];
+var websiteSelectors = arguments[2], imageSelectors = arguments[3];
+var text = function(el) { return el.textContent.trim(); };
+var name = null;
+for (var i = 0; i < nameSelectors.length; i++) {
+    var nameElem = document.querySelector(nameSelectors[i]);
+    if (nameElem) { name = text(nameElem); break; }
+}
+var coordinates = null;
+var headings = document.querySelectorAll(headingSelector);
+for (var j = 0; j < headings.length; j++) {
+    var next = headings[j].nextElementSibling;
+    if (headings[j].textContent.indexOf('Coordinates:') !== -1 && next && next.tagName === 'P') {
+        coordinates = text(next);
+        break;
+    }
+}
+var website = null;
+for (var k = 0; k < websiteSelectors.length; k++) {
+    var link = document.querySelector(websiteSelectors[k]);
+    if (link && link.hasAttribute('href')) { website = link.getAttribute('href'); break; }
+}
+var imgSrc = null, imgSrcset = null;
+for (var m = 0; m < imageSelectors.length; m++) {
+    var img = document.querySelector(imageSelectors[m]);
+    if (img && img.hasAttribute('src')) {
+        imgSrc = img.getAttribute('src');
+        imgSrcset = img.getAttribute('srcset');
+        break;
+    }
+}
+return [name, coordinates, website, imgSrc, imgSrcset];
+"""
+
+# Returns [period label, first cell label, cell count] to detect when the calendar changed month
+CALENDAR_SIGNATURE_SCRIPT = """
+var cellSelectors = arguments[0];
+var cells = [];
+for (var i = 0; i < cellSelectors.length; i++) {
+    cells = document.querySelectorAll(cellSelectors[i]);
+    if (cells.length) break;
+}
+var label = document.querySelector('.mat-calendar-period-button');
+var first = cells.length ? (cells[0].getAttribute('aria-label') || cells[0].getAttribute('data-date') || '') : '';
+return [label ? label.innerText.trim() : '', first, cells.length];
+"""
+
+# Reads (date label, places text) for every cell of the visible month in one round-trip.
+# Mirrors the selector fallback of Hut._read_calendar_cells_by_element.
+CALENDAR_CELLS_SCRIPT = """
+var cellSelectors = arguments[0], previewSelectors = arguments[1];
+var cells = [];
+for (var i = 0; i < cellSelectors.length; i++) {
+    cells = document.querySelectorAll(cellSelectors[i]);
+    if (cells.length) break;
+}
+if (!cells.length) return null;
+var result = [];
+for (var j = 0; j < cells.length; j++) {
+    var cell = cells[j];
+    var dateStr = cell.getAttribute('aria-label') || cell.getAttribute('data-date');
+    if (!dateStr) continue;
+    var placesText = null;
+    for (var k = 0; k < previewSelectors.length; k++) {
+        var preview = cell.querySelector(previewSelectors[k]);
+        if (preview) {
+            placesText = (preview.innerText || '').trim();
+            break;
+        }
+    }
+    if (placesText) result.push([dateStr, placesText]);
+}
+return result;
+"""
+
+
+_BOOK_HUT_ID = re.compile(r'/book-hut/([^/]+)')  # URLs look like .../book-hut/<id>/wizard/
+
+
+def _hut_id_from_url(url, default=None):
+    """Hut ID in the book-hut segment of a reservation URL, or default if there is none"""
+    id_match = _BOOK_HUT_ID.search(url or "")
+    return id_match.group(1) if id_match else default
+
+
+class HutMetadata:
+    """Static information about a hut that rarely changes between refreshes"""
+
+    def __init__(self, id="", name="", coordinates="", website="", img_url="", url="", fetched_at=None):
+        self.id = id
+        self.name = name
+        self.coordinates = coordinates
+        self.website = website
+        self.img_url = img_url
+        self.url = url
+        self.fetched_at = fetched_at  # Unix timestamp of the last metadata parse
 
     def __str__(self):
-        return f"{self.date.strftime('%Y-%m-%d')} - {self.places}"
+        return f"{self.name} - {self.coordinates} - {self.website} - {self.img_url}"
 
-    def get_iso_date(self):
-        """Return date in ISO format (YYYY-MM-DD)"""
-        return self.date.strftime("%Y-%m-%d")
 
 class Hut:
-    name = ""
-    coordinates = ""
-    website = ""
-    img_url = ""
-    id = ""
-    availability = []
-
-    def __init__(self, url):
+    _availability = AvailabilitySeries()
+    _availability_loader = None  # Callable returning the availability, for huts loaded lazily
+    calendar_extraction = "script"  # "script" (one execute_script per month) or "elements"
+    metadata_extraction = "script"  # "script" (one execute_script per page) or "soup" (parse the page source)
+    wait_timeout = 10  # Upper bound in seconds for each calendar wait
+    wait_poll_interval = 0.1
+    metrics = None
+    keep_html = False  # Keep the raw page source in html_snapshot for debugging
+    html_snapshot = None
+    fetched_at = None  # Unix timestamp of the last availability fetch (metadata.fetched_at is the metadata's)
+    last_changed = None  # Unix timestamp of the last fetch that changed any places
+    soup = None  # The parsed DOM is no longer kept; only the extracted fields are
+
+    def __init__(self, url, driver=None, metrics=None, metadata=None, keep_html=None):
+        """
+        Args:
+            url: URL of the hut reservation page
+            driver: Optional WebDriver to reuse
+            metrics: Optional ScrapeMetrics receiving how long each scrape stage and wait took
+            metadata: Known HutMetadata; when given only the calendar is scraped
+            keep_html: Store the page source of every scrape in html_snapshot (default: keep_html)
+        """
         self.url = url
-        self.soup = self._parse_hut(url)
+        self.metadata = metadata if metadata is not None else HutMetadata(url=url)
+        if metrics is not None:
+            self.metrics = metrics
+        if keep_html is not None:
+            self.keep_html = keep_html
+        self._parse_hut(url, driver, calendar_only=metadata is not None)
 
     def __str__(self):
         return f"{self.name} - {self.coordinates} - {self.website} - {self.img_url}"
-    
-    def _parse_hut(self, url):
+
+    # The static fields live on self.metadata so they can be kept across availability refreshes
+    def _metadata_property(field):
+        def getter(self):
+            return getattr(self.metadata, field)
+
+        def setter(self, value):
+            setattr(self.metadata, field, value)
+        return property(getter, setter)
+
+    name = _metadata_property('name')
+    coordinates = _metadata_property('coordinates')
+    website = _metadata_property('website')
+    img_url = _metadata_property('img_url')
+    id = _metadata_property('id')
+    del _metadata_property
+
+    @property
+    def availability(self):
+        """AvailabilitySeries of this hut; assign a list of availability objects or a series to replace it"""
+        if self._availability_loader is not None:
+            # Lazily loaded hut: materialize the series on first access
+            self._availability = self._availability_loader()
+            self._availability_loader = None
+        return self._availability
+
+    @availability.setter
+    def availability(self, value):
+        self._availability_loader = None
+        self._availability = AvailabilitySeries.from_availability(value)
+
+    @classmethod
+    def from_record(cls, record, url):
         """
-        Parses the hut reservation webpage and extracts relevant information using Selenium.
+        Build a Hut from already fetched data instead of scraping the page
         Args:
+            record: Dictionary with id, name, coordinates, website, img_url and
+                    availability as a list of (date, places) tuples
             url: URL of the hut reservation page
         Returns:
-            BeautifulSoup object of the parsed page
+            Hut object
         """
-        # Set up Chrome options for headless browsing
-        chrome_options = Options()
-        chrome_options.add_argument('--headless')
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+        hut = cls.__new__(cls)
+        hut.url = url
+        hut.metadata = HutMetadata(
+            id=record["id"],
+            name=record["name"],
+            coordinates=record.get("coordinates") or "Coordinates not found",
+            website=record.get("website") or url,  # Same fallback as the page scraper
+            img_url=record.get("img_url") or "",
+            url=url,
+            fetched_at=time.time(),
+        )
+        hut.availability = AvailabilitySeries.from_records(record.get("availability", []))
+        return hut
 
-        # Initialize the driver
-        driver = webdriver.Chrome(options=chrome_options)
+    @classmethod
+    def from_stored(cls, record, series=None, loader=None):
+        """
+        Build a Hut from a hut store record
+        Args:
+            record: Metadata record from hut_store.StoredHuts
+            series: The hut's AvailabilitySeries
+            loader: Instead of series, a callable returning it; called on first access of availability
+        Returns:
+            Hut object
+        """
+        hut = cls.__new__(cls)
+        hut.url = record["url"]
+        hut.metadata = HutMetadata(
+            # Records written from older pickles carry the id 'wizard'; the URL has the real one
+            id=_hut_id_from_url(record["url"], record["id"]),
+            name=record["name"],
+            coordinates=record["coordinates"],
+            website=record["website"],
+            img_url=record["img_url"],
+            url=record["url"],
+            fetched_at=record["fetched_at"],
+        )
+        if loader is not None:
+            hut._availability_loader = loader
+        else:
+            hut.availability = series
+        hut.fetched_at = record.get("availability_fetched_at")
+        hut.last_changed = record.get("last_changed")
+        return hut
+
+    def refresh_availability(self, driver=None, metrics=None):
+        """
+        Scrape only the calendar of this hut, keeping its metadata
+        Args:
+            driver: Optional WebDriver to reuse
+            metrics: Optional ScrapeMetrics receiving how long each scrape stage and wait took
+        Returns:
+            True if the calendar was read, False otherwise (availability is left unchanged)
+        """
+        if metrics is not None:
+            self.metrics = metrics
+        return self._parse_hut(self.url, driver, calendar_only=True) is not None
+
+    def _parse_hut(self, url, driver=None, calendar_only=False):
+        """
+        Parses the hut reservation webpage and extracts relevant information using Selenium.
+        Args:
+            url: URL of the hut reservation page
+            driver: Optional WebDriver to reuse (e.g. leased from a DriverPool).
+                    If omitted, a fresh Chrome instance is started and quit afterwards.
+            calendar_only: Only read the calendar and skip the metadata parse
+        Returns:
+            HutMetadata of the parsed page. With calendar_only, the list of
+            availability objects read, or None if the calendar could not be read.
+        """
+        # Initialize the driver unless the caller lends us one
+        owns_driver = driver is None
+        if owns_driver:
+            with self._stage('driver_start'):
+                driver = create_chrome_driver()
 
         try:
-            # Load the page
-            driver.get(url)
+            self._load_page(driver, url)
+            if self.keep_html:
+                self.html_snapshot = driver.page_source
+
+            if calendar_only:
+                all_availability = self._scrape_calendar(driver)
+                if all_availability is not None:
+                    self.availability = all_availability
+                return all_availability
+
+            # Read the metadata before the calendar overlay changes the page
+            fields = self._read_metadata(driver)
+
+            all_availability = self._scrape_calendar(driver)
+            if all_availability is not None:
+                self.availability = all_availability
+            else:
+                self.availability = []
+
+            self._apply_metadata(url, fields)
+            return self.metadata
             
+        except Exception as e:
+            print(f"Error parsing hut: {str(e)}")
+            try:
+                print(f"Current URL: {driver.current_url}")
+                print(f"Page source preview: {driver.page_source[:500]}")
+            except:
+                pass
+            raise
+        
+        finally:
+            if owns_driver:
+                driver.quit()
+
+    def _load_page(self, driver, url):
+        """Load the hut page and wait until the Angular app is stable"""
+        with self._stage('page_load'):
+            driver.get(url)
+        
+        with self._stage('angular_wait'):
             # First wait for the page to load completely
             WebDriverWait(driver, 20).until(
                 EC.presence_of_element_located((By.TAG_NAME, 'body'))
@@ -100,28 +395,33 @@ class Hut:
                     'return window.getAllAngularTestabilities().every(t => t.isStable())'
                 )
             )
+
+    def _scrape_calendar(self, driver):
+        """
+        Open the calendar and read the current and next 5 months
+        Args:
+            driver: WebDriver with the hut page loaded
+        Returns:
+            List of availability objects, or None if the calendar could not be read
+        """
+        try:
+            # Wait for page to be fully loaded and stable
+            WebDriverWait(driver, 30).until(
+                lambda d: d.execute_script('return document.readyState') == 'complete'
+            )
             
-            # Store the initial page source for other parsing
-            self.soup = BeautifulSoup(driver.page_source, 'html.parser')
+            # Try to find and click the calendar button
+            calendar_button_selectors = [
+                "button[aria-label*='calendar']",
+                "button[aria-label*='Choose date']",
+                "input[type='date']",
+                ".date-picker-trigger",
+                "[data-test='date-picker-button']",
+                "mat-datepicker-toggle button"  # Angular Material datepicker toggle
+            ]
             
-            # Now try to find the calendar
-            try:
-                # Wait for page to be fully loaded and stable
-                WebDriverWait(driver, 30).until(
-                    lambda d: d.execute_script('return document.readyState') == 'complete'
-                )
-                
-                # Try to find and click the calendar button
-                calendar_button_selectors = [
-                    "button[aria-label*='calendar']",
-                    "button[aria-label*='Choose date']",
-                    "input[type='date']",
-                    ".date-picker-trigger",
-                    "[data-test='date-picker-button']",
-                    "mat-datepicker-toggle button"  # Angular Material datepicker toggle
-                ]
-                
-                calendar_button = None
+            calendar_button = None
+            with self._stage('calendar_button'):
                 for selector in calendar_button_selectors:
                     try:
                         calendar_button = WebDriverWait(driver, 5).until(
@@ -130,260 +430,372 @@ class Hut:
                         break
                     except:
                         continue
-                
-                if calendar_button:
-                    # Try to click the button
+            
+            if calendar_button:
+                # Try to click the button
+                try:
+                    calendar_button.click()
+                    # Wait for the calendar cells to appear
+                    self._wait_for_calendar_cells(driver)
+                except Exception as click_error:
+                    print(f"Error clicking calendar button: {click_error}")
+                    # Try JavaScript click as fallback
                     try:
-                        calendar_button.click()
-                        # Wait a moment for calendar to appear
-                        time.sleep(1)
-                    except Exception as click_error:
-                        print(f"Error clicking calendar button: {click_error}")
-                        # Try JavaScript click as fallback
-                        try:
-                            driver.execute_script("arguments[0].click();", calendar_button)
-                            time.sleep(1)
-                        except Exception as js_click_error:
-                            print(f"JavaScript click also failed: {js_click_error}")
-                else:
-                    print("Could not find calendar button")
-                    return self.soup
+                        driver.execute_script("arguments[0].click();", calendar_button)
+                        self._wait_for_calendar_cells(driver)
+                    except Exception as js_click_error:
+                        print(f"JavaScript click also failed: {js_click_error}")
+            else:
+                print("Could not find calendar button")
+                return None
 
-                # Try to find the calendar container with multiple approaches
-                calendar_found = False
-                for attempt in range(3):
-                    try:
-                        # Try different selectors for the opened calendar
-                        calendar_selectors = [
-                            "mat-calendar",  # Angular Material calendar
-                            ".mat-calendar-content",
-                            ".calendar-container",
-                            "[role='dialog'] [role='grid']",  # Calendar popup grid
-                            ".cdk-overlay-container mat-calendar"  # Angular overlay calendar
-                        ]
-                        
-                        for selector in calendar_selectors:
-                            try:
-                                calendar = WebDriverWait(driver, 10).until(
-                                    EC.presence_of_element_located((By.CSS_SELECTOR, selector))
-                                )
-                                if calendar.is_displayed():
-                                    calendar_found = True
-                                    break
-                            except:
-                                continue
+            # Try to find the calendar container with multiple approaches
+            for attempt in range(3):
+                try:
+                    # Try different selectors for the opened calendar
+                    calendar_selectors = [
+                        "mat-calendar",  # Angular Material calendar
+                        ".mat-calendar-content",
+                        ".calendar-container",
+                        "[role='dialog'] [role='grid']",  # Calendar popup grid
+                        ".cdk-overlay-container mat-calendar"  # Angular overlay calendar
+                    ]
+                    
+                    calendar_found = False
+                    for selector in calendar_selectors:
+                        try:
+                            calendar = WebDriverWait(driver, 10).until(
+                                EC.presence_of_element_located((By.CSS_SELECTOR, selector))
+                            )
+                            if calendar.is_displayed():
+                                calendar_found = True
+                                break
+                        except:
+                            continue
+                    
+                    if calendar_found:
+                        return self._scrape_calendar_months(driver)
                         
-                        if calendar_found:
-                            # Function to parse calendar cells for a given month
-                            def parse_calendar_cells():
-                                cell_selectors = [
-                                    ".mat-calendar-body-cell",
-                                    "td[role='gridcell'] button",
-                                    ".calendar-day:not(.disabled)",
-                                    "[aria-label*='202']"  # Matches dates with year 202x
-                                ]
-                                
-                                calendar_cells = []
-                                for selector in cell_selectors:
-                                    calendar_cells = driver.find_elements(By.CSS_SELECTOR, selector)
-                                    if calendar_cells:
-                                        break
-                                
-                                if not calendar_cells:
-                                    print("No calendar cells found with any selector")
-                                    return []
-                                
-                                month_availability = []
-                                # Parse each calendar cell
-                                for cell in calendar_cells:
-                                    try:
-                                        # Try multiple ways to get the date
-                                        date_str = cell.get_attribute('aria-label')
-                                        if not date_str:
-                                            date_str = cell.get_attribute('data-date')
-                                        if not date_str:
-                                            continue
-                                            
-                                        # Try multiple selectors for availability number
-                                        preview_selectors = [
-                                            '.custom-preview',
-                                            '.availability-count',
-                                            '[class*="places-left"]'
-                                        ]
-                                        
-                                        places_text = None
-                                        for selector in preview_selectors:
-                                            try:
-                                                preview_elem = cell.find_element(By.CSS_SELECTOR, selector)
-                                                if preview_elem:
-                                                    places_text = preview_elem.text.strip()
-                                                    break
-                                            except:
-                                                continue
-                                        
-                                        if places_text:
-                                            # Extract just the number from text
-                                            import re
-                                            number_match = re.search(r'\d+', places_text)
-                                            if number_match:
-                                                places = int(number_match.group())
-                                                month_availability.append(availability(date_str, places))
-                                                
-                                    except Exception as cell_error:
-                                        print(f"Error parsing calendar cell: {cell_error}")
-                                        continue
-                                
-                                return month_availability
-
-                            # Parse current month
-                            current_month_availability = parse_calendar_cells()
-                            all_availability = current_month_availability
-                            
-                            # Try to get next 5 months (6 months total including current)
-                            next_month_selectors = [
-                                ".mat-calendar-next-button",
-                                "button[aria-label='Next month']",
-                                ".mat-calendar-controls button:last-child"
-                            ]
-                            
-                            for month in range(5):  # Do this 5 times for next 5 months
-                                next_button = None
-                                for selector in next_month_selectors:
-                                    try:
-                                        next_button = WebDriverWait(driver, 5).until(
-                                            EC.element_to_be_clickable((By.CSS_SELECTOR, selector))
-                                        )
-                                        break
-                                    except:
-                                        continue
-                                
-                                if next_button:
-                                    try:
-                                        next_button.click()
-                                        # Wait for calendar to update
-                                        time.sleep(1)
-                                        # Parse next month
-                                        next_month_availability = parse_calendar_cells()
-                                        all_availability.extend(next_month_availability)
-                                    except Exception as click_error:
-                                        print(f"Error clicking next month button: {click_error}")
-                                        # Try JavaScript click as fallback
-                                        try:
-                                            driver.execute_script("arguments[0].click();", next_button)
-                                            time.sleep(1)
-                                            # Parse next month
-                                            next_month_availability = parse_calendar_cells()
-                                            all_availability.extend(next_month_availability)
-                                        except Exception as js_click_error:
-                                            print(f"JavaScript click for next month also failed: {js_click_error}")
-                                            break  # Stop if we can't navigate to next month
-                                else:
-                                    print(f"Could not find next month button for month {month + 2}")
-                                    break
-
-                            # Store all months' availability
-                            self.availability = all_availability
-                            break
-                            
-                    except Exception as e:
-                        print(f"Attempt {attempt + 1} failed: {str(e)}")
-                        time.sleep(2)  # Wait before retry
-                
-                if not calendar_found:
-                    print("Calendar could not be found after multiple attempts")
-                    return self.soup
-
-            except Exception as calendar_error:
-                print(f"Could not load calendar: {calendar_error}")
-                print(f"Current URL: {driver.current_url}")
-                self.availability = []
-            
-            # Updated name selectors based on the HTML structure
-            name_selectors = [
-                '.hutTitle',  # Add the class from the HTML snippet
-                'h2.hutTitle',  # More specific selector
-                '.hut_information h2',  # Parent-child relationship
-            ]
+                except Exception as e:
+                    print(f"Attempt {attempt + 1} failed: {str(e)}")
+                    self._wait_for_angular_stable(driver)  # Let the page settle before retry
             
-            for selector in name_selectors:
-                name_elem = self.soup.select_one(selector)
-                if name_elem:
-                    self.name = name_elem.text.strip()
-                    break
-            else:
-                self.name = "Name not found"
-            
-            # Look for coordinates with multiple selectors
-            coord_selectors = [
-                '.description h3.title:contains("Coordinates:") + p',
-            ]
-            
-            for selector in coord_selectors:
-                coords_elem = self.soup.select_one(selector)
-                if coords_elem:
-                    self.coordinates = coords_elem.text.strip()
-                    break
-            else:
-                self.coordinates = "Coordinates not found"
-            
-            # Look for website link with multiple selectors
-            website_selectors = [
-                '.hutWebsite .hyperLink',  # Based on the provided HTML
-                '.hutWebsite a',  # More general selector
-                'a[target="_blank"]',  # Links that open in new tab
-                '[data-test="hut-website"]'
-            ]
-            
-            for selector in website_selectors:
-                website_elem = self.soup.select_one(selector)
-                if website_elem and 'href' in website_elem.attrs:
-                    self.website = website_elem['href']
-                    break
-            else:
-                self.website = url  # Fallback to the reservation page URL
-            
-            # Look for image with multiple selectors
-            img_selectors = [
-                '.hero .hut_picture',  # Based on the provided HTML
-                '.hero img',  # More general hero image selector
-                'img[alt="hut"]',  # Image with alt text
-                '.hut_picture',  # Direct class selector
-                '.hut-image img',  # Keep some fallbacks
-                '.main-image img',
-                '.featured-image'
-            ]
+            print("Calendar could not be found after multiple attempts")
+            return None
+
+        except Exception as calendar_error:
+            print(f"Could not load calendar: {calendar_error}")
+            print(f"Current URL: {driver.current_url}")
+            return None
+
+    def _scrape_calendar_months(self, driver):
+        """
+        Read the month shown in the opened calendar and click through the next 5 months
+        Args:
+            driver: WebDriver with the calendar opened
+        Returns:
+            List of availability objects for all months read
+        """
+        # All months share one parser, so the aria-label format is detected once
+        date_parser = DateParser()
+
+        # Parse current month
+        all_availability = self._parse_calendar_cells(driver, date_parser)
+        
+        # Try to get next 5 months (6 months total including current)
+        next_month_selectors = [
+            ".mat-calendar-next-button",
+            "button[aria-label='Next month']",
+            ".mat-calendar-controls button:last-child"
+        ]
+        
+        for month in range(5):  # Do this 5 times for next 5 months
+            next_button = None
+            with self._stage('month_navigation'):
+                for selector in next_month_selectors:
+                    try:
+                        next_button = WebDriverWait(driver, 5).until(
+                            EC.element_to_be_clickable((By.CSS_SELECTOR, selector))
+                        )
+                        break
+                    except:
+                        continue
             
-            for selector in img_selectors:
-                img_tag = self.soup.select_one(selector)
-                if img_tag and 'src' in img_tag.attrs:
-                    # Get the highest resolution image if srcset is available
-                    if 'srcset' in img_tag.attrs:
-                        srcset = img_tag['srcset']
-                        # Get the last URL in srcset (typically highest resolution)
-                        highest_res = srcset.split(',')[-1].split()[0]
-                        self.img_url = highest_res
-                    else:
-                        self.img_url = img_tag['src']
-                    break
+            if next_button:
+                previous_month = self._calendar_signature(driver)
+                try:
+                    next_button.click()
+                    # Wait for calendar to update
+                    self._wait_for_month_change(driver, previous_month)
+                    # Parse next month
+                    next_month_availability = self._parse_calendar_cells(driver, date_parser)
+                    all_availability.extend(next_month_availability)
+                except Exception as click_error:
+                    print(f"Error clicking next month button: {click_error}")
+                    # Try JavaScript click as fallback
+                    try:
+                        driver.execute_script("arguments[0].click();", next_button)
+                        self._wait_for_month_change(driver, previous_month)
+                        # Parse next month
+                        next_month_availability = self._parse_calendar_cells(driver, date_parser)
+                        all_availability.extend(next_month_availability)
+                    except Exception as js_click_error:
+                        print(f"JavaScript click for next month also failed: {js_click_error}")
+                        break  # Stop if we can't navigate to next month
             else:
-                self.img_url = ""
-            
-            self.id = url.split('/')[-2]
-            
-            return self.soup
-            
-        except Exception as e:
-            print(f"Error parsing hut: {str(e)}")
+                print(f"Could not find next month button for month {month + 2}")
+                break
+
+        return all_availability
+
+    def _read_metadata(self, driver):
+        """
+        Read name, coordinates, website and image of the loaded page
+        Args:
+            driver: WebDriver with the hut page loaded
+        Returns:
+            Dictionary of the raw fields (see _read_metadata_by_soup), None where not found
+        """
+        if self.metadata_extraction == "script":
             try:
-                print(f"Current URL: {driver.current_url}")
-                print(f"Page source preview: {driver.page_source[:500]}")
-            except:
-                pass
-            raise
-        
+                with self._stage('metadata_script'):
+                    return self._read_metadata_by_script(driver)
+            except Exception as script_error:
+                print(f"Metadata script extraction failed, falling back to the page source: {script_error}")
+
+        with self._stage('soup_parse'):
+            soup = BeautifulSoup(driver.page_source, HTML_PARSER)
+        try:
+            with self._stage('metadata_parse'):
+                return self._read_metadata_by_soup(soup)
+        finally:
+            # The tree is full of parent/child reference cycles; break them so it is freed right away
+            soup.decompose()
+
+    def _read_metadata_by_script(self, driver):
+        """
+        Read the metadata fields from the live DOM with a single execute_script call
+        Args:
+            driver: WebDriver with the hut page loaded
+        Returns:
+            Dictionary of the raw fields
+        """
+        name, coordinates, website, img_src, img_srcset = driver.execute_script(
+            HUT_METADATA_SCRIPT, HUT_NAME_SELECTORS, COORDINATES_HEADING_SELECTOR,
+            HUT_WEBSITE_SELECTORS, HUT_IMAGE_SELECTORS
+        )
+        return {"name": name, "coordinates": coordinates, "website": website,
+                "img_src": img_src, "img_srcset": img_srcset}
+
+    def _read_metadata_by_soup(self, soup):
+        """
+        Read the metadata fields from a parsed page
+        Args:
+            soup: BeautifulSoup object of the page
+        Returns:
+            Dictionary with name, coordinates, website, img_src and img_srcset, None where not found
+        """
+        fields = {"name": None, "coordinates": None, "website": None, "img_src": None, "img_srcset": None}
+
+        for selector in HUT_NAME_SELECTORS:
+            name_elem = soup.select_one(selector)
+            if name_elem:
+                fields["name"] = name_elem.text.strip()
+                break
+
+        # The paragraph right after the "Coordinates:" heading
+        for heading in soup.select(COORDINATES_HEADING_SELECTOR):
+            if "Coordinates:" in heading.text:
+                coords_elem = heading.find_next_sibling()
+                if coords_elem is not None and coords_elem.name == 'p':
+                    fields["coordinates"] = coords_elem.text.strip()
+                    break
+
+        for selector in HUT_WEBSITE_SELECTORS:
+            website_elem = soup.select_one(selector)
+            if website_elem and 'href' in website_elem.attrs:
+                fields["website"] = website_elem['href']
+                break
+
+        for selector in HUT_IMAGE_SELECTORS:
+            img_tag = soup.select_one(selector)
+            if img_tag and 'src' in img_tag.attrs:
+                fields["img_src"] = img_tag['src']
+                fields["img_srcset"] = img_tag.get('srcset')
+                break
+        return fields
+
+    def _apply_metadata(self, url, fields):
+        """
+        Store extracted metadata fields on self.metadata, with the usual fallbacks for missing ones
+        Args:
+            url: URL of the hut reservation page
+            fields: Dictionary returned by _read_metadata_by_script or _read_metadata_by_soup
+        """
+        self.name = fields["name"] if fields["name"] is not None else "Name not found"
+        self.coordinates = fields["coordinates"] if fields["coordinates"] is not None else "Coordinates not found"
+        self.website = fields["website"] if fields["website"] is not None else url  # Fallback to the reservation page URL
+
+        if fields["img_src"] is None:
+            self.img_url = ""
+        elif fields["img_srcset"] is not None:
+            # Get the last URL in srcset (typically highest resolution)
+            self.img_url = fields["img_srcset"].split(',')[-1].split()[0]
+        else:
+            self.img_url = fields["img_src"]
+
+        self.id = _hut_id_from_url(url, url.rstrip('/').split('/')[-1])
+        self.metadata.url = url
+        self.metadata.fetched_at = time.time()
+
+    def _stage(self, name):
+        """Context manager timing one scrape stage into self.metrics (no-op without metrics)"""
+        return self.metrics.time(name) if self.metrics is not None else nullcontext()
+
+    def _wait_until(self, driver, name, condition):
+        """
+        Wait for a condition for at most wait_timeout seconds and record how long it took
+        Args:
+            driver: WebDriver to poll
+            name: Name under which the wait is recorded in metrics
+            condition: Callable taking the driver and returning a truthy value when done
+        Returns:
+            True if the condition was met, False on timeout
+        """
+        start = time.monotonic()
+        timed_out = False
+        try:
+            WebDriverWait(driver, self.wait_timeout, poll_frequency=self.wait_poll_interval).until(condition)
+        except TimeoutException:
+            timed_out = True
+            print(f"Timed out after {self.wait_timeout}s waiting for {name}")
         finally:
-            driver.quit()
+            if self.metrics is not None:
+                self.metrics.record(name, time.monotonic() - start, timed_out)
+        return not timed_out
+
+    def _calendar_signature(self, driver):
+        """
+        Identify the month currently shown in the calendar
+        Returns:
+            Tuple of (period label, first cell label, number of cells)
+        """
+        return tuple(driver.execute_script(CALENDAR_SIGNATURE_SCRIPT, CALENDAR_CELL_SELECTORS))
+
+    def _wait_for_calendar_cells(self, driver):
+        """Wait until the opened calendar shows its day cells"""
+        return self._wait_until(driver, 'calendar_open', lambda d: self._calendar_signature(d)[2] > 0)
+
+    def _wait_for_month_change(self, driver, previous_month):
+        """Wait until the calendar shows a different month than previous_month"""
+        return self._wait_until(
+            driver, 'month_change',
+            lambda d: (lambda current: current != previous_month and current[2] > 0)(self._calendar_signature(d))
+        )
+
+    def _wait_for_angular_stable(self, driver):
+        """Wait until Angular has no pending work"""
+        return self._wait_until(
+            driver, 'angular_stable',
+            lambda d: d.execute_script(
+                'return !!window.getAllAngularTestabilities && window.getAllAngularTestabilities().every(t => t.isStable())'
+            )
+        )
+
+    def _parse_calendar_cells(self, driver, date_parser=None):
+        """
+        Parse the calendar cells of the currently displayed month
+        Args:
+            driver: WebDriver with the calendar opened
+            date_parser: DateParser for the cells' aria-labels (default: a new one)
+        Returns:
+            List of availability objects for the month
+        """
+        with self._stage('cell_parse'):
+            cells = None
+            if self.calendar_extraction == "script":
+                try:
+                    cells = self._read_calendar_cells_by_script(driver)
+                except Exception as script_error:
+                    print(f"Calendar script extraction failed, falling back to elements: {script_error}")
+            if cells is None:
+                cells = self._read_calendar_cells_by_element(driver)
+            if not cells:
+                return []
+
+            date_parser = date_parser or DateParser()
+            month_availability = []
+            for date_str, places_text in cells:
+                try:
+                    # Extract just the number from text
+                    number_match = re.search(r'\d+', places_text)
+                    if number_match:
+                        places = int(number_match.group())
+                        month_availability.append(availability(date_parser.parse(date_str), places))
+                except Exception as cell_error:
+                    print(f"Error parsing calendar cell: {cell_error}")
+                    continue
+            return month_availability
+
+    def _read_calendar_cells_by_script(self, driver):
+        """
+        Read all calendar cells of the displayed month with a single execute_script call
+        Args:
+            driver: WebDriver with the calendar opened
+        Returns:
+            List of (date_str, places_text) tuples
+        """
+        cells = driver.execute_script(CALENDAR_CELLS_SCRIPT, CALENDAR_CELL_SELECTORS, CALENDAR_PREVIEW_SELECTORS)
+        if cells is None:
+            print("No calendar cells found with any selector")
+            return []
+        return [(date_str, places_text) for date_str, places_text in cells]
+
+    def _read_calendar_cells_by_element(self, driver):
+        """
+        Read all calendar cells of the displayed month through individual WebElement lookups
+        Args:
+            driver: WebDriver with the calendar opened
+        Returns:
+            List of (date_str, places_text) tuples
+        """
+        calendar_cells = []
+        for selector in CALENDAR_CELL_SELECTORS:
+            calendar_cells = driver.find_elements(By.CSS_SELECTOR, selector)
+            if calendar_cells:
+                break
+        
+        if not calendar_cells:
+            print("No calendar cells found with any selector")
+            return []
         
+        cells = []
+        for cell in calendar_cells:
+            try:
+                # Try multiple ways to get the date
+                date_str = cell.get_attribute('aria-label')
+                if not date_str:
+                    date_str = cell.get_attribute('data-date')
+                if not date_str:
+                    continue
+                
+                places_text = None
+                for selector in CALENDAR_PREVIEW_SELECTORS:
+                    try:
+                        preview_elem = cell.find_element(By.CSS_SELECTOR, selector)
+                        if preview_elem:
+                            places_text = preview_elem.text.strip()
+                            break
+                    except:
+                        continue
+                
+                if places_text:
+                    cells.append((date_str, places_text))
+            except Exception as cell_error:
+                print(f"Error parsing calendar cell: {cell_error}")
+                continue
+        return cells
+
     def get_availability_for_date(self, target_date):
         """
         Get availability for a specific date
@@ -392,17 +804,7 @@ class Hut:
         Returns:
             availability object if found, None otherwise
         """
-        # Convert target_date to datetime.date if it's a string
-        if isinstance(target_date, str):
-            try:
-                target_date = datetime.strptime(target_date, "%Y-%m-%d").date()
-            except ValueError:
-                raise ValueError(f"Invalid date format. Please use YYYY-MM-DD: {target_date}")
-
-        for avail in self.availability:
-            if avail.date == target_date:
-                return avail
-        return None
+        return self.availability.get(to_ordinal(target_date))
 
     def is_available(self, target_date, min_places=1):
         """
@@ -428,7 +830,7 @@ class Hut:
             List of availability objects for available dates
         """
         available_dates = []
-        for avail in sorted(self.availability, key=lambda x: x.date):
+        for avail in self.availability:
             if avail.places >= min_places:
                 available_dates.append(avail)
                 if len(available_dates) >= limit:
@@ -439,16 +841,12 @@ class Hut:
         """
         Get availability for a range of dates
         Args:
-            start_date: Start date string
-            end_date: End date string
+            start_date: Start date string in YYYY-MM-DD format or datetime.date object
+            end_date: End date string in YYYY-MM-DD format or datetime.date object (inclusive)
         Returns:
             List of availability objects within the date range
         """
-        range_availability = []
-        for avail in self.availability:
-            if start_date <= avail.date <= end_date:
-                range_availability.append(avail)
-        return sorted(range_availability, key=lambda x: x.date)
+        return self.availability.range(to_ordinal(start_date), to_ordinal(end_date))
 
     def get_max_availability(self):
         """
@@ -463,27 +861,107 @@ class Hut:
     # Add this method to make Hut objects picklable
     def __getstate__(self):
         """Return state values to be pickled."""
+        self.availability  # Materialize a lazily loaded series
         state = self.__dict__.copy()
-        # Remove the soup attribute which contains BeautifulSoup objects that may not pickle well
-        if 'soup' in state:
-            del state['soup']
+        state.pop('_availability_loader', None)
+        # Huts created before the soup was dropped may still carry one
+        state.pop('soup', None)
+        # The timing stats belong to the collection that scraped the hut
+        state.pop('metrics', None)
+        # Pickled under its old name; lists of availability objects from older pickles are converted on load
+        state['availability'] = state.pop('_availability', AvailabilitySeries())
         return state
 
     def __setstate__(self, state):
         """Restore state from the unpickled state values."""
+        if 'metadata' not in state:
+            # Huts pickled before the metadata split kept these fields directly on the hut
+            state['metadata'] = HutMetadata(
+                id=state.pop('id', ""),
+                name=state.pop('name', ""),
+                coordinates=state.pop('coordinates', ""),
+                website=state.pop('website', ""),
+                img_url=state.pop('img_url', ""),
+                url=state.get('url', ""),
+            )
+        availability_list = state.pop('availability', [])
+        state.pop('soup', None)
         self.__dict__.update(state)
-        # The soup attribute will be None after unpickling
-        self.soup = None
+        # Older versions took the id from the wrong URL segment, giving every hut the id 'wizard'
+        self.metadata.id = _hut_id_from_url(state.get('url') or self.metadata.url, self.metadata.id)
+        self.availability = availability_list
+
+    def memory_size(self):
+        """Approximate bytes held by this hut, excluding the shared scrape metrics"""
+        return deep_getsizeof(self, exclude=(self.metrics, self._availability_loader))
 
 class HutCollection:
     base_url = "https://www.hut-reservation.org/reservation/book-hut/"
     huts = {}
-    cache_file = "hut_cache.pkl"
+    cache_file = os.path.join("data", "huts.store")
+    legacy_cache_file = "hut_cache.pkl"  # Pickle cache of older versions, migrated on first load
+    history_dir = os.path.join("data", "history")
+    store_interval = 6 * 3600  # Seconds between full rewrites of cache_file; saves in between only append changes to the history
+    driver_max_pages = 50  # Restart a pooled browser after this many hut pages
+    id_index_file = os.path.join("data", "hut_id_index.json")
+    metadata_max_age = 7 * 24 * 3600  # Re-parse name, coordinates, website and image weekly
+    stale_after = 3600  # Seconds after which a hut's availability is due for a refresh
+    refresh_budget_per_hour = 300  # Hut refreshes the background worker may start per hour
+    refresh_batch_size = 20  # Due huts the background worker refreshes together
+    wait_stages = ('calendar_open', 'month_change', 'angular_stable')
+    keep_html = False
 
-    def __init__(self, use_cache=True, background_updates=False, update_interval=3600):
+    def __init__(self, use_cache=True, background_updates=False, update_interval=3600, fetcher=None,
+                 selenium_fallback=True, rate_limiter=None, block_resources=False, metrics_file=None,
+                 keep_html=False, database=None, lazy=False):
+        """
+        Args:
+            use_cache: Load from and save to the hut store (cache_file) and the availability history (history_dir)
+            background_updates: Start the background update thread
+            update_interval: Seconds between background scans for new huts; known huts are refreshed
+                             continuously by refresh_scheduler
+            fetcher: Optional fetcher (e.g. hut_fetchers.HttpHutFetcher) used before scraping with Selenium
+            selenium_fallback: Scrape the page with Selenium when the fetcher fails
+            rate_limiter: AdaptiveRateLimiter shared by all fetches (default: a new one)
+            block_resources: Skip images, fonts, stylesheets and third-party hosts when
+                             loading pages in Chrome
+            metrics_file: Optional path (e.g. data/scrape_metrics.prom) the scrape metrics are
+                          written to in the Prometheus text format after every parse or refresh
+            keep_html: Keep the raw page source of scraped huts in Hut.html_snapshot (debugging only)
+            database: Optional SQLite file (or HutDatabase) shared with other processes. Huts are
+                      loaded from it when it has any, parses and refreshes are written to it, and
+                      the date and name queries run in SQL
+            lazy: Load only hut metadata at startup. Availability is read when a hut's is first
+                  accessed; date queries read columns of the memory-mapped hut store directly
+        """
         self.use_cache = use_cache
+        self.fetcher = fetcher
+        self.selenium_fallback = selenium_fallback
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter()
+        self.block_resources = block_resources
+        self.metrics = ScrapeMetrics()
+        self.metrics_file = metrics_file
+        self.keep_html = keep_html
+        self.lazy = lazy
+        self.resource_stats = {"pages": 0, "transferred_bytes": 0, "blocked_requests": 0,
+                               "estimated_bytes_saved": 0, "last_page": None}
+        self._resource_stats_lock = threading.Lock()
+        # Huts x days places matrix backing the collection-wide date queries
+        self.availability_matrix = AvailabilityMatrix()
+        # Grid over the parsed hut coordinates for bounding-box, radius and nearest queries
+        self.spatial_index = SpatialIndex()
+        # Remembers which IDs have no hut so refreshes can skip them
+        self.hut_index = HutIdIndex(self.id_index_file if use_cache else None)
+        # Append-only log of availability changes; also holds what changed since cache_file was last written
+        self.history = AvailabilityHistory(self.history_dir) if use_cache else None
+        self.database = HutDatabase(database) if isinstance(database, str) else database
+        self._stored_at = 0
+        self._stored_names = set()
         self.background_updates = background_updates
-        self.update_interval = update_interval  # Default: update every hour
+        self.update_interval = update_interval  # Default: look for new huts every hour
+        # Orders the background refreshes of known huts by when each is due
+        self.refresh_scheduler = RefreshScheduler(base_interval=self.stale_after,
+                                                  budget_per_hour=self.refresh_budget_per_hour)
         self.update_thread = None
         self.stop_update_thread = False
         
@@ -495,8 +973,10 @@ class HutCollection:
         )
         self.logger = logging.getLogger('HutCollection')
         
-        # Load from cache if available and requested
-        if use_cache and os.path.exists(self.cache_file):
+        # Load from the shared database, else from cache if available and requested
+        if self.database is not None and self.database.hut_count():
+            self._load_from_database()
+        elif use_cache and (os.path.exists(self.cache_file) or os.path.exists(self.legacy_cache_file)):
             self._load_from_cache()
         else:
             self._parse_huts()
@@ -505,90 +985,416 @@ class HutCollection:
         if background_updates:
             self.start_background_updates()
 
+    def __getstate__(self):
+        """Return state values to be pickled, without threads, locks and network clients."""
+        state = self.__dict__.copy()
+        for runtime_attr in ('update_thread', 'rate_limiter', 'hut_index', 'fetcher', '_resource_stats_lock',
+                             'availability_matrix', 'spatial_index', 'history', 'database',
+                             'refresh_scheduler'):
+            state.pop(runtime_attr, None)
+        return state
+
+    def __setstate__(self, state):
+        """Restore state from the unpickled state values."""
+        self.__dict__.update(state)
+        self.update_thread = None
+        self.fetcher = None
+        self.rate_limiter = AdaptiveRateLimiter()
+        self.hut_index = HutIdIndex()
+        self.history = None
+        self.database = None
+        self.refresh_scheduler = RefreshScheduler(base_interval=self.stale_after,
+                                                  budget_per_hour=self.refresh_budget_per_hour)
+        self._resource_stats_lock = threading.Lock()
+        if 'metrics' not in state:
+            self.metrics = ScrapeMetrics()
+        self.metrics_file = state.get('metrics_file')
+        self.availability_matrix = AvailabilityMatrix()
+        self.spatial_index = SpatialIndex()
+        if isinstance(self.huts, dict):
+            self.availability_matrix.rebuild(self.huts)
+            self.spatial_index.rebuild(self.huts)
+
     def _load_from_cache(self):
-        """Load huts from cache file if it exists"""
+        """Load huts from the hut store, or migrate them from the legacy pickle cache"""
         try:
-            with open(self.cache_file, 'rb') as f:
-                cached_data = pickle.load(f)
-                
+            if os.path.exists(self.cache_file):
+                stored = read_store(self.cache_file)
+                if self.lazy:
+                    # The matrix uses the mapped block as is; a hut's series is only read from it when accessed
+                    self.huts = {record["key"]: Hut.from_stored(record, loader=partial(stored.series, row))
+                                 for row, record in enumerate(stored.records)}
+                    self.availability_matrix.adopt(list(self.huts), stored.base_ordinal, stored.places)
+                else:
+                    self.huts = {name: Hut.from_stored(record, series) for name, record, series in stored.items()}
+                    self.availability_matrix.rebuild(self.huts)
+                self._stored_at, self._stored_names = stored.saved_at, set(self.huts)
+                self._apply_history_since(stored.saved_at)
+            else:
+                with open(self.legacy_cache_file, 'rb') as f:
+                    cached_data = pickle.load(f)
+
                 # Handle both cases: if cached_data is just the huts dictionary or the full object
                 if isinstance(cached_data, dict):
                     self.huts = cached_data
                 else:
                     self.huts = cached_data.huts
-                    
-                # Initialize background update attributes if they don't exist
-                if not hasattr(self, 'update_thread'):
-                    self.update_thread = None
-                if not hasattr(self, 'stop_update_thread'):
-                    self.stop_update_thread = False
-                    
-                self.logger.info(f"Loaded {len(self.huts)} huts from cache")
-                print(f"Loaded {len(self.huts)} huts from cache")
+                if self.save():
+                    self.logger.info(f"Migrated {len(self.huts)} huts from {self.legacy_cache_file} to {self.cache_file}")
+                self.availability_matrix.rebuild(self.huts)
+            self.spatial_index.rebuild(self.huts)
+
+            # Initialize background update attributes if they don't exist
+            if not hasattr(self, 'update_thread'):
+                self.update_thread = None
+            if not hasattr(self, 'stop_update_thread'):
+                self.stop_update_thread = False
+
+            self.logger.info(f"Loaded {len(self.huts)} huts from cache")
+            print(f"Loaded {len(self.huts)} huts from cache")
         except Exception as e:
             self.logger.error(f"Error loading from cache: {str(e)}")
             print(f"Error loading from cache: {str(e)}")
             self.huts = {}
             self._parse_huts()
 
-    def _save_to_cache(self):
-        """Save huts to cache file"""
+    def save(self, path=None):
+        """
+        Write all huts to a hut store file (atomically, so readers never see a partial file)
+        Args:
+            path: File to write (default: cache_file)
+        Returns:
+            True if the file was written
+        """
+        path = path or self.cache_file
         try:
-            # Create a simplified version of huts for pickling
-            pickle_data = {}
-            for name, hut in self.huts.items():
-                # Create a copy without problematic attributes if needed
-                pickle_data[name] = hut
-                
-            with open(self.cache_file, 'wb') as f:
-                pickle.dump(pickle_data, f, protocol=pickle.HIGHEST_PROTOCOL)
-                self.logger.info(f"Saved {len(self.huts)} huts to cache")
+            huts = dict(self.huts)
+            saved_at = time.time()
+            write_store(path, huts)
+            if path == self.cache_file:
+                self._stored_at, self._stored_names = saved_at, set(huts)
+            self.logger.info(f"Saved {len(self.huts)} huts to {path}")
+            return True
         except Exception as e:
             self.logger.error(f"Error saving to cache: {str(e)}")
             print(f"Error saving to cache: {str(e)}")
+            return False
+
+    def _load_from_database(self):
+        """Load all huts from the SQLite database"""
+        self.huts = {}
+        if self.lazy:
+            # Only the huts table is read; the matrix is built on the first query that needs it
+            for record in self.database.load_records():
+                hut = self._hut_from_database(record, loader=partial(self.database.load_series, record["id"]))
+                self.huts[hut.name] = hut
+                self.spatial_index.update_hut(hut.name, hut.coordinates)
+        else:
+            for record, series in self.database.load_huts():
+                self.add_hut(self._hut_from_database(record, series))
+        self.logger.info(f"Loaded {len(self.huts)} huts from {self.database.path}")
+        print(f"Loaded {len(self.huts)} huts from {self.database.path}")
+
+    @staticmethod
+    def _hut_from_database(record, series=None, loader=None):
+        text_fields = ("id", "name", "coordinates", "website", "img_url", "url")
+        record = {field: "" if value is None and field in text_fields else value for field, value in record.items()}
+        return Hut.from_stored(record, series, loader)
+
+    def _write_database(self, huts=None):
+        """Upsert huts (default: all) into the SQLite database, if one is configured"""
+        if self.database is None:
+            return
+        huts = list(self.huts.values()) if huts is None else huts
+        try:
+            written = self.database.upsert_huts(huts)
+            self.logger.info(f"Wrote {written} huts to {self.database.path}")
+        except Exception as e:
+            self.logger.error(f"Error writing huts to the database: {str(e)}")
+            print(f"Error writing huts to the database: {str(e)}")
+
+    def _hut_named(self, name):
+        """Hut by name, fetched from the database if another process added it"""
+        hut = self.huts.get(name)
+        if hut is None and self.database is not None:
+            loaded = self.database.load_hut(name)
+            if loaded is not None:
+                hut = self._hut_from_database(*loaded)
+                self.add_hut(hut)
+        return hut
+
+    def _save_to_cache(self, full=False, huts=None):
+        """
+        Append the availability changes to the history, and rewrite the hut store when it is due
+        Args:
+            full: Rewrite the hut store even if store_interval has not passed
+            huts: Hut objects whose availability may have changed (default: all); only these are
+                  compared with the history, so saving after a few refreshes stays cheap
+        """
+        if self.history is not None:
+            try:
+                changed = self.huts if huts is None else {hut.name: hut for hut in huts}
+                appended = self.history.record(changed)
+                self.logger.info(f"Appended {appended} bytes of availability changes to the history")
+            except Exception as e:
+                self.logger.error(f"Error appending to the availability history: {str(e)}")
+                full = True
+        # New or removed huts change the metadata, which only the store holds
+        if (full or self.history is None or set(self.huts) != self._stored_names
+                or time.time() - self._stored_at >= self.store_interval):
+            self.save()
+        self.hut_index.save()
+
+    def _apply_history_since(self, saved_at):
+        """Bring loaded huts up to date with availability changes recorded after the store was written"""
+        if self.history is None:
+            return
+        newer = 0
+        for name in self.history.updated_since(saved_at):
+            hut = self.huts.get(name)
+            if hut is not None:
+                series, recorded_at = self.history.latest(name)
+                hut.availability = series
+                self.availability_matrix.update_hut(name, series)
+                # The history only records fetches that changed something
+                hut.fetched_at = max(hut.fetched_at or 0, recorded_at)
+                hut.last_changed = max(hut.last_changed or 0, recorded_at)
+                newer += 1
+        if newer:
+            self.logger.info(f"Applied newer availability of {newer} huts from the history")
+
+    def get_availability_as_of(self, name, target_date, as_of):
+        """
+        Get the places a hut had on a date as they were known at some earlier time
+        Args:
+            name: Name of the hut
+            target_date: Date string in YYYY-MM-DD format or datetime.date object
+            as_of: datetime or Unix timestamp
+        Returns:
+            Number of places, or None if unknown (also when the history is disabled)
+        """
+        if self.history is None:
+            return None
+        return self.history.places_as_of(name, target_date, as_of)
 
-    def _parse_single_hut(self, hut_id):
-        """Parse a single hut by ID with retry mechanism"""
+    def get_availability_changes(self, name, target_date):
+        """
+        Get how the places of a hut on a date changed over the recorded refreshes
+        Args:
+            name: Name of the hut
+            target_date: Date string in YYYY-MM-DD format or datetime.date object
+        Returns:
+            List of (datetime, places) tuples, oldest first (empty when the history is disabled)
+        """
+        if self.history is None:
+            return []
+        return self.history.changes(name, target_date)
+
+    def _parse_single_hut(self, hut_id, driver_pool=None, use_fetcher=True):
+        """
+        Parse a single hut by ID with retry mechanism
+        Args:
+            hut_id: ID of the hut on hut-reservation.org
+            driver_pool: Optional DriverPool to lease a browser from. Without one,
+                         every attempt starts and quits its own Chrome instance.
+            use_fetcher: Try the configured fetcher before Selenium (default True)
+        """
         max_retries = 3
-        retry_delay = 2  # Initial delay in seconds
         
         for attempt in range(max_retries):
             try:
                 # Construct URL with leading zeros (e.g., 001, 002, etc.)
                 url = f"{self.base_url}{hut_id}/wizard/"
                 
-                hut = Hut(url)
+                with self.metrics.time('hut_total'):
+                    hut = self._fetch_hut(hut_id, url, driver_pool, use_fetcher)
                 
                 if hut.name != "Name not found":  # Only return if we successfully parsed the hut
+                    self.hut_index.mark_valid(hut_id)
+                    self.metrics.record_hut_done()
                     return hut
                 else:
                     self.logger.warning(f"Skipping hut {hut_id} - name not found")
+                    # Not a definite 404 like HutNotFoundError: a known hut stays valid
+                    self.hut_index.mark_missing(hut_id)
+                    self.metrics.record_failure('name_not_found')
                     return None
                     
+            except HutNotFoundError:
+                self.logger.warning(f"Skipping hut {hut_id} - not found")
+                self.hut_index.mark_invalid(hut_id)
+                self.metrics.record_failure('not_found')
+                return None
             except Exception as e:
                 self.logger.error(f"Error parsing hut {hut_id} (attempt {attempt+1}/{max_retries}): {str(e)}")
                 if attempt < max_retries - 1:
-                    # Exponential backoff with jitter
-                    sleep_time = retry_delay * (2 ** attempt) + random.uniform(0, 1)
-                    time.sleep(sleep_time)
+                    self.metrics.increment('retries')
+                    # Backoff is handled globally by the rate limiter; jitter keeps retries apart
+                    time.sleep(random.uniform(0, 1))
                 else:
                     self.logger.error(f"Failed to parse hut {hut_id} after {max_retries} attempts")
+                    self.hut_index.mark_failed(hut_id)
+                    self.metrics.record_failure(type(e).__name__)
                     return None
 
-    def _parse_huts(self, num_huts=439, max_workers=4):
+    def _fetch_hut(self, hut_id, url, driver_pool=None, use_fetcher=True):
+        """
+        Fetch a hut through the configured fetcher, falling back to Selenium
+        Args:
+            hut_id: ID of the hut
+            url: URL of the hut reservation page
+            driver_pool: Optional DriverPool for the Selenium path
+            use_fetcher: Try the configured fetcher before Selenium
+        Returns:
+            Hut object
+        """
+        if self.fetcher is not None and use_fetcher:
+            try:
+                with self.rate_limiter.slot(benign=(HutNotFoundError,)), self.metrics.time('http_fetch'):
+                    record = self.fetcher.fetch_hut(hut_id)
+                return Hut.from_record(record, url)
+            except HutNotFoundError:
+                raise
+            except Exception as e:
+                if not self.selenium_fallback:
+                    raise
+                self.logger.warning(f"Fetcher failed for hut {hut_id}, falling back to Selenium: {str(e)}")
+
+        # The slot is taken before leasing a browser, so no more browsers run than the limiter lets through;
+        # Chrome startup does not count as request latency (track_latency=False)
+        with self.rate_limiter.slot(track_latency=False), self._browser(driver_pool) as driver:
+            return Hut(url, driver=driver, metrics=self.metrics, keep_html=self.keep_html)
+
+    @contextmanager
+    def _browser(self, driver_pool=None):
+        """
+        A WebDriver for one scrape: leased from driver_pool, or started for it and quit afterwards
+        Yields:
+            WebDriver
+        """
+        if driver_pool is not None:
+            # A crashed driver is marked broken by the pool and replaced on the next lease
+            with driver_pool.lease() as pooled:
+                yield pooled.driver
+            return
+        with self.metrics.time('driver_start'):
+            driver = create_chrome_driver()
+        try:
+            yield driver
+        finally:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+    def _create_driver_pool(self, max_size):
+        """Create a DriverPool with this collection's browser settings"""
+        return DriverPool(max_size=max_size, max_pages=self.driver_max_pages,
+                          block_resources=self.block_resources, on_page_stats=self._record_page_stats,
+                          metrics=self.metrics)
+
+    def _record_page_stats(self, stats):
+        """Accumulate the per-page resource stats reported by a DriverPool"""
+        with self._resource_stats_lock:
+            self.resource_stats["pages"] += 1
+            self.resource_stats["transferred_bytes"] += stats["transferred_bytes"]
+            self.resource_stats["blocked_requests"] += stats["blocked_requests"]
+            self.resource_stats["estimated_bytes_saved"] += stats["estimated_bytes_saved"]
+            self.resource_stats["last_page"] = stats
+
+    def get_wait_stats(self):
+        """
+        Report how long the event-driven calendar waits actually took
+        Returns:
+            Dictionary mapping each wait (calendar_open, month_change, angular_stable)
+            to count, total, mean, max, p50, p95 and timeouts in seconds
+        """
+        summary = self.metrics.summary()
+        return {name: stats for name, stats in summary.items() if name in self.wait_stages}
+
+    def get_metrics(self):
+        """
+        Report where scraping time goes
+        Returns:
+            Dictionary with per-stage timings and histograms ('stages': driver_start, page_load,
+            angular_wait, calendar_button, month_navigation, cell_parse, metadata_script,
+            soup_parse, metadata_parse, http_fetch, hut_total and the calendar waits), 'counters'
+            (retries), 'failures' by cause, 'huts_done' and 'huts_per_minute'
+        """
+        return self.metrics.to_dict()
+
+    def write_metrics(self, path=None):
+        """
+        Write the scrape metrics in the Prometheus text format
+        Args:
+            path: Target file (default: metrics_file)
+        """
+        path = path or self.metrics_file
+        if not path:
+            return
+        try:
+            self.metrics.write_prometheus(path)
+        except Exception as e:
+            self.logger.error(f"Error writing scrape metrics: {str(e)}")
+
+    def memory_report(self, top=5):
+        """
+        Estimate how much memory the collection holds
+        Args:
+            top: Number of largest huts to list
+        Returns:
+            Dictionary with the number of huts, total and per-hut bytes, the largest huts,
+            bytes held in HTML snapshots and the size of the query indexes
+        """
+        huts = self.huts.values() if isinstance(self.huts, dict) else self.huts
+        sizes = [(getattr(hut, 'name', str(hut)), hut.memory_size() if isinstance(hut, Hut) else deep_getsizeof(hut))
+                 for hut in huts]
+        hut_bytes = sum(size for _, size in sizes)
+        html_bytes = sum(deep_getsizeof(hut.html_snapshot) for hut in huts if getattr(hut, 'html_snapshot', None))
+        matrix_bytes = deep_getsizeof(self.availability_matrix)
+        spatial_bytes = deep_getsizeof(self.spatial_index)
+        return {
+            "huts": len(sizes),
+            "hut_bytes": hut_bytes,
+            "bytes_per_hut": hut_bytes / len(sizes) if sizes else 0,
+            "largest_huts": sorted(sizes, key=lambda item: item[1], reverse=True)[:top],
+            "html_snapshot_bytes": html_bytes,
+            "availability_matrix_bytes": matrix_bytes,
+            "spatial_index_bytes": spatial_bytes,
+            "total_bytes": hut_bytes + matrix_bytes + spatial_bytes,
+        }
+
+    def get_resource_stats(self):
+        """
+        Report the network savings of resource blocking
+        Returns:
+            Dictionary with totals over all pages loaded, per-page averages and the last page's stats
+        """
+        with self._resource_stats_lock:
+            stats = dict(self.resource_stats)
+        pages = stats["pages"]
+        stats["avg_transferred_bytes"] = stats["transferred_bytes"] / pages if pages else 0
+        stats["avg_estimated_bytes_saved"] = stats["estimated_bytes_saved"] / pages if pages else 0
+        return stats
+
+    def _parse_huts(self, num_huts=439, max_workers=None):
         """
         Parse huts from the base URL and add them to the collection using parallel processing
         Args:
             num_huts: Number of huts to parse (default 5)
-            max_workers: Maximum number of parallel workers (default 4)
+            max_workers: Maximum number of parallel workers and browsers (default: the rate
+                         limiter's current concurrency limit)
         """
-        # Create a list of hut IDs to process
-        hut_ids = [str(i) for i in range(1, num_huts + 1)]
+        if max_workers is None:
+            max_workers = max(int(self.rate_limiter.concurrency_limit), 1)
+        # IDs known to have no hut are skipped until their re-probe is due
+        hut_ids = self.hut_index.ids_to_fetch(num_huts)
         
-        # Process huts in parallel
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Process huts in parallel, sharing one browser per worker
+        with self._create_driver_pool(max_workers) as driver_pool, \
+                concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
             # Submit all tasks and create a dictionary mapping futures to hut_ids
-            future_to_hut_id = {executor.submit(self._parse_single_hut, hut_id): hut_id for hut_id in hut_ids}
+            future_to_hut_id = {executor.submit(self._parse_single_hut, hut_id, driver_pool): hut_id for hut_id in hut_ids}
             
             # Process results as they complete with a progress bar
             with tqdm(total=len(hut_ids), desc="Parsing huts") as pbar:
@@ -597,7 +1403,7 @@ class HutCollection:
                     try:
                         hut = future.result()
                         if hut:
-                            self.huts[hut.name] = hut
+                            self.add_hut(hut, fetched=True)
                             self.logger.info(f"Successfully added hut: {hut.name}")
                     except Exception as e:
                         self.logger.error(f"Exception processing hut {hut_id}: {str(e)}")
@@ -609,8 +1415,10 @@ class HutCollection:
             self._create_test_huts()
         
         # Save to cache after parsing
+        self._write_database()
         if self.use_cache:
-            self._save_to_cache()
+            self._save_to_cache(full=True)
+        self.write_metrics()
         
         self.logger.info(f"Finished parsing {len(self.huts)} huts")
         print(f"Finished parsing {len(self.huts)} huts")
@@ -703,11 +1511,101 @@ class HutCollection:
             
             # Create and add the test hut
             test_hut = TestHut(hut_data)
-            self.huts[test_hut.name] = test_hut
+            self.add_hut(test_hut)
             self.logger.info(f"Added test hut: {test_hut.name}")
 
-    def add_hut(self, hut):
+    def add_hut(self, hut, fetched=False):
+        """
+        Add or replace a hut
+        Args:
+            hut: Hut object
+            fetched: The hut's availability was just fetched; stamps fetched_at, and last_changed
+                     if any places differ from the previous fetch
+        """
+        previous = self.huts.get(hut.name)
         self.huts[hut.name] = hut
+        changed = self.availability_matrix.update_hut(hut.name, hut.availability)
+        self.spatial_index.update_hut(hut.name, hut.coordinates)
+        if fetched:
+            if previous is not None and previous is not hut and hut.last_changed is None:
+                hut.last_changed = previous.last_changed  # Re-parsed into a new Hut object
+            hut.fetched_at = time.time()
+            if changed or hut.last_changed is None:
+                hut.last_changed = hut.fetched_at
+            self.refresh_scheduler.record_result(hut.id, changed, now=hut.fetched_at)
+
+    def record_demand(self, name, weight=1.0):
+        """
+        Note that someone looked at a hut, so the background worker refreshes it more often
+        Args:
+            name: Name of the hut
+            weight: Strength of the signal (1 per lookup)
+        """
+        hut = self.huts.get(name)
+        if hut is not None:
+            self.refresh_scheduler.record_demand(hut.id, weight)
+
+    def data_age(self, name):
+        """
+        Seconds since the availability of a hut was last fetched
+        Args:
+            name: Name of the hut
+        Returns:
+            Age in seconds, or None if the hut is unknown or its fetch time was not recorded
+        """
+        hut = self.huts.get(name)
+        if hut is None or getattr(hut, 'fetched_at', None) is None:
+            return None
+        return max(time.time() - hut.fetched_at, 0.0)
+
+    def is_stale(self, hut, max_age=None):
+        """Whether a hut's availability is older than max_age seconds (default: stale_after) or of unknown age"""
+        fetched_at = getattr(hut, 'fetched_at', None)
+        max_age = self.stale_after if max_age is None else max_age
+        return fetched_at is None or time.time() - fetched_at > max_age
+
+    def stale_huts(self, max_age=None):
+        """
+        Huts whose availability needs a refresh
+        Args:
+            max_age: Maximum age in seconds (default: stale_after)
+        Returns:
+            List of Hut objects, oldest data first (huts never fetched come first)
+        """
+        stale = [hut for hut in self.huts.values() if self.is_stale(hut, max_age)]
+        return sorted(stale, key=lambda hut: getattr(hut, 'fetched_at', None) or 0)
+
+    def refresh_stale_huts(self, max_age=None, max_workers=None):
+        """
+        Refresh only the huts whose availability is older than max_age
+        Args:
+            max_age: Maximum age in seconds (default: stale_after)
+            max_workers: Maximum number of parallel workers, as for refresh_all_huts
+        Returns:
+            Number of stale huts that were refreshed
+        """
+        stale = self.stale_huts(max_age)
+        if stale:
+            self.refresh_all_huts(max_workers, huts=stale)
+        return len(stale)
+
+    def _matrix(self):
+        """The availability matrix, rebuilt if huts were added to self.huts directly"""
+        if len(self.availability_matrix) != len(self.huts):
+            self.availability_matrix.rebuild(self.huts)
+        return self.availability_matrix
+
+    def _spatial(self):
+        """The spatial index, rebuilt if huts were added to self.huts directly"""
+        if len(self.spatial_index) != len(self.huts):
+            self.spatial_index.rebuild(self.huts)
+        return self.spatial_index
+
+    def _available_names(self, target_date, min_places):
+        """Names of the huts with min_places free on target_date, or None when no date is given"""
+        if target_date is None:
+            return None
+        return {name for name, _ in self._matrix().huts_with_min_places(target_date, min_places)}
 
     def __str__(self):
         return f"{self.huts}"
@@ -726,6 +1624,7 @@ class HutCollection:
         """
         if name not in self.huts:
             return None
+        self.record_demand(name)
         return self.huts[name].get_availability_for_date(target_date)
 
     def get_all_availability(self, date):
@@ -749,12 +1648,20 @@ class HutCollection:
         """
         available_huts = []
         
+        if self.database is not None:
+            # The (date, places) index answers the query; huts added by other processes are loaded on demand
+            ordinal = to_ordinal(target_date)
+            for name, places in self.database.available_huts(target_date, min_places):
+                hut = self._hut_named(name)
+                if hut is not None:
+                    available_huts.append((hut, availability.from_ordinal(ordinal, places)))
         # Check if self.huts is a dictionary
-        if isinstance(self.huts, dict):
-            for hut in self.huts.values():
-                avail = hut.get_availability_for_date(target_date)
-                if avail and avail.places >= min_places:
-                    available_huts.append((hut, avail))
+        elif isinstance(self.huts, dict):
+            # A column slice of the matrix finds the matching huts without visiting every hut
+            # (or, for lazily loaded huts, reading their series)
+            ordinal = to_ordinal(target_date)
+            for name, places in self._matrix().huts_with_min_places(target_date, min_places):
+                available_huts.append((self.huts[name], availability.from_ordinal(ordinal, places)))
         else:
             # If self.huts is not a dictionary (possibly a tuple or list)
             for hut in self.huts:
@@ -773,35 +1680,59 @@ class HutCollection:
         Returns:
             List of Hut objects matching the query
         """
-        query = query.lower()
-        return [hut for hut in self.huts.values() 
-                if query in hut.name.lower()]
+        if self.database is not None:
+            matches = [hut for hut in map(self._hut_named, self.database.search(query)) if hut is not None]
+        else:
+            query = query.lower()
+            matches = [hut for hut in self.huts.values()
+                       if query in hut.name.lower()]
+        for hut in matches:
+            self.record_demand(hut.name, 1.0 / len(matches))  # A broad search says little about each hut
+        return matches
 
-    def filter_huts_by_coordinates(self, lat_range=None, lon_range=None):
+    def filter_huts_by_coordinates(self, lat_range=None, lon_range=None, target_date=None, min_places=1):
         """
         Filter huts by coordinate ranges
         Args:
             lat_range: Tuple of (min_lat, max_lat)
             lon_range: Tuple of (min_lon, max_lon)
+            target_date: Optional date; only huts with min_places free on it are returned
+            min_places: Minimum number of places needed on target_date (default 1)
         Returns:
             List of Hut objects within the coordinate ranges
         """
-        filtered_huts = []
-        for hut in self.huts.values():
-            try:
-                # Parse coordinates (assuming format "lat, lon")
-                if hut.coordinates and "," in hut.coordinates:
-                    lat, lon = map(float, hut.coordinates.split(','))
-                    
-                    if lat_range and not (lat_range[0] <= lat <= lat_range[1]):
-                        continue
-                    if lon_range and not (lon_range[0] <= lon <= lon_range[1]):
-                        continue
-                    
-                    filtered_huts.append(hut)
-            except (ValueError, AttributeError):
-                continue
-        return filtered_huts
+        names = self._spatial().bbox(lat_range, lon_range, self._available_names(target_date, min_places))
+        return [self.huts[name] for name in names]
+
+    def find_huts_near(self, lat, lon, radius_km, target_date=None, min_places=1):
+        """
+        Find huts within a distance of a point
+        Args:
+            lat: Latitude of the point
+            lon: Longitude of the point
+            radius_km: Maximum great-circle distance in kilometres
+            target_date: Optional date; only huts with min_places free on it are returned
+            min_places: Minimum number of places needed on target_date (default 1)
+        Returns:
+            List of tuples (hut, distance in km), nearest first
+        """
+        found = self._spatial().within_radius(lat, lon, radius_km, self._available_names(target_date, min_places))
+        return [(self.huts[name], distance) for name, distance in found]
+
+    def find_nearest_huts(self, lat, lon, k=5, target_date=None, min_places=1):
+        """
+        Find the huts closest to a point
+        Args:
+            lat: Latitude of the point
+            lon: Longitude of the point
+            k: Number of huts to return (default 5)
+            target_date: Optional date; only huts with min_places free on it are considered
+            min_places: Minimum number of places needed on target_date (default 1)
+        Returns:
+            List of tuples (hut, distance in km), nearest first
+        """
+        found = self._spatial().nearest(lat, lon, k, self._available_names(target_date, min_places))
+        return [(self.huts[name], distance) for name, distance in found]
 
     def get_huts_with_min_capacity(self, date, min_places):
         """
@@ -812,32 +1743,70 @@ class HutCollection:
         Returns:
             List of tuples (hut, availability) meeting the criteria
         """
-        return [(hut, avail) for hut, avail in self.get_all_available_huts(date)
-                if avail.places >= min_places]
+        return self.get_all_available_huts(date, min_places)
 
     def find_consecutive_availability(self, start_date, num_nights, min_places=1):
         """
         Find huts available for consecutive nights
         Args:
-            start_date: Start date string
+            start_date: Date string in YYYY-MM-DD format or datetime.date of the first night
             num_nights: Number of consecutive nights needed
             min_places: Minimum number of places needed per night
         Returns:
             List of Hut objects available for the entire period
         """
-        available_huts = []
-        for hut in self.huts.values():
-            consecutive_available = True
-            for i in range(num_nights):
-                # Note: This assumes dates can be compared as strings
-                # You might need to adjust based on your date format
-                current_date = start_date  # You'll need to implement date addition
-                if not hut.is_available(current_date, min_places):
-                    consecutive_available = False
-                    break
-            if consecutive_available:
-                available_huts.append(hut)
-        return available_huts
+        return [hut for hut, _ in self.find_consecutive_windows(start_date, start_date, num_nights, min_places)]
+
+    def find_consecutive_windows(self, first_start_date, last_start_date, num_nights, min_places=1):
+        """
+        Find, for every hut, all start dates in a range from which a multi-night stay is possible
+        Args:
+            first_start_date: Earliest first night (YYYY-MM-DD string or datetime.date)
+            last_start_date: Latest first night, inclusive
+            num_nights: Number of consecutive nights needed
+            min_places: Minimum number of places needed every night
+        Returns:
+            List of tuples (hut, list of datetime.date start dates) for huts with at least one start date
+        """
+        windows = self._matrix().huts_with_consecutive_places(first_start_date, last_start_date,
+                                                               num_nights, min_places)
+        return [(self.huts[name], start_dates) for name, start_dates in windows]
+
+    def plan_tours(self, nights, start_hut=None, area=None, first_start_date=None, last_start_date=None,
+                   party_size=1, max_distance_km=15.0, limit=10, per_date_limit=3):
+        """
+        Plan hut-to-hut tours where every night's hut has space for the party
+        Args:
+            nights: Number of nights, each in a different hut
+            start_hut: Name of the hut to start at
+            area: Tuple (lat, lon, radius_km) to start anywhere within (default: any hut)
+            first_start_date: Earliest first night (default: today)
+            last_start_date: Latest first night, inclusive (default: first_start_date)
+            party_size: Places needed every night (default 1)
+            max_distance_km: Maximum straight-line distance between consecutive huts
+            limit: Number of tours to return (default 10)
+            per_date_limit: Maximum number of tours starting on the same date (default 3)
+        Returns:
+            List of TourItinerary objects, shortest total distance first
+        """
+        if first_start_date is None:
+            first_start_date = datetime.now().date()
+        if last_start_date is None:
+            last_start_date = first_start_date
+        if start_hut is not None:
+            start_names = [start_hut]
+        elif area is not None:
+            lat, lon, radius_km = area
+            start_names = [name for name, _ in self._spatial().within_radius(lat, lon, radius_km)]
+        else:
+            start_names = list(self.huts)
+
+        planner = TourPlanner(self._spatial(), self._matrix())
+        tours = planner.plan(start_names, first_start_date, last_start_date, nights, party_size,
+                             max_distance_km, limit, per_date_limit)
+        for tour in tours:
+            tour.huts = [self.huts[name] for name in tour.hut_names]
+        return tours
 
     def get_huts_sorted_by_availability(self, date):
         """
@@ -847,8 +1816,85 @@ class HutCollection:
         Returns:
             List of tuples (hut, availability) sorted by places available
         """
-        available_huts = self.get_all_available_huts(date)
-        return sorted(available_huts, key=lambda x: x[1].places, reverse=True)
+        if self.database is not None:
+            ordinal = to_ordinal(date)
+            return [(hut, availability.from_ordinal(ordinal, places))
+                    for hut, places in ((self._hut_named(name), places)
+                                        for name, places in self.database.available_huts(date, 1, sort=True))
+                    if hut is not None]
+        if not isinstance(self.huts, dict):
+            available_huts = self.get_all_available_huts(date)
+            return sorted(available_huts, key=lambda x: x[1].places, reverse=True)
+        ordinal = to_ordinal(date)
+        return [(self.huts[name], availability.from_ordinal(ordinal, places))
+                for name, places in self._matrix().huts_with_min_places(date, 1, sort=True)]
+
+    def _metadata_is_stale(self, hut):
+        """Whether a hut's static metadata is due for a full re-parse"""
+        fetched_at = getattr(getattr(hut, 'metadata', None), 'fetched_at', None)
+        return fetched_at is None or time.time() - fetched_at > self.metadata_max_age
+
+    def _refresh_single_hut(self, hut, driver_pool=None, use_fetcher=True):
+        """
+        Refresh a known hut with retries, fetching only its calendar unless the metadata is stale
+        Args:
+            hut: Hut object to refresh in place
+            driver_pool: Optional DriverPool to lease a browser from
+            use_fetcher: Try the configured fetcher before Selenium
+        Returns:
+            The refreshed Hut object, or None if it could not be refreshed
+        """
+        if self._metadata_is_stale(hut):
+            return self._parse_single_hut(hut.id, driver_pool, use_fetcher)
+
+        max_retries = 3
+        for attempt in range(max_retries):
+            try:
+                with self.metrics.time('hut_total'):
+                    refreshed = self._fetch_availability(hut, driver_pool, use_fetcher)
+                if refreshed:
+                    self.metrics.record_hut_done()
+                    return hut
+                self.logger.warning(f"Could not read calendar of hut {hut.name}")
+                self.metrics.record_failure('calendar_missing')
+                return None
+            except HutNotFoundError:
+                self.logger.warning(f"Hut {hut.id} no longer exists")
+                self.hut_index.mark_invalid(hut.id)
+                self.metrics.record_failure('not_found')
+                return None
+            except Exception as e:
+                self.logger.error(f"Error refreshing hut {hut.id} (attempt {attempt+1}/{max_retries}): {str(e)}")
+                if attempt < max_retries - 1:
+                    self.metrics.increment('retries')
+                    # Backoff is handled globally by the rate limiter; jitter keeps retries apart
+                    time.sleep(random.uniform(0, 1))
+                else:
+                    self.metrics.record_failure(type(e).__name__)
+        self.logger.error(f"Failed to refresh hut {hut.id} after {max_retries} attempts")
+        return None
+
+    def _fetch_availability(self, hut, driver_pool=None, use_fetcher=True):
+        """
+        Replace a hut's availability through the configured fetcher, falling back to Selenium
+        Returns:
+            True if the calendar was read, False otherwise
+        """
+        if self.fetcher is not None and use_fetcher:
+            try:
+                with self.rate_limiter.slot(benign=(HutNotFoundError,)), self.metrics.time('http_fetch'):
+                    days = self.fetcher.fetch_availability(hut.id)
+                hut.availability = AvailabilitySeries.from_records(days)
+                return True
+            except HutNotFoundError:
+                raise
+            except Exception as e:
+                if not self.selenium_fallback:
+                    raise
+                self.logger.warning(f"Fetcher failed for hut {hut.id}, falling back to Selenium: {str(e)}")
+
+        with self.rate_limiter.slot(track_latency=False), self._browser(driver_pool) as driver:
+            return hut.refresh_availability(driver, metrics=self.metrics)
 
     def refresh_hut(self, name):
         """
@@ -864,14 +1910,15 @@ class HutCollection:
             
         try:
             hut = self.huts[name]
-            hut_id = hut.id
             
-            # Re-parse the hut
-            refreshed_hut = self._parse_single_hut(hut_id)
+            # Re-read the calendar (and the metadata only when it is due)
+            with self._create_driver_pool(1) as driver_pool:
+                refreshed_hut = self._refresh_single_hut(hut, driver_pool)
             if refreshed_hut:
-                self.huts[name] = refreshed_hut
+                self.add_hut(refreshed_hut, fetched=True)
+                self._write_database([refreshed_hut])
                 if self.use_cache:
-                    self._save_to_cache()
+                    self._save_to_cache(huts=[refreshed_hut])
                 self.logger.info(f"Successfully refreshed hut: {name}")
                 return True
             else:
@@ -881,18 +1928,26 @@ class HutCollection:
             self.logger.error(f"Error refreshing hut {name}: {str(e)}")
             return False
             
-    def refresh_all_huts(self, max_workers=4):
+    def refresh_all_huts(self, max_workers=None, huts=None):
         """
-        Refresh data for all huts in the collection
+        Refresh data for all huts in the collection. Only the calendars are fetched,
+        except for huts whose metadata is older than metadata_max_age.
         Args:
-            max_workers: Maximum number of parallel workers
+            max_workers: Maximum number of parallel workers and browsers (default: the rate
+                         limiter's current concurrency limit)
+            huts: Hut objects to refresh (default: all)
         """
-        hut_ids = [hut.id for hut in self.huts.values()]
+        if max_workers is None:
+            max_workers = max(int(self.rate_limiter.concurrency_limit), 1)
+        known_huts = list(self.huts.values()) if huts is None else list(huts)
+        hut_ids = [hut.id for hut in known_huts]
+        refreshed = []
         
-        # Process huts in parallel
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Process huts in parallel, sharing one browser per worker
+        with self._create_driver_pool(max_workers) as driver_pool, \
+                concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
             # Submit all tasks and create a dictionary mapping futures to hut_ids
-            future_to_hut_id = {executor.submit(self._parse_single_hut, hut_id): hut_id for hut_id in hut_ids}
+            future_to_hut_id = {executor.submit(self._refresh_single_hut, hut, driver_pool): hut.id for hut in known_huts}
             
             # Process results as they complete with a progress bar
             with tqdm(total=len(hut_ids), desc="Refreshing huts") as pbar:
@@ -901,15 +1956,192 @@ class HutCollection:
                     try:
                         hut = future.result()
                         if hut:
-                            self.huts[hut.name] = hut
+                            self.add_hut(hut, fetched=True)
+                            refreshed.append(hut)
                             self.logger.info(f"Successfully refreshed hut: {hut.name}")
                     except Exception as e:
                         self.logger.error(f"Exception refreshing hut {hut_id}: {str(e)}")
                     pbar.update(1)
         
         # Save to cache after refreshing
+        self._write_database(refreshed)
         if self.use_cache:
-            self._save_to_cache()
+            self._save_to_cache(huts=refreshed)
+        self.write_metrics()
+
+    async def refresh(self, hut_ids=None, num_huts=439, max_concurrency=100, per_host_limit=20, max_browsers=4,
+                      max_age=None, driver_pool=None):
+        """
+        Refresh huts concurrently on the asyncio event loop.
+
+        Huts already in the collection only get their calendar re-read, unless their
+        metadata is older than metadata_max_age. Fetchers with async methods run
+        entirely on the loop, so hundreds of huts can be in flight without a thread each. Selenium scraping (no fetcher, or
+        fallback) runs on at most max_browsers threads sharing a DriverPool.
+        Cancelling the awaiting task cancels all fetches that have not finished yet.
+        Args:
+            hut_ids: IDs to refresh (default: the IDs from 1 to num_huts that are not known to be dead, like _parse_huts)
+            num_huts: Highest hut ID to try when hut_ids is not given
+            max_concurrency: Maximum number of huts in flight
+            per_host_limit: Maximum number of huts in flight against one host
+            max_browsers: Maximum number of concurrent Selenium scrapes
+            max_age: Skip known huts whose availability is younger than this many seconds
+                     (default: refresh them all)
+            driver_pool: DriverPool to scrape with, left running afterwards (default: a new
+                         pool of max_browsers, shut down when the refresh is done)
+        Returns:
+            Number of huts that were refreshed
+        """
+        if hut_ids is None:
+            hut_ids = self.hut_index.ids_to_fetch(num_huts)
+        hut_ids = list(hut_ids)
+        if max_age is not None:
+            fresh = {str(hut.id) for hut in self.huts.values() if not self.is_stale(hut, max_age)}
+            hut_ids = [hut_id for hut_id in hut_ids if str(hut_id) not in fresh]
+
+        engine = AsyncScrapeEngine(max_concurrency=max_concurrency, per_host_limit=per_host_limit)
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_browsers)
+        own_driver_pool = driver_pool is None
+        if own_driver_pool:
+            driver_pool = self._create_driver_pool(max_browsers)
+        http_session = None
+        if self.fetcher is not None and hasattr(self.fetcher, 'fetch_hut_async'):
+            import aiohttp
+            # Optional one-time setup (e.g. HttpHutFetcher's CSRF token) before the concurrent requests start
+            prepare = getattr(self.fetcher, 'prepare', None)
+            if prepare is not None:
+                await asyncio.get_running_loop().run_in_executor(executor, prepare)
+            http_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=max_concurrency, limit_per_host=per_host_limit),
+                timeout=aiohttp.ClientTimeout(total=getattr(self.fetcher, 'timeout', 10)),
+            )
+
+        known_huts = {hut.id: hut for hut in self.huts.values()}
+
+        async def worker(hut_id):
+            hut = known_huts.get(hut_id)
+            if hut is not None and not self._metadata_is_stale(hut):
+                return await self._refresh_hut_async(hut, http_session, executor, driver_pool)
+            return await self._fetch_hut_async(hut_id, http_session, executor, driver_pool)
+
+        def on_result(hut_id, hut):
+            if hut:
+                self.add_hut(hut, fetched=True)
+                self.logger.info(f"Successfully refreshed hut: {hut.name}")
+
+        try:
+            results = await engine.run(hut_ids, worker, host_of=self._host_for_hut, on_result=on_result)
+        finally:
+            if http_session is not None:
+                await http_session.close()
+            # Scrapes already running in a browser finish in the background; their drivers
+            # are quit when returned if the pool is shut down.
+            executor.shutdown(wait=False, cancel_futures=True)
+            if own_driver_pool:
+                driver_pool.shutdown()
+
+        refreshed_huts = [hut for hut in results.values() if hut]
+        self._write_database(refreshed_huts)
+        if self.use_cache:
+            self._save_to_cache(huts=refreshed_huts)
+        self.write_metrics()
+        refreshed = len(refreshed_huts)
+        self.logger.info(f"Finished async refresh of {refreshed}/{len(hut_ids)} huts")
+        return refreshed
+
+    def _host_for_hut(self, hut_id):
+        """Host that fetching the given hut talks to, for per-host limits"""
+        if self.fetcher is not None and hasattr(self.fetcher, 'api_base'):
+            return urlparse(self.fetcher.api_base).netloc
+        return urlparse(self.base_url).netloc
+
+    async def _fetch_hut_async(self, hut_id, http_session, executor, driver_pool):
+        """
+        Fetch a single hut on the event loop with retries, falling back to Selenium in a thread
+        Returns:
+            Hut object, or None if the hut does not exist or could not be fetched
+        """
+        url = f"{self.base_url}{hut_id}/wizard/"
+        if http_session is not None:
+            max_retries = 3
+            last_error = None
+            for attempt in range(max_retries):
+                try:
+                    async with self.rate_limiter.slot(benign=(HutNotFoundError,)):
+                        with self.metrics.time('http_fetch'):
+                            record = await self.fetcher.fetch_hut_async(http_session, hut_id)
+                    self.hut_index.mark_valid(hut_id)
+                    self.metrics.record_hut_done()
+                    return Hut.from_record(record, url)
+                except HutNotFoundError:
+                    self.logger.warning(f"Skipping hut {hut_id} - not found")
+                    self.hut_index.mark_invalid(hut_id)
+                    self.metrics.record_failure('not_found')
+                    return None
+                except Exception as e:
+                    self.logger.error(f"Error fetching hut {hut_id} (attempt {attempt+1}/{max_retries}): {str(e)}")
+                    last_error = e
+                    if attempt < max_retries - 1:
+                        self.metrics.increment('retries')
+                        # Backoff is handled globally by the rate limiter; jitter keeps retries apart
+                        await asyncio.sleep(random.uniform(0, 1))
+
+            if not self.selenium_fallback:
+                self.logger.error(f"Failed to fetch hut {hut_id} after {max_retries} attempts")
+                self.hut_index.mark_failed(hut_id)
+                self.metrics.record_failure(type(last_error).__name__)
+                return None
+            self.logger.warning(f"Fetcher failed for hut {hut_id}, falling back to Selenium")
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, self._parse_single_hut, hut_id, driver_pool, http_session is None)
+
+    async def _refresh_hut_async(self, hut, http_session, executor, driver_pool):
+        """
+        Re-read the calendar of a known hut on the event loop, falling back to Selenium in a thread
+        Returns:
+            The refreshed Hut object, or None if it could not be refreshed
+        """
+        if http_session is not None:
+            max_retries = 3
+            last_error = None
+            for attempt in range(max_retries):
+                try:
+                    async with self.rate_limiter.slot(benign=(HutNotFoundError,)):
+                        with self.metrics.time('http_fetch'):
+                            days = await self.fetcher.fetch_availability_async(http_session, hut.id)
+                    hut.availability = AvailabilitySeries.from_records(days)
+                    self.metrics.record_hut_done()
+                    return hut
+                except HutNotFoundError:
+                    self.logger.warning(f"Hut {hut.id} no longer exists")
+                    self.hut_index.mark_invalid(hut.id)
+                    self.metrics.record_failure('not_found')
+                    return None
+                except Exception as e:
+                    self.logger.error(f"Error refreshing hut {hut.id} (attempt {attempt+1}/{max_retries}): {str(e)}")
+                    last_error = e
+                    if attempt < max_retries - 1:
+                        self.metrics.increment('retries')
+                        # Backoff is handled globally by the rate limiter; jitter keeps retries apart
+                        await asyncio.sleep(random.uniform(0, 1))
+
+            if not self.selenium_fallback:
+                self.logger.error(f"Failed to refresh hut {hut.id} after {max_retries} attempts")
+                self.metrics.record_failure(type(last_error).__name__)
+                return None
+            self.logger.warning(f"Fetcher failed for hut {hut.id}, falling back to Selenium")
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, self._refresh_single_hut, hut, driver_pool, http_session is None)
+
+    def get_rate_limit_stats(self):
+        """
+        Report the current state of the shared rate limiter
+        Returns:
+            Dictionary with the current request rate, concurrency limit and counters
+        """
+        return self.rate_limiter.stats()
 
     def start_background_updates(self):
         """Start a background thread to periodically update hut data"""
@@ -929,40 +2161,99 @@ class HutCollection:
             self.update_thread.join(timeout=10)  # Wait up to 10 seconds for thread to finish
             self.logger.info("Stopped background updates")
             
+    def _schedule_known_huts(self):
+        """Put every hut on the refresh schedule, due stale_after seconds after its last fetch"""
+        self.refresh_scheduler.base_interval = self.stale_after
+        for hut in list(self.huts.values()):
+            self.refresh_scheduler.add(hut.id, getattr(hut, 'fetched_at', None))
+
+    def _refresh_due_huts(self, loop, driver_pool):
+        """
+        Refresh the huts the scheduler says are due, as far as the request budget allows
+        Args:
+            loop: Event loop to run the refresh on
+            driver_pool: DriverPool to scrape with
+        Returns:
+            Number of huts that were due
+        """
+        due = self.refresh_scheduler.pop_due(limit=self.refresh_batch_size)
+        if not due:
+            return 0
+        hut_ids = {str(hut.id): hut.id for hut in self.huts.values()}
+        self.logger.info(f"Refreshing {len(due)} due huts")
+        try:
+            loop.run_until_complete(self.refresh(hut_ids=[hut_ids.get(hut_id, hut_id) for hut_id in due],
+                                                 max_browsers=driver_pool.max_size, driver_pool=driver_pool))
+        finally:
+            # Refreshed huts were rescheduled by add_hut; the others are retried after a backoff
+            for hut_id in due:
+                self.refresh_scheduler.record_failure(hut_id)
+        return len(due)
+
+    def _scan_for_new_huts(self, loop, driver_pool, num_huts=439):
+        """
+        Try the hut IDs not in the collection yet, within the scheduler's request budget
+        Args:
+            loop: Event loop to run the refresh on
+            driver_pool: DriverPool to scrape with
+            num_huts: Highest hut ID to try
+        """
+        known = {str(hut.id) for hut in self.huts.values()}
+        candidates = [hut_id for hut_id in self.hut_index.ids_to_fetch(num_huts) if str(hut_id) not in known]
+        granted = self.refresh_scheduler.acquire(len(candidates))
+        self.logger.info(f"Scanning {granted}/{len(candidates)} unknown hut IDs for new huts")
+        if granted:
+            loop.run_until_complete(self.refresh(hut_ids=candidates[:granted], max_browsers=driver_pool.max_size,
+                                                 driver_pool=driver_pool))
+
     def _background_update_worker(self):
-        """Worker function for background updates"""
+        """
+        Worker function for background updates. Known huts are refreshed one batch at a time
+        as refresh_scheduler finds them due; every update_interval the unknown IDs are
+        scanned for new huts. All batches run on one event loop and share one DriverPool,
+        so the browsers are not restarted for every batch.
+        """
         self.logger.info("Background update worker started")
         
         # Add debug logging to track execution
         print("Background update worker started with interval:", self.update_interval)
         self.logger.info(f"Update interval set to {self.update_interval} seconds")
+        self._schedule_known_huts()
+        # Wait a full interval to avoid a scan immediately after initialization
+        next_scan = time.time() + self.update_interval
+        loop = asyncio.new_event_loop()
+        # Use a small number of browsers to avoid overloading the server
+        driver_pool = self._create_driver_pool(2)
         
         while not self.stop_update_thread:
             try:
-                # Sleep first to avoid immediate update after initialization
-                for _ in range(self.update_interval):
+                if self._refresh_due_huts(loop, driver_pool):
+                    continue
+
+                if time.time() >= next_scan:
+                    self.logger.info("Starting background scan for new huts")
+                    print("Starting background scan for new huts")  # Add visible console output
+                    self._scan_for_new_huts(loop, driver_pool)
+                    next_scan = time.time() + self.update_interval
+                    print("Completed background scan for new huts")  # Add visible console output
+                    continue
+
+                # Sleep until the next hut is due, but at most a minute: demand can move huts forward
+                wait = self.refresh_scheduler.seconds_until_due()
+                wait = min(self.update_interval if wait is None else wait, next_scan - time.time(), 60)
+                for _ in range(int(wait) + 1):
                     if self.stop_update_thread:
                         break
                     time.sleep(1)  # Check for stop signal every second
                 
-                if self.stop_update_thread:
-                    break
-                    
-                self.logger.info("Starting background update of hut data")
-                print("Starting background update of hut data")  # Add visible console output
-                
-                # Use a small number of workers to avoid overloading the server
-                self._parse_huts(max_workers=2)
-                
-                self.logger.info("Completed background update of hut data")
-                print("Completed background update of hut data")  # Add visible console output
-                
             except Exception as e:
                 self.logger.error(f"Error in background update: {str(e)}")
                 print(f"Error in background update: {str(e)}")  # Add visible console output
                 # Sleep for a while before retrying after an error
                 time.sleep(60)
                 
+        driver_pool.shutdown()
+        loop.close()
         self.logger.info("Background update worker stopped")
         print("Background update worker stopped")  # Add visible console output
 
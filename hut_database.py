@@ -0,0 +1,215 @@
+import logging
+import sqlite3
+import threading
+from datetime import date
+
+from availability_series import AvailabilitySeries, MISSING
+from availability_matrix import to_ordinal
+
+
+SCHEMA_VERSION = 1
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS huts (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    coordinates TEXT,
+    website TEXT,
+    img_url TEXT,
+    url TEXT,
+    fetched_at REAL,
+    availability_fetched_at REAL,
+    last_changed REAL
+);
+CREATE INDEX IF NOT EXISTS idx_huts_name ON huts (name);
+CREATE TABLE IF NOT EXISTS availability (
+    hut_id TEXT NOT NULL REFERENCES huts (id) ON DELETE CASCADE,
+    date TEXT NOT NULL,
+    places INTEGER NOT NULL,
+    PRIMARY KEY (hut_id, date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_availability_date_places ON availability (date, places);
+"""
+HUT_FIELDS = ("id", "name", "coordinates", "website", "img_url", "url", "fetched_at",
+              "availability_fetched_at", "last_changed")
+METADATA_FIELDS = HUT_FIELDS[2:7]  # Read from Hut.metadata
+FRESHNESS_FIELDS = {"availability_fetched_at": "fetched_at", "last_changed": "last_changed"}  # Read from the Hut
+
+
+class HutDatabase:
+    """
+    SQLite store of huts and their availability, shared by several processes.
+
+    The database runs in WAL mode, so app processes keep reading while a
+    worker writes. Every thread gets its own connection. Writes are bulk
+    upserts in one transaction; unchanged availability rows are not rewritten.
+    """
+
+    def __init__(self, path, timeout=30):
+        """
+        Args:
+            path: SQLite database file
+            timeout: Seconds to wait for another process's write lock
+        """
+        self.path = path
+        self.timeout = timeout
+        self.logger = logging.getLogger('HutDatabase')
+        self._local = threading.local()
+        with self._connection() as connection:
+            version = connection.execute("PRAGMA user_version").fetchone()[0]
+            if version > SCHEMA_VERSION:
+                raise ValueError(f"Hut database {path} has schema version {version}, expected at most {SCHEMA_VERSION}")
+            connection.executescript(SCHEMA)
+            connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _connection(self):
+        """The calling thread's connection"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA foreign_keys=ON")
+            # Unicode-aware lower() for search, matching str.lower (SQLite's lower() only folds ASCII)
+            connection.create_function("py_lower", 1, lambda text: text.lower() if text else text, deterministic=True)
+            self._local.connection = connection
+        return connection
+
+    def close(self):
+        """Close the calling thread's connection"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def __getstate__(self):
+        return {'path': self.path, 'timeout': self.timeout}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'], state['timeout'])
+
+    def upsert_huts(self, huts):
+        """
+        Insert or update huts and replace their availability, in one transaction
+        Args:
+            huts: Iterable of Hut objects
+        Returns:
+            Number of huts written
+        """
+        hut_rows, availability_rows, removed_rows, spans = [], [], [], []
+        for hut in huts:
+            source = getattr(hut, 'metadata', None) or hut
+            hut_id = str(getattr(source, 'id', "") or hut.name)
+            hut_rows.append((hut_id, hut.name)
+                            + tuple(getattr(source, field, None) for field in METADATA_FIELDS)
+                            + tuple(getattr(hut, attribute, None) for attribute in FRESHNESS_FIELDS.values()))
+            series = AvailabilitySeries.from_availability(hut.availability)
+            base = series.base_ordinal
+            for offset, places in enumerate(series.values):
+                day = date.fromordinal(base + offset).isoformat()
+                if places == MISSING:
+                    removed_rows.append((hut_id, day))
+                else:
+                    availability_rows.append((hut_id, day, places))
+            if len(series.values):
+                spans.append((hut_id, date.fromordinal(base).isoformat(),
+                              date.fromordinal(base + len(series.values) - 1).isoformat()))
+            else:
+                spans.append((hut_id, "9999-12-31", "0000-01-01"))
+
+        connection = self._connection()
+        with connection:
+            connection.executemany(
+                f"INSERT INTO huts ({', '.join(HUT_FIELDS)}) VALUES ({', '.join('?' * len(HUT_FIELDS))}) "
+                "ON CONFLICT (id) DO UPDATE SET "
+                + ", ".join(f"{field} = excluded.{field}" for field in HUT_FIELDS[1:]),
+                hut_rows)
+            connection.executemany(
+                "INSERT INTO availability (hut_id, date, places) VALUES (?, ?, ?) "
+                "ON CONFLICT (hut_id, date) DO UPDATE SET places = excluded.places "
+                "WHERE places != excluded.places",
+                availability_rows)
+            # Days that no longer have data: gaps inside the series and days outside it
+            connection.executemany("DELETE FROM availability WHERE hut_id = ? AND date = ?", removed_rows)
+            connection.executemany("DELETE FROM availability WHERE hut_id = ? AND (date < ? OR date > ?)", spans)
+        return len(hut_rows)
+
+    def remove_huts(self, hut_ids):
+        """Delete huts and their availability"""
+        connection = self._connection()
+        with connection:
+            connection.executemany("DELETE FROM huts WHERE id = ?", [(str(hut_id),) for hut_id in hut_ids])
+
+    def hut_count(self):
+        """Number of huts in the database"""
+        return self._connection().execute("SELECT COUNT(*) FROM huts").fetchone()[0]
+
+    def _records(self, where="", parameters=()):
+        rows = self._connection().execute(
+            f"SELECT {', '.join(HUT_FIELDS)} FROM huts {where} ORDER BY name", parameters).fetchall()
+        return [dict(zip(HUT_FIELDS, row)) for row in rows]
+
+    def _series(self, hut_ids):
+        """AvailabilitySeries of every given hut ID"""
+        pairs = {hut_id: [] for hut_id in hut_ids}
+        connection = self._connection()
+        for hut_id in hut_ids:
+            for day, places in connection.execute(
+                    "SELECT date, places FROM availability WHERE hut_id = ?", (hut_id,)):
+                pairs[hut_id].append((date.fromisoformat(day).toordinal(), places))
+        return {hut_id: AvailabilitySeries.from_pairs(hut_pairs) for hut_id, hut_pairs in pairs.items()}
+
+    def load_records(self):
+        """Metadata records of all huts, ordered by name, without their availability"""
+        return self._records()
+
+    def load_series(self, hut_id):
+        """AvailabilitySeries of one hut ID"""
+        return self._series([hut_id])[hut_id]
+
+    def load_huts(self):
+        """
+        Read all huts
+        Returns:
+            List of (metadata record, AvailabilitySeries) tuples, ordered by name
+        """
+        records = self._records()
+        series = self._series([record["id"] for record in records])
+        return [(record, series[record["id"]]) for record in records]
+
+    def load_hut(self, name):
+        """
+        Read one hut by name
+        Returns:
+            Tuple (metadata record, AvailabilitySeries), or None if there is no such hut
+        """
+        records = self._records("WHERE name = ?", (name,))
+        if not records:
+            return None
+        return records[0], self._series([records[0]["id"]])[records[0]["id"]]
+
+    def available_huts(self, target_date, min_places=1, sort=False):
+        """
+        Find the huts with at least min_places free on a day, using the (date, places) index
+        Args:
+            target_date: Date string in YYYY-MM-DD format or datetime.date object
+            min_places: Minimum number of places needed
+            sort: Order the result by places, most first
+        Returns:
+            List of (hut name, places) tuples
+        """
+        day = date.fromordinal(to_ordinal(target_date)).isoformat()
+        order = "ORDER BY availability.places DESC, huts.name" if sort else "ORDER BY huts.name"
+        return self._connection().execute(
+            "SELECT huts.name, availability.places FROM availability JOIN huts ON huts.id = availability.hut_id "
+            f"WHERE availability.date = ? AND availability.places >= ? {order}",
+            (day, max(min_places, 0))).fetchall()
+
+    def search(self, query):
+        """
+        Find huts whose name contains query (case-insensitive)
+        Returns:
+            List of hut names
+        """
+        rows = self._connection().execute(
+            "SELECT name FROM huts WHERE instr(py_lower(name), ?) > 0 ORDER BY name", (query.lower(),)).fetchall()
+        return [name for name, in rows]
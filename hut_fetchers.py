@@ -0,0 +1,193 @@
+import requests
+from requests.adapters import HTTPAdapter
+import asyncio
+import logging
+
+
+class HutNotFoundError(Exception):
+    """Raised by a fetcher when the backend reports that a hut ID does not exist"""
+
+
+class HttpHutFetcher:
+    """
+    Fetches hut metadata and availability straight from the JSON API that the
+    hut-reservation.org Angular app talks to, without rendering the page.
+
+    Point api_base at a local stand-in server to run against recorded responses.
+    """
+    api_base = "https://www.hut-reservation.org/api/v1"
+    hut_info_path = "/reservation/hutInfo/{hut_id}"
+    availability_path = "/reservation/getHutAvailability"
+    csrf_path = "/csrf"
+
+    def __init__(self, api_base=None, pool_size=10, timeout=10, session=None):
+        """
+        Args:
+            api_base: Base URL of the API (default: the public hut-reservation.org API)
+            pool_size: Number of keep-alive connections kept per host
+            timeout: Timeout in seconds for each HTTP request
+            session: Optional requests.Session to use instead of creating one
+        """
+        if api_base:
+            self.api_base = api_base.rstrip('/')
+        self.timeout = timeout
+        self.logger = logging.getLogger('HttpHutFetcher')
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+        self.session.headers.setdefault('Accept', 'application/json')
+        self._csrf_checked = False
+
+    def _ensure_csrf_token(self):
+        """Fetch the XSRF token the API expects, if the server hands one out"""
+        if self._csrf_checked:
+            return
+        self._csrf_checked = True
+        try:
+            response = self.session.get(f"{self.api_base}{self.csrf_path}", timeout=self.timeout)
+            if response.ok:
+                token = response.json().get('token')
+                if token:
+                    self.session.headers['X-XSRF-TOKEN'] = token
+        except (requests.RequestException, ValueError) as e:
+            self.logger.info(f"No CSRF token available: {str(e)}")
+
+    def prepare(self):
+        """
+        One-time setup before many concurrent requests: picks up the CSRF token, which
+        the async methods send along but cannot fetch themselves
+        """
+        self._ensure_csrf_token()
+
+    def _get_json(self, path, params=None, hut_id=None):
+        """
+        GET a JSON document from the API
+        Raises:
+            HutNotFoundError: If the server answers 404 for a hut-specific resource
+            requests.HTTPError: For any other unsuccessful status
+        """
+        self._ensure_csrf_token()
+        response = self.session.get(f"{self.api_base}{path}", params=params, timeout=self.timeout)
+        if response.status_code == 404 and hut_id is not None:
+            raise HutNotFoundError(f"Hut {hut_id} not found")
+        response.raise_for_status()
+        return response.json()
+
+    def fetch_metadata(self, hut_id):
+        """
+        Fetch static information about a hut
+        Args:
+            hut_id: ID of the hut
+        Returns:
+            Dictionary with id, name, coordinates, website and img_url
+        """
+        info = self._get_json(self.hut_info_path.format(hut_id=hut_id), hut_id=hut_id)
+        return self._metadata_from_info(hut_id, info)
+
+    def fetch_availability(self, hut_id):
+        """
+        Fetch the free places calendar of a hut
+        Args:
+            hut_id: ID of the hut
+        Returns:
+            List of (ISO date string, places) tuples; days without a free places count are skipped
+        """
+        days = self._get_json(self.availability_path, params=self._availability_params(hut_id), hut_id=hut_id)
+        return self._availability_from_days(days)
+
+    def fetch_hut(self, hut_id):
+        """
+        Fetch metadata and availability of a hut
+        Args:
+            hut_id: ID of the hut
+        Returns:
+            Metadata dictionary (see fetch_metadata) with an additional 'availability' list
+        """
+        record = self.fetch_metadata(hut_id)
+        record["availability"] = self.fetch_availability(hut_id)
+        return record
+
+    async def _get_json_async(self, session, path, params=None, hut_id=None):
+        """GET a JSON document with an aiohttp session; same error semantics as _get_json"""
+        headers = {}
+        token = self.session.headers.get('X-XSRF-TOKEN')
+        if token:
+            headers['X-XSRF-TOKEN'] = token
+        async with session.get(f"{self.api_base}{path}", params=params, headers=headers) as response:
+            if response.status == 404 and hut_id is not None:
+                raise HutNotFoundError(f"Hut {hut_id} not found")
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+    async def fetch_hut_async(self, session, hut_id):
+        """
+        Fetch metadata and availability of a hut without blocking the event loop
+        Args:
+            session: aiohttp.ClientSession to issue the requests with
+            hut_id: ID of the hut
+        Returns:
+            Same dictionary as fetch_hut
+        """
+        info, days = await asyncio.gather(
+            self._get_json_async(session, self.hut_info_path.format(hut_id=hut_id), hut_id=hut_id),
+            self._get_json_async(session, self.availability_path, params=self._availability_params(hut_id), hut_id=hut_id),
+        )
+        record = self._metadata_from_info(hut_id, info)
+        record["availability"] = self._availability_from_days(days)
+        return record
+
+    async def fetch_availability_async(self, session, hut_id):
+        """
+        Fetch the free places calendar of a hut without blocking the event loop
+        Args:
+            session: aiohttp.ClientSession to issue the request with
+            hut_id: ID of the hut
+        Returns:
+            Same list as fetch_availability
+        """
+        days = await self._get_json_async(session, self.availability_path, params=self._availability_params(hut_id), hut_id=hut_id)
+        return self._availability_from_days(days)
+
+    def _availability_params(self, hut_id):
+        return {"hutId": str(hut_id), "step": "WIZARD"}
+
+    def _metadata_from_info(self, hut_id, info):
+        """Map a hutInfo response onto the fields used by Hut"""
+        if not info or not (info.get('hutName') or info.get('name')):
+            raise HutNotFoundError(f"Hut {hut_id} not found")
+
+        picture = info.get('picture') or {}
+        if isinstance(picture, dict):
+            img_url = picture.get('blobPath') or picture.get('url') or ""
+        else:
+            img_url = str(picture)
+
+        return {
+            "id": str(hut_id),
+            "name": (info.get('hutName') or info.get('name')).strip(),
+            "coordinates": (info.get('coordinates') or "Coordinates not found").strip(),
+            "website": info.get('hutWebsite') or info.get('website') or "",
+            "img_url": img_url,
+        }
+
+    def _availability_from_days(self, days):
+        """Map a getHutAvailability response onto (date, places) tuples"""
+        result = []
+        for day in days or []:
+            places = day.get('freeBeds')
+            date_str = day.get('date') or day.get('dateFormatted')
+            if places is None or not date_str:
+                continue
+            # The API sends timestamps such as 2024-03-21T00:00:00Z
+            if 'T' in date_str:
+                date_str = date_str.split('T')[0]
+            result.append((date_str, int(places)))
+        return result
+
+    def close(self):
+        """Close the pooled HTTP connections"""
+        self.session.close()
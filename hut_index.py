@@ -0,0 +1,141 @@
+import json
+import os
+import threading
+import time
+import logging
+
+
+class HutIdIndex:
+    """
+    Persisted record of which hut IDs exist on hut-reservation.org.
+
+    Every ID is either valid (a hut was parsed), invalid (the ID has no hut)
+    or unknown (never checked, or the last attempt failed). Refreshes fetch
+    valid and unknown IDs, re-probe invalid IDs only once their TTL expired,
+    and now and then look past the highest known ID for newly added huts.
+    """
+    VALID = "valid"
+    INVALID = "invalid"
+    UNKNOWN = "unknown"
+
+    def __init__(self, path=None, invalid_ttl=7 * 24 * 3600, probe_ahead=20, probe_ahead_interval=24 * 3600):
+        """
+        Args:
+            path: JSON file the index is persisted to (None keeps it in memory only)
+            invalid_ttl: Seconds before an invalid ID is probed again
+            probe_ahead: How many IDs past the highest known hut to probe for new huts
+            probe_ahead_interval: Minimum seconds between two probes past the known range
+        """
+        self.path = path
+        self.invalid_ttl = invalid_ttl
+        self.probe_ahead = probe_ahead
+        self.probe_ahead_interval = probe_ahead_interval
+        self.logger = logging.getLogger('HutIdIndex')
+
+        self._lock = threading.Lock()
+        self.entries = {}
+        self.last_probe_ahead = 0
+        if path and os.path.exists(path):
+            self.load()
+
+    def load(self):
+        """Load the index from its JSON file"""
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            with self._lock:
+                self.entries = data.get("entries", {})
+                self.last_probe_ahead = data.get("last_probe_ahead", 0)
+            self.logger.info(f"Loaded hut ID index with {len(self.entries)} entries")
+        except Exception as e:
+            self.logger.error(f"Error loading hut ID index: {str(e)}")
+            self.entries = {}
+
+    def save(self):
+        """Write the index to its JSON file (no-op for an in-memory index)"""
+        if not self.path:
+            return
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._lock:
+                data = {"entries": dict(self.entries), "last_probe_ahead": self.last_probe_ahead}
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            self.logger.error(f"Error saving hut ID index: {str(e)}")
+
+    def status(self, hut_id):
+        """Return VALID, INVALID or UNKNOWN for an ID"""
+        entry = self.entries.get(str(hut_id))
+        return entry["status"] if entry else self.UNKNOWN
+
+    def _mark(self, hut_id, status):
+        with self._lock:
+            self.entries[str(hut_id)] = {"status": status, "checked_at": time.time()}
+
+    def mark_valid(self, hut_id):
+        """Record that a hut was parsed for this ID"""
+        self._mark(hut_id, self.VALID)
+
+    def mark_invalid(self, hut_id):
+        """Record that this ID has no hut"""
+        self._mark(hut_id, self.INVALID)
+
+    def mark_missing(self, hut_id):
+        """
+        Record a scraped page without a hut. An ID that had a hut is treated as a failed
+        attempt instead: a page that had not finished rendering looks the same.
+        """
+        if self.status(hut_id) == self.VALID:
+            self.mark_failed(hut_id)
+        else:
+            self.mark_invalid(hut_id)
+
+    def mark_failed(self, hut_id):
+        """Record a failed attempt; a previously valid hut keeps its status"""
+        if self.status(hut_id) != self.VALID:
+            self._mark(hut_id, self.UNKNOWN)
+
+    def _recently_invalid(self, hut_id, now):
+        entry = self.entries.get(hut_id)
+        return bool(entry) and entry["status"] == self.INVALID and now - entry["checked_at"] < self.invalid_ttl
+
+    def highest_valid_id(self):
+        """Highest numeric ID known to be valid, or 0"""
+        valid = [int(hut_id) for hut_id, entry in self.entries.items()
+                 if entry["status"] == self.VALID and hut_id.isdigit()]
+        return max(valid, default=0)
+
+    def ids_to_fetch(self, num_huts=439):
+        """
+        Select the IDs a refresh should fetch
+        Args:
+            num_huts: Highest ID of the regular range to consider
+        Returns:
+            List of hut IDs as strings
+        """
+        now = time.time()
+        hut_ids = []
+        skipped = 0
+        for i in range(1, num_huts + 1):
+            if self._recently_invalid(str(i), now):
+                skipped += 1
+                continue
+            hut_ids.append(str(i))
+
+        # Huts found earlier beyond the regular range stay in every refresh
+        highest = max(num_huts, self.highest_valid_id())
+        hut_ids.extend(str(i) for i in range(num_huts + 1, highest + 1) if self.status(i) == self.VALID)
+
+        if now - self.last_probe_ahead >= self.probe_ahead_interval:
+            self.last_probe_ahead = now
+            hut_ids.extend(str(i) for i in range(highest + 1, highest + self.probe_ahead + 1)
+                           if not self._recently_invalid(str(i), now))
+
+        if skipped:
+            self.logger.info(f"Skipping {skipped} IDs known to have no hut")
+        return hut_ids
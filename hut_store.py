@@ -0,0 +1,184 @@
+import json
+import os
+import struct
+import tempfile
+import time
+from array import array
+
+import numpy as np
+
+from availability_series import AvailabilitySeries, MISSING
+
+
+MAGIC = b"HUTSTORE"
+FORMAT_VERSION = 1
+# magic, format version, metadata length, block offset, rows, days, base ordinal
+HEADER = struct.Struct("<8sHIQIIq")
+BLOCK_ALIGNMENT = 8
+METADATA_FIELDS = {"id": "", "name": "", "coordinates": "", "website": "", "img_url": "", "url": "",
+                   "fetched_at": None}
+# Record key -> attribute of the Hut itself: when its availability was last fetched and last changed
+FRESHNESS_FIELDS = {"availability_fetched_at": "fetched_at", "last_changed": "last_changed"}
+
+
+class StoreFormatError(ValueError):
+    """The file is not a hut store, has an unsupported version or is truncated"""
+
+
+class StoredHuts:
+    """
+    Contents of a hut store file.
+
+    records[r] holds the metadata of row r of places, an int16 huts x days
+    block in which column c is the day base_ordinal + c and MISSING marks days
+    without data. With mmap the block is read from the file on access, and is
+    copy-on-write: changes stay in memory and never reach the file.
+    """
+
+    def __init__(self, records, places, base_ordinal, saved_at, extra):
+        self.records = records
+        self.places = places
+        self.base_ordinal = base_ordinal
+        self.saved_at = saved_at
+        self.extra = extra
+
+    def __len__(self):
+        return len(self.records)
+
+    def series(self, row):
+        """AvailabilitySeries of one row, trimmed to the days that have data"""
+        values = np.asarray(self.places[row])
+        known = np.flatnonzero(values != MISSING)
+        if not len(known):
+            return AvailabilitySeries()
+        first, last = int(known[0]), int(known[-1])
+        series_values = array('h')
+        series_values.frombytes(values[first:last + 1].astype(np.int16).tobytes())
+        return AvailabilitySeries(self.base_ordinal + first, series_values)
+
+    def items(self):
+        """Yield (hut name, metadata record, AvailabilitySeries) for every row"""
+        for row, record in enumerate(self.records):
+            yield record["key"], record, self.series(row)
+
+
+def _record(name, hut):
+    """Metadata record of a hut; fields missing on the hut get the HutMetadata defaults"""
+    source = getattr(hut, 'metadata', None) or hut
+    record = {"key": name}
+    for field, default in METADATA_FIELDS.items():
+        value = getattr(source, field, default)
+        record[field] = value if value is not None or default is None else default
+    if not record["url"]:
+        record["url"] = getattr(hut, 'url', "") or ""
+    for key, attribute in FRESHNESS_FIELDS.items():
+        record[key] = getattr(hut, attribute, None)
+    return record
+
+
+def write_store(path, huts, extra=None):
+    """
+    Write huts to a store file atomically (write to a temporary file, then rename)
+    Args:
+        path: File to write
+        huts: Dictionary mapping hut names to Hut objects
+        extra: Optional JSON-serializable dictionary saved alongside the huts
+    """
+    names = list(huts)
+    series = [AvailabilitySeries.from_availability(huts[name].availability) for name in names]
+    spans = [(s.base_ordinal, s.base_ordinal + len(s.values)) for s in series if len(s.values)]
+    base_ordinal = min(start for start, _ in spans) if spans else 0
+    days = max(end for _, end in spans) - base_ordinal if spans else 0
+
+    places = np.full((len(names), days), MISSING, dtype='<i2')
+    for row, s in enumerate(series):
+        if len(s.values):
+            start = s.base_ordinal - base_ordinal
+            places[row, start:start + len(s.values)] = np.frombuffer(s.values, dtype=np.int16)
+
+    meta = json.dumps({
+        "saved_at": time.time(),
+        "huts": [_record(name, huts[name]) for name in names],
+        "extra": extra or {},
+    }, separators=(',', ':')).encode('utf-8')
+    block_offset = HEADER.size + len(meta)
+    block_offset += -block_offset % BLOCK_ALIGNMENT
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # A unique temporary name, so concurrent writers never share a half-written file
+    fd, tmp_path = tempfile.mkstemp(dir=directory or ".", prefix=os.path.basename(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(meta), block_offset, len(names), days, base_ordinal))
+            f.write(meta)
+            f.write(b"\0" * (block_offset - HEADER.size - len(meta)))
+            f.write(places.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _read_header(f, path):
+    raw = f.read(HEADER.size)
+    if len(raw) < HEADER.size:
+        raise StoreFormatError(f"Truncated hut store: {path}")
+    magic, version, meta_length, block_offset, rows, days, base_ordinal = HEADER.unpack(raw)
+    if magic != MAGIC:
+        raise StoreFormatError(f"Not a hut store: {path}")
+    if version != FORMAT_VERSION:
+        raise StoreFormatError(f"Unsupported hut store version {version} (expected {FORMAT_VERSION}): {path}")
+    return meta_length, block_offset, rows, days, base_ordinal
+
+
+def read_store_info(path):
+    """
+    Read only the header and metadata of a store file
+    Returns:
+        Dictionary with 'saved_at', 'hut_count', 'days' and 'extra'
+    """
+    with open(path, 'rb') as f:
+        meta_length, _, rows, days, _ = _read_header(f, path)
+        meta = json.loads(f.read(meta_length).decode('utf-8'))
+    return {"saved_at": meta.get("saved_at", 0), "hut_count": rows, "days": days, "extra": meta.get("extra", {})}
+
+
+def read_store(path, mmap=True):
+    """
+    Read a store file
+    Args:
+        path: File to read
+        mmap: Memory-map the availability block instead of reading it into memory
+    Returns:
+        StoredHuts
+    """
+    with open(path, 'rb') as f:
+        meta_length, block_offset, rows, days, base_ordinal = _read_header(f, path)
+        meta_raw = f.read(meta_length)
+        if len(meta_raw) < meta_length:
+            raise StoreFormatError(f"Truncated hut store: {path}")
+        meta = json.loads(meta_raw.decode('utf-8'))
+        if os.fstat(f.fileno()).st_size < block_offset + rows * days * 2:
+            raise StoreFormatError(f"Truncated hut store: {path}")
+        records = meta.get("huts", [])
+        if len(records) != rows:
+            raise StoreFormatError(f"Hut store has {len(records)} records for {rows} rows: {path}")
+        if not rows * days:
+            places = np.full((rows, days), MISSING, dtype=np.int16)
+        elif mmap:
+            places = np.memmap(path, dtype='<i2', mode='c', offset=block_offset, shape=(rows, days))
+        else:
+            f.seek(block_offset)
+            places = np.frombuffer(bytearray(f.read(rows * days * 2)), dtype='<i2').reshape(rows, days)
+
+    for record in records:
+        for field, default in METADATA_FIELDS.items():
+            record.setdefault(field, default)
+        for key in FRESHNESS_FIELDS:
+            record.setdefault(key, None)
+    return StoredHuts(records, places, base_ordinal, meta.get("saved_at", 0), meta.get("extra", {}))
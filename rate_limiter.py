@@ -0,0 +1,230 @@
+import asyncio
+import threading
+import time
+import logging
+
+
+def is_throttle_error(exc):
+    """Check whether an exception is the server telling us to slow down (HTTP 429/503)"""
+    status = getattr(exc, 'status', None)
+    if status is None:
+        response = getattr(exc, 'response', None)
+        status = getattr(response, 'status_code', None)
+    return status in (429, 503)
+
+
+class RateLimitSlot:
+    """
+    Permission to send one request, obtained from an AdaptiveRateLimiter.
+
+    Use as a context manager: leaving the block reports the latency to the
+    limiter, and an exception counts as an error unless it is listed in benign.
+    """
+
+    def __init__(self, limiter, benign=(), track_latency=True):
+        self.limiter = limiter
+        self.benign = benign
+        self.track_latency = track_latency
+        self.start = None
+        self._throttled = False
+
+    def throttled(self):
+        """Report that the response indicated throttling even though no exception was raised"""
+        self._throttled = True
+
+    def _finish(self, exc):
+        error = exc is not None and not isinstance(exc, self.benign)
+        throttled = self._throttled or (exc is not None and is_throttle_error(exc))
+        self.limiter.release(self, error=error, throttled=throttled)
+
+    def __enter__(self):
+        self.limiter.acquire(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._finish(exc_value)
+
+    async def __aenter__(self):
+        await self.limiter.acquire_async(self)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if isinstance(exc_value, asyncio.CancelledError):
+            exc_value = None
+        self._finish(exc_value)
+
+
+class AdaptiveRateLimiter:
+    """
+    Shared limiter for requests to hut-reservation.org.
+
+    A token bucket caps the request rate, and an AIMD controller caps the number
+    of requests in flight. Fast successful responses additively raise both
+    limits. Errors and latency well above the observed baseline multiplicatively
+    cut the concurrency limit (latency only for slots that track it: a browser
+    scrape takes seconds to tens of seconds depending on the hut, which says
+    nothing about the server), and throttling responses (429/503) cut the rate
+    as well, at most once per cooldown period.
+    Safe to share between threads and with asyncio code.
+    """
+
+    def __init__(self, rate=2.0, burst=4, min_rate=0.1, max_rate=50.0,
+                 concurrency=4, min_concurrency=1, max_concurrency=16,
+                 rate_increase=0.5, concurrency_increase=1.0, decrease_factor=0.5,
+                 latency_tolerance=2.0, cooldown=5.0):
+        """
+        Args:
+            rate: Initial requests per second
+            burst: Maximum number of requests that can be sent back to back
+            min_rate, max_rate: Bounds for the request rate
+            concurrency: Initial number of requests allowed in flight
+            min_concurrency, max_concurrency: Bounds for the concurrency limit
+            rate_increase: Requests/second added per full window of successes
+            concurrency_increase: In-flight requests added per full window of successes
+            decrease_factor: Factor applied to both limits on errors or slow responses
+            latency_tolerance: Latency above this multiple of the baseline counts as congestion
+            cooldown: Minimum seconds between two decreases
+        """
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.concurrency_limit = float(concurrency)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.rate_increase = rate_increase
+        self.concurrency_increase = concurrency_increase
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.cooldown = cooldown
+        self.logger = logging.getLogger('AdaptiveRateLimiter')
+
+        self._condition = threading.Condition()
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._last_decrease = 0.0
+        self._in_flight = 0
+        self._baseline_latency = None
+        self._avg_latency = None
+        self._completed = 0
+        self._errors = 0
+        self._throttled = 0
+        self._decreases = 0
+
+    def slot(self, benign=(), track_latency=True):
+        """
+        Create a slot to use as `with limiter.slot():` or `async with limiter.slot():`
+        Args:
+            benign: Exception types that do not count as errors (e.g. a hut that does not exist)
+            track_latency: Count a slow response as congestion; False for whole browser scrapes,
+                           which only adapt the limits on errors and throttling
+        """
+        return RateLimitSlot(self, benign, track_latency)
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def _try_acquire(self, slot):
+        """
+        Take a token and an in-flight slot if both are available (caller holds the lock)
+        Returns:
+            0 on success, the number of seconds until the next token otherwise,
+            or None if the concurrency limit is reached
+        """
+        now = time.monotonic()
+        self._refill(now)
+        if self._in_flight >= int(self.concurrency_limit):
+            return None  # Wait until a request finishes
+        if self._tokens < 1:
+            return (1 - self._tokens) / self.rate
+        self._tokens -= 1
+        self._in_flight += 1
+        slot.start = now
+        return 0
+
+    def acquire(self, slot):
+        """Block the calling thread until the slot may send its request"""
+        with self._condition:
+            while True:
+                wait = self._try_acquire(slot)
+                if wait == 0:
+                    return
+                self._condition.wait(timeout=wait)
+
+    async def acquire_async(self, slot):
+        """Wait on the event loop until the slot may send its request"""
+        while True:
+            with self._condition:
+                wait = self._try_acquire(slot)
+            if wait == 0:
+                return
+            # In-flight capacity frees up on release; poll at a short interval for it
+            await asyncio.sleep(wait if wait is not None else 0.05)
+
+    def release(self, slot, error=False, throttled=False):
+        """Return a slot and adapt the limits to how the request went"""
+        with self._condition:
+            now = time.monotonic()
+            latency = now - slot.start
+            self._in_flight -= 1
+            self._completed += 1
+            self._avg_latency = latency if self._avg_latency is None else 0.9 * self._avg_latency + 0.1 * latency
+
+            congested = False
+            if slot.track_latency and not error and not throttled:
+                # The baseline follows the fastest responses and only drifts up slowly
+                if self._baseline_latency is None or latency < self._baseline_latency:
+                    self._baseline_latency = latency
+                else:
+                    self._baseline_latency += (latency - self._baseline_latency) * 0.01
+                congested = latency > self.latency_tolerance * self._baseline_latency
+            if error:
+                self._errors += 1
+            if throttled:
+                self._throttled += 1
+
+            if throttled:
+                self._decrease(now, cut_rate=True)
+            elif error or congested:
+                # Errors and slow responses point at too much parallel work, not at the request rate
+                self._decrease(now, cut_rate=False)
+            else:
+                self._increase()
+            self._condition.notify_all()
+
+    def _increase(self):
+        """Additive increase, spread over one window of requests"""
+        window = max(self.concurrency_limit, 1.0)
+        self.concurrency_limit = min(self.max_concurrency, self.concurrency_limit + self.concurrency_increase / window)
+        self.rate = min(self.max_rate, self.rate + self.rate_increase / window)
+
+    def _decrease(self, now, cut_rate):
+        """Multiplicative decrease, at most once per cooldown period"""
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self._decreases += 1
+        self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit * self.decrease_factor)
+        if cut_rate:
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+        self.logger.info(f"Backing off to {self.rate:.2f} req/s, {int(self.concurrency_limit)} in flight")
+
+    def stats(self):
+        """
+        Current limits and counters
+        Returns:
+            Dictionary with rate, concurrency limit, in-flight requests, latencies and counters
+        """
+        with self._condition:
+            return {
+                "rate": self.rate,
+                "concurrency_limit": int(self.concurrency_limit),
+                "in_flight": self._in_flight,
+                "avg_latency": self._avg_latency,
+                "baseline_latency": self._baseline_latency,
+                "completed": self._completed,
+                "errors": self._errors,
+                "throttled": self._throttled,
+                "decreases": self._decreases,
+            }
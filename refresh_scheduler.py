@@ -0,0 +1,220 @@
+import heapq
+import math
+import threading
+import time
+from datetime import date
+
+
+class RefreshScheduler:
+    """
+    Decides which hut to refresh next, within a global request budget.
+
+    Huts sit in a heap of (next_due, hut_id). After every refresh a hut's
+    interval is recomputed from how often its refreshes changed anything
+    (an exponentially weighted change rate), how close the changed dates were,
+    and how much demand the hut gets, and clamped to [min_interval, max_interval].
+    A token bucket refilling at budget_per_hour limits how many refreshes are
+    handed out, however many huts are due.
+    """
+
+    def __init__(self, base_interval=3600, min_interval=15 * 60, max_interval=24 * 3600, budget_per_hour=300,
+                 change_smoothing=0.3, demand_half_life=24 * 3600, failure_backoff=15 * 60):
+        """
+        Args:
+            base_interval: Interval in seconds of a hut with an average change rate and no demand
+            min_interval: Shortest interval in seconds between two refreshes of a hut
+            max_interval: Longest interval in seconds between two refreshes of a hut
+            budget_per_hour: Refreshes handed out per hour at most, over all huts
+            change_smoothing: Weight of the latest refresh in the change rate (0..1)
+            demand_half_life: Seconds after which a demand signal counts half
+            failure_backoff: Seconds until a failed refresh is retried (doubled per consecutive failure)
+        """
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.budget_per_hour = budget_per_hour
+        self.change_smoothing = change_smoothing
+        self.demand_half_life = demand_half_life
+        self.failure_backoff = failure_backoff
+        self._lock = threading.Lock()
+        self._heap = []  # (next_due, hut_id); entries whose next_due no longer matches _huts are skipped
+        self._huts = {}  # hut_id -> state dictionary
+        self._in_flight = set()
+        self._tokens = budget_per_hour / 4  # Allow a burst of a quarter hour's budget
+        self._tokens_at = time.time()
+
+    def __len__(self):
+        return len(self._huts)
+
+    def _new_state(self, now):
+        return {"next_due": now, "interval": self.base_interval, "change_rate": 0.5, "near_change": False,
+                "demand": 0.0, "demand_at": now, "failures": 0, "refreshed_at": None}
+
+    def _push(self, hut_id, state, next_due):
+        """Reschedule a hut (caller holds the lock)"""
+        state["next_due"] = next_due
+        heapq.heappush(self._heap, (next_due, hut_id))
+
+    def add(self, hut_id, fetched_at=None, now=None):
+        """
+        Schedule a hut that is not scheduled yet
+        Args:
+            hut_id: ID of the hut
+            fetched_at: When its availability was last fetched (None: due now)
+        """
+        now = time.time() if now is None else now
+        hut_id = str(hut_id)
+        with self._lock:
+            if hut_id in self._huts:
+                return
+            state = self._new_state(now)
+            state["refreshed_at"] = fetched_at
+            self._huts[hut_id] = state
+            self._push(hut_id, state, now if fetched_at is None else fetched_at + state["interval"])
+
+    def remove(self, hut_id):
+        """Stop scheduling a hut"""
+        with self._lock:
+            self._huts.pop(str(hut_id), None)
+            self._in_flight.discard(str(hut_id))
+
+    def _demand(self, state, now):
+        """Decayed demand of a hut (caller holds the lock)"""
+        elapsed = now - state["demand_at"]
+        state["demand"] *= 0.5 ** (elapsed / self.demand_half_life)
+        state["demand_at"] = now
+        return state["demand"]
+
+    def _interval(self, state, now):
+        """Refresh interval of a hut from its change rate, change proximity and demand (caller holds the lock)"""
+        # A hut that changes on every refresh is refreshed ~7x as often as one that never changes
+        interval = self.base_interval / (0.25 + 1.5 * state["change_rate"])
+        if state["near_change"]:
+            interval /= 2  # Places are moving on dates people are about to book
+        interval /= 1 + math.log1p(self._demand(state, now))
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def record_result(self, hut_id, changed_days=(), now=None):
+        """
+        Reschedule a hut after a successful refresh
+        Args:
+            hut_id: ID of the hut
+            changed_days: Date ordinals whose places changed with this refresh
+        """
+        now = time.time() if now is None else now
+        hut_id = str(hut_id)
+        today = date.today().toordinal()
+        upcoming = [day for day in changed_days if day >= today]
+        with self._lock:
+            state = self._huts.get(hut_id)
+            if state is None:
+                state = self._huts[hut_id] = self._new_state(now)
+            self._in_flight.discard(hut_id)
+            alpha = self.change_smoothing
+            state["change_rate"] = alpha * (1.0 if upcoming else 0.0) + (1 - alpha) * state["change_rate"]
+            state["near_change"] = bool(upcoming) and min(upcoming) - today <= 14
+            state["failures"] = 0
+            state["refreshed_at"] = now
+            state["interval"] = self._interval(state, now)
+            self._push(hut_id, state, now + state["interval"])
+
+    def record_failure(self, hut_id, now=None):
+        """
+        Retry a hut whose refresh failed after an exponential backoff (capped at its interval).
+        Does nothing if the hut was not handed out by pop_due or has been recorded since,
+        so it can be called for a whole batch after its successes were recorded.
+        """
+        now = time.time() if now is None else now
+        hut_id = str(hut_id)
+        with self._lock:
+            state = self._huts.get(hut_id)
+            if state is None or hut_id not in self._in_flight:
+                return
+            self._in_flight.discard(hut_id)
+            state["failures"] += 1
+            backoff = self.failure_backoff * 2 ** (state["failures"] - 1)
+            self._push(hut_id, state, now + min(backoff, max(state["interval"], self.failure_backoff)))
+
+    def record_demand(self, hut_id, weight=1.0, now=None):
+        """
+        Note that someone looked at a hut; its next refresh may move closer
+        Args:
+            hut_id: ID of the hut
+            weight: Strength of the signal (e.g. 1 per lookup)
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            state = self._huts.get(str(hut_id))
+            if state is None:
+                return
+            state["demand"] = self._demand(state, now) + weight
+            state["interval"] = self._interval(state, now)
+            if state["refreshed_at"] is not None and str(hut_id) not in self._in_flight:
+                next_due = max(state["refreshed_at"] + state["interval"], now)
+                if next_due < state["next_due"]:
+                    self._push(str(hut_id), state, next_due)
+
+    def _refill(self, now):
+        """Add the tokens earned since the last refill (caller holds the lock)"""
+        capacity = max(self.budget_per_hour / 4, 1)
+        self._tokens = min(capacity, self._tokens + (now - self._tokens_at) * self.budget_per_hour / 3600)
+        self._tokens_at = now
+
+    def acquire(self, count, now=None):
+        """
+        Take budget for requests outside the schedule, e.g. probing for new huts
+        Returns:
+            Number of requests granted (at most count)
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._refill(now)
+            granted = min(int(self._tokens), count)
+            self._tokens -= granted
+            return granted
+
+    def pop_due(self, limit=None, now=None):
+        """
+        Take the huts that are due, most overdue first, as far as the budget allows
+        Args:
+            limit: Maximum number of huts to return
+        Returns:
+            List of hut IDs; each must be followed by record_result or record_failure
+        """
+        now = time.time() if now is None else now
+        due = []
+        with self._lock:
+            self._refill(now)
+            while self._heap and self._tokens >= 1 and (limit is None or len(due) < limit):
+                next_due, hut_id = self._heap[0]
+                state = self._huts.get(hut_id)
+                if state is None or state["next_due"] != next_due or hut_id in self._in_flight:
+                    heapq.heappop(self._heap)  # Removed or rescheduled since this entry was pushed
+                    continue
+                if next_due > now:
+                    break
+                heapq.heappop(self._heap)
+                self._in_flight.add(hut_id)
+                self._tokens -= 1
+                due.append(hut_id)
+        return due
+
+    def seconds_until_due(self, now=None):
+        """Seconds until pop_due can return a hut (budget permitting), or None if nothing is scheduled"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._refill(now)
+            while self._heap:
+                next_due, hut_id = self._heap[0]
+                state = self._huts.get(hut_id)
+                if state is None or state["next_due"] != next_due or hut_id in self._in_flight:
+                    heapq.heappop(self._heap)
+                    continue
+                wait_for_token = 0.0 if self._tokens >= 1 else (1 - self._tokens) * 3600 / self.budget_per_hour
+                return max(next_due - now, wait_for_token, 0.0)
+            return None
+
+    def intervals(self):
+        """Current refresh interval in seconds of every scheduled hut"""
+        with self._lock:
+            return {hut_id: state["interval"] for hut_id, state in self._huts.items()}
@@ -0,0 +1,76 @@
+import asyncio
+import logging
+
+
+class AsyncScrapeEngine:
+    """
+    Runs many hut fetches concurrently on one event loop.
+
+    A global semaphore caps the number of fetches in flight and a second
+    semaphore per host keeps any single server from being flooded. Cancelling
+    the coroutine awaiting run() (or calling cancel()) cancels every pending fetch.
+    """
+
+    def __init__(self, max_concurrency=100, per_host_limit=20):
+        """
+        Args:
+            max_concurrency: Maximum number of fetches in flight overall
+            per_host_limit: Maximum number of fetches in flight against a single host
+        """
+        self.max_concurrency = max_concurrency
+        self.per_host_limit = per_host_limit
+        self.logger = logging.getLogger('AsyncScrapeEngine')
+        self._tasks = []
+
+    async def run(self, items, worker, host_of=None, on_result=None):
+        """
+        Run worker(item) for every item under the concurrency limits
+        Args:
+            items: Iterable of work items (e.g. hut IDs)
+            worker: Coroutine function taking one item and returning its result
+            host_of: Optional function mapping an item to the host it talks to
+            on_result: Optional callback(item, result) called as results arrive
+        Returns:
+            Dictionary mapping each item to its result; items whose worker raised are left out
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        host_semaphores = {}
+
+        async def run_one(item):
+            host = host_of(item) if host_of else None
+            async with semaphore:
+                try:
+                    if host is None:
+                        return item, await worker(item), None
+                    if host not in host_semaphores:
+                        host_semaphores[host] = asyncio.Semaphore(self.per_host_limit)
+                    async with host_semaphores[host]:
+                        return item, await worker(item), None
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    return item, None, e
+
+        self._tasks = [asyncio.create_task(run_one(item)) for item in items]
+        results = {}
+        try:
+            for next_done in asyncio.as_completed(self._tasks):
+                item, result, error = await next_done
+                if error is not None:
+                    self.logger.error(f"Exception processing {item}: {str(error)}")
+                    continue
+                results[item] = result
+                if on_result:
+                    on_result(item, result)
+        finally:
+            # Reached early on cancellation or a failing callback: stop everything still in flight
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks = []
+        return results
+
+    def cancel(self):
+        """Cancel all fetches of the current run; must be called from the event loop thread"""
+        for task in self._tasks:
+            task.cancel()
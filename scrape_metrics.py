@@ -0,0 +1,239 @@
+from collections import deque
+from contextlib import contextmanager
+import os
+import sys
+import threading
+import time
+import types
+
+
+class TimingStats:
+    """
+    Thread-safe summary of how long named operations took.
+
+    Keeps counts, totals and the most recent samples per name so that
+    percentiles can be reported without storing every measurement.
+    """
+
+    def __init__(self, max_samples=1000):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, name, seconds, timed_out=False):
+        """
+        Record one measurement
+        Args:
+            name: Name of the operation (e.g. 'month_change')
+            seconds: How long it took
+            timed_out: Whether the operation gave up at its upper bound
+        """
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = {"count": 0, "total": 0.0, "max": 0.0, "timeouts": 0,
+                         "samples": deque(maxlen=self.max_samples)}
+                self._stats[name] = stats
+            stats["count"] += 1
+            stats["total"] += seconds
+            stats["max"] = max(stats["max"], seconds)
+            stats["samples"].append(seconds)
+            if timed_out:
+                stats["timeouts"] += 1
+
+    @contextmanager
+    def time(self, name):
+        """Measure the duration of a with-block"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(name, time.monotonic() - start)
+
+    def summary(self):
+        """
+        Summarize all recorded operations
+        Returns:
+            Dictionary mapping each name to count, total, mean, max, p50, p95 and timeouts (seconds)
+        """
+        with self._lock:
+            result = {}
+            for name, stats in self._stats.items():
+                samples = sorted(stats["samples"])
+                result[name] = {
+                    "count": stats["count"],
+                    "total": stats["total"],
+                    "mean": stats["total"] / stats["count"],
+                    "max": stats["max"],
+                    "p50": samples[len(samples) // 2],
+                    "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+                    "timeouts": stats["timeouts"],
+                }
+            return result
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+# Upper bounds in seconds of the histogram buckets for stage durations
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+
+class ScrapeMetrics(TimingStats):
+    """
+    Timings and counters for the scrape pipeline.
+
+    On top of the TimingStats summaries every stage gets a cumulative histogram,
+    and counters track retries, failures by cause and completed huts. Everything
+    can be exported as a dict or in the Prometheus text format.
+    """
+
+    def __init__(self, max_samples=1000, buckets=STAGE_BUCKETS, rate_window=300):
+        """
+        Args:
+            max_samples: Recent samples kept per stage for percentiles
+            buckets: Histogram bucket upper bounds in seconds
+            rate_window: Seconds over which huts per minute is computed
+        """
+        super().__init__(max_samples)
+        self.buckets = tuple(buckets)
+        self.rate_window = rate_window
+        self.started_at = time.time()
+        self._histograms = {}
+        self._counters = {}
+        self._failures = {}
+        self._hut_times = deque()
+        self._huts_done = 0
+
+    def record(self, name, seconds, timed_out=False):
+        super().record(name, seconds, timed_out)
+        with self._lock:
+            counts = self._histograms.get(name)
+            if counts is None:
+                counts = [0] * len(self.buckets)
+                self._histograms[name] = counts
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[i] += 1
+
+    def increment(self, name, amount=1):
+        """Increase a named counter (e.g. 'retries')"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def record_failure(self, cause):
+        """Count a failed hut by cause (e.g. an exception class name or 'name_not_found')"""
+        with self._lock:
+            self._failures[cause] = self._failures.get(cause, 0) + 1
+
+    def record_hut_done(self):
+        """Count a hut that was parsed or refreshed successfully"""
+        now = time.time()
+        with self._lock:
+            self._huts_done += 1
+            self._hut_times.append(now)
+            while self._hut_times and now - self._hut_times[0] > self.rate_window:
+                self._hut_times.popleft()
+
+    def huts_per_minute(self):
+        """Completed huts per minute over the last rate_window seconds"""
+        now = time.time()
+        with self._lock:
+            recent = [t for t in self._hut_times if now - t <= self.rate_window]
+        window = min(self.rate_window, max(now - self.started_at, 1e-9))
+        return len(recent) * 60 / window
+
+    def to_dict(self):
+        """
+        Export all metrics
+        Returns:
+            Dictionary with 'stages' (summaries and histograms), 'counters', 'failures',
+            'huts_done' and 'huts_per_minute'
+        """
+        stages = self.summary()
+        with self._lock:
+            for name, counts in self._histograms.items():
+                stages[name]["histogram"] = dict(zip(self.buckets, counts))
+            counters = dict(self._counters)
+            failures = dict(self._failures)
+            huts_done = self._huts_done
+        return {
+            "stages": stages,
+            "counters": counters,
+            "failures": failures,
+            "huts_done": huts_done,
+            "huts_per_minute": self.huts_per_minute(),
+        }
+
+    def to_prometheus(self, prefix="hut_scrape"):
+        """Render all metrics in the Prometheus text exposition format"""
+        data = self.to_dict()
+        lines = [f"# TYPE {prefix}_stage_seconds histogram"]
+        for stage, stats in sorted(data["stages"].items()):
+            for bound, count in stats["histogram"].items():
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {stats["count"]}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {stats["total"]}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {stats["count"]}')
+            lines.append(f'{prefix}_stage_timeouts_total{{stage="{stage}"}} {stats["timeouts"]}')
+        for name, value in sorted(data["counters"].items()):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        lines.append(f"# TYPE {prefix}_failures_total counter")
+        for cause, value in sorted(data["failures"].items()):
+            lines.append(f'{prefix}_failures_total{{cause="{cause}"}} {value}')
+        lines.append(f"# TYPE {prefix}_huts_total counter")
+        lines.append(f"{prefix}_huts_total {data['huts_done']}")
+        lines.append(f"# TYPE {prefix}_huts_per_minute gauge")
+        lines.append(f"{prefix}_huts_per_minute {data['huts_per_minute']}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Write the Prometheus text file atomically so scrapers never read a partial file"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+
+def deep_getsizeof(obj, exclude=()):
+    """
+    Approximate the bytes held by an object and everything it references
+    Args:
+        obj: Object to measure
+        exclude: Objects that are shared elsewhere and must not be counted
+    Returns:
+        Size in bytes; objects referenced more than once are counted once
+    """
+    seen = {id(excluded) for excluded in exclude if excluded is not None}
+    total = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, (type, types.ModuleType, types.FunctionType)):
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current)
+        if isinstance(current, (str, bytes, bytearray, int, float, bool)) or current is None:
+            continue
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset, deque)):
+            stack.extend(current)
+        if hasattr(current, '__dict__'):
+            stack.append(vars(current))
+        for cls in type(current).__mro__:
+            for slot in getattr(cls, '__slots__', ()):
+                if hasattr(current, slot):
+                    stack.append(getattr(current, slot))
+    return total
@@ -0,0 +1,219 @@
+import math
+import threading
+
+import numpy as np
+
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.195  # Great-circle km per degree of latitude
+
+
+def parse_coordinates(coordinates):
+    """
+    Parse a hut's coordinate string
+    Args:
+        coordinates: "lat, lon" or "lat / lon" string
+    Returns:
+        Tuple (lat, lon) of floats, or None if the string has no recognized format
+    """
+    if not coordinates or not isinstance(coordinates, str):
+        return None
+    for separator in (',', '/'):
+        if separator in coordinates:
+            try:
+                lat, lon = map(float, coordinates.split(separator))
+            except ValueError:
+                return None
+            if -90 <= lat <= 90 and -180 <= lon <= 180:
+                return lat, lon
+            return None
+    return None
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Great-circle distance in km from one point to arrays of points"""
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class SpatialIndex:
+    """
+    Grid index over hut coordinates for bounding-box, radius and nearest-hut queries.
+
+    Coordinate strings are parsed once when a hut is added or its coordinates
+    change. The float arrays and grid cells are rebuilt lazily on the next
+    query after a change. Huts without parseable coordinates are not indexed.
+    """
+
+    def __init__(self, cell_size=0.1):
+        """
+        Args:
+            cell_size: Grid cell edge in degrees (0.1 is about 11 km of latitude)
+        """
+        self.cell_size = cell_size
+        self._coordinates = {}  # name -> (lat, lon)
+        self._raw = {}  # name -> coordinate string the entry was parsed from
+        self._lock = threading.Lock()
+        self._stale = True
+        self.names = []
+        self.lats = np.empty(0)
+        self.lons = np.empty(0)
+        self._cells = {}
+        self.version = 0  # Incremented whenever the arrays are rebuilt
+
+    def __len__(self):
+        """Number of huts added, including those without parseable coordinates"""
+        return len(self._raw)
+
+    def update_hut(self, name, coordinates):
+        """
+        Add or update one hut
+        Args:
+            name: Hut name (the key in HutCollection.huts)
+            coordinates: The hut's coordinate string
+        """
+        with self._lock:
+            if name in self._raw and self._raw[name] == coordinates:
+                return
+            self._raw[name] = coordinates
+            point = parse_coordinates(coordinates)
+            if point is None:
+                self._stale |= self._coordinates.pop(name, None) is not None
+            else:
+                self._coordinates[name] = point
+                self._stale = True
+
+    def remove_hut(self, name):
+        """Drop a hut from the index"""
+        with self._lock:
+            self._raw.pop(name, None)
+            if self._coordinates.pop(name, None) is not None:
+                self._stale = True
+
+    def rebuild(self, huts):
+        """
+        Index a whole collection from scratch
+        Args:
+            huts: Dictionary mapping hut names to Hut objects
+        """
+        with self._lock:
+            self._coordinates = {}
+            self._raw = {}
+            self._stale = True
+        for name, hut in huts.items():
+            self.update_hut(name, getattr(hut, 'coordinates', None))
+
+    def _cell(self, lat, lon):
+        return int(math.floor(lat / self.cell_size)), int(math.floor(lon / self.cell_size))
+
+    def _ensure_built(self):
+        """Rebuild the arrays and grid cells after changes"""
+        with self._lock:
+            if not self._stale:
+                return
+            names = list(self._coordinates)
+            points = np.array([self._coordinates[name] for name in names], dtype=np.float64).reshape(-1, 2)
+            cells = {}
+            for row, (lat, lon) in enumerate(points.tolist()):
+                cells.setdefault(self._cell(lat, lon), []).append(row)
+            self.names = names
+            self.lats = points[:, 0].copy()
+            self.lons = points[:, 1].copy()
+            self._cells = {cell: np.array(rows, dtype=np.intp) for cell, rows in cells.items()}
+            self._stale = False
+            self.version += 1
+
+    def _rows_in_cells(self, lat_min, lat_max, lon_min, lon_max):
+        """Rows in all grid cells overlapping a bounding box"""
+        lat_cells = range(self._cell(lat_min, 0)[0], self._cell(lat_max, 0)[0] + 1)
+        lon_cells = range(self._cell(0, lon_min)[1], self._cell(0, lon_max)[1] + 1)
+        if len(lat_cells) * len(lon_cells) > len(self._cells):
+            # Box spans more cells than are occupied: walk the occupied cells instead
+            blocks = [rows for (i, j), rows in self._cells.items() if i in lat_cells and j in lon_cells]
+        else:
+            blocks = [self._cells[(i, j)] for i in lat_cells for j in lon_cells if (i, j) in self._cells]
+        return np.concatenate(blocks) if blocks else np.empty(0, dtype=np.intp)
+
+    def _allowed_mask(self, rows, allowed):
+        if allowed is None:
+            return np.ones(len(rows), dtype=bool)
+        return np.fromiter((self.names[row] in allowed for row in rows), dtype=bool, count=len(rows))
+
+    def bbox(self, lat_range=None, lon_range=None, allowed=None):
+        """
+        Huts inside a bounding box
+        Args:
+            lat_range: Tuple of (min_lat, max_lat), None for no bound
+            lon_range: Tuple of (min_lon, max_lon), None for no bound
+            allowed: Optional set of names to restrict the result to
+        Returns:
+            List of hut names
+        """
+        self._ensure_built()
+        lat_min, lat_max = lat_range if lat_range else (-90.0, 90.0)
+        lon_min, lon_max = lon_range if lon_range else (-180.0, 180.0)
+        if lat_range and lon_range:
+            rows = np.sort(self._rows_in_cells(lat_min, lat_max, lon_min, lon_max))
+        else:
+            rows = np.arange(len(self.names))
+        lats, lons = self.lats[rows], self.lons[rows]
+        mask = (lats >= lat_min) & (lats <= lat_max) & (lons >= lon_min) & (lons <= lon_max)
+        mask &= self._allowed_mask(rows, allowed)
+        return [self.names[row] for row in rows[mask]]
+
+    def within_radius(self, lat, lon, radius_km, allowed=None):
+        """
+        Huts within a great-circle distance of a point
+        Args:
+            lat, lon: Centre of the search
+            radius_km: Search radius in kilometres
+            allowed: Optional set of names to restrict the result to
+        Returns:
+            List of (hut name, distance in km) tuples, nearest first
+        """
+        self._ensure_built()
+        lat_delta = radius_km / KM_PER_DEGREE
+        lat_min, lat_max = max(lat - lat_delta, -90.0), min(lat + lat_delta, 90.0)
+        cos_lat = math.cos(math.radians(max(abs(lat_min), abs(lat_max))))
+        if cos_lat < 1e-6 or radius_km / (KM_PER_DEGREE * cos_lat) >= 180:
+            rows = np.arange(len(self.names))  # Near a pole or huge radius: every longitude qualifies
+        else:
+            lon_delta = radius_km / (KM_PER_DEGREE * cos_lat)
+            rows = self._rows_in_cells(lat_min, lat_max, lon - lon_delta, lon + lon_delta)
+        rows = rows[self._allowed_mask(rows, allowed)]
+        distances = haversine_km(lat, lon, self.lats[rows], self.lons[rows])
+        inside = distances <= radius_km
+        rows, distances = rows[inside], distances[inside]
+        order = np.argsort(distances, kind='stable')
+        return [(self.names[row], float(distance)) for row, distance in zip(rows[order], distances[order])]
+
+    def nearest(self, lat, lon, k=5, allowed=None, start_radius_km=10.0):
+        """
+        The k huts nearest to a point
+        Args:
+            lat, lon: Point to search from
+            k: Number of huts to return
+            allowed: Optional set of names to restrict the result to
+            start_radius_km: Radius of the first search ring; doubled until k huts are found
+        Returns:
+            List of (hut name, distance in km) tuples, nearest first
+        """
+        self._ensure_built()
+        radius = start_radius_km
+        while True:
+            found = self.within_radius(lat, lon, radius, allowed)
+            # Every hut within the radius is found, so once there are k the k nearest are among them
+            if len(found) >= k or radius >= math.pi * EARTH_RADIUS_KM:
+                return found[:k]
+            radius *= 2
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
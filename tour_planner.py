@@ -0,0 +1,197 @@
+import heapq
+from datetime import date, timedelta
+
+import numpy as np
+
+from availability_matrix import to_ordinal
+
+
+class TourItinerary:
+    """One multi-day tour: a hut for every night, starting on start_date"""
+
+    def __init__(self, start_date, hut_names, hop_distances_km, places):
+        """
+        Args:
+            start_date: datetime.date of the first night
+            hut_names: Name of the hut for every night
+            hop_distances_km: Distance between consecutive huts (one less than the number of nights)
+            places: Free places of every night's hut on that night
+        """
+        self.start_date = start_date
+        self.hut_names = hut_names
+        self.hop_distances_km = hop_distances_km
+        self.places = places
+        self.total_distance_km = sum(hop_distances_km)
+        self.huts = []  # Hut objects, filled in by HutCollection.plan_tours
+
+    @property
+    def dates(self):
+        """Date of every night"""
+        return [self.start_date + timedelta(days=night) for night in range(len(self.hut_names))]
+
+    @property
+    def min_places(self):
+        """Fewest free places on any night of the tour"""
+        return min(self.places)
+
+    def __str__(self):
+        stops = " -> ".join(f"{name} ({day.isoformat()})" for name, day in zip(self.hut_names, self.dates))
+        return f"{stops} - {self.total_distance_km:.1f} km"
+
+
+class TourPlanner:
+    """
+    Branch-and-bound search for hut-to-hut tours.
+
+    Neighbor lists come from the spatial index, and per-hut availability
+    bitmaps (bit t set when the party fits on day t) from the availability
+    matrix. A backward pass over the bitmaps marks, for every night of the
+    tour, the days on which a hut can still be part of a complete tour, so the
+    depth-first search never enters a dead end. Partial tours longer than the
+    best tours found so far are pruned.
+    """
+
+    def __init__(self, spatial_index, availability_matrix):
+        """
+        Args:
+            spatial_index: SpatialIndex over the collection's huts
+            availability_matrix: AvailabilityMatrix over the same huts
+        """
+        self.spatial_index = spatial_index
+        self.availability_matrix = availability_matrix
+        self._neighbor_cache = {}  # (max_distance_km, index version) -> neighbor lists
+
+    def _neighbors(self, max_distance_km):
+        """Neighbors of every located hut within max_distance_km, nearest first"""
+        index = self.spatial_index
+        index._ensure_built()
+        key = (max_distance_km, index.version)
+        if key not in self._neighbor_cache:
+            self._neighbor_cache = {key: {
+                name: [(other, km) for other, km in index.within_radius(lat, lon, max_distance_km) if other != name]
+                for name, lat, lon in zip(index.names, index.lats.tolist(), index.lons.tolist())
+            }}
+        return self._neighbor_cache[key]
+
+    def _availability_bitmaps(self, names, first, span, party_size):
+        """
+        Pack which days every hut can take the party into integers
+        Returns:
+            Tuple (dict name -> bitmap with bit t for day first + t, dict name -> places array)
+        """
+        matrix = self.availability_matrix
+        window = matrix.window_minimum(date.fromordinal(first), date.fromordinal(first + span - 1), 1)
+        bitmaps, places = {}, {}
+        for name in names:
+            row = matrix.row_of.get(name)
+            if row is None or row >= window.shape[0]:
+                continue
+            fits = window[row] >= party_size
+            if not fits.any():
+                continue
+            bitmaps[name] = int.from_bytes(np.packbits(fits, bitorder='little').tobytes(), 'little')
+            places[name] = window[row]
+        return bitmaps, places
+
+    def plan(self, start_names, first_start, last_start, nights, party_size=1, max_distance_km=15.0,
+             limit=10, per_date_limit=3):
+        """
+        Find the shortest tours
+        Args:
+            start_names: Names of the huts a tour may start at
+            first_start: Earliest first night (YYYY-MM-DD string or datetime.date)
+            last_start: Latest first night, inclusive
+            nights: Number of nights, i.e. huts, in the tour
+            party_size: Places needed every night
+            max_distance_km: Maximum great-circle distance between consecutive huts
+            limit: Number of tours to return
+            per_date_limit: Maximum number of tours starting on the same date
+        Returns:
+            List of TourItinerary, shortest total distance first
+        """
+        first = to_ordinal(first_start)
+        starts = to_ordinal(last_start) - first + 1
+        if starts <= 0 or nights < 1:
+            return []
+        span = starts + nights - 1
+
+        neighbors = self._neighbors(max_distance_km)
+        bitmaps, places = self._availability_bitmaps(neighbors, first, span, party_size)
+        neighbors = {name: [(other, km) for other, km in nbrs if other in bitmaps]
+                     for name, nbrs in neighbors.items() if name in bitmaps}
+
+        # feasible[k][hut] has bit t set if a tour can stay at hut on day t as its night k
+        # and still find a hut for every later night (revisits are ignored, so this only prunes)
+        feasible = [None] * nights
+        feasible[-1] = dict(bitmaps)
+        for night in range(nights - 2, -1, -1):
+            later = feasible[night + 1]
+            current = {}
+            for name, nbrs in neighbors.items():
+                reachable = 0
+                for other, _ in nbrs:
+                    reachable |= later.get(other, 0)
+                days = bitmaps[name] & (reachable >> 1)
+                if days:
+                    current[name] = days
+            feasible[night] = current
+
+        best = []  # Heap of the best tours overall as (-total km, -first day, sequence, tour)
+        sequence = 0
+        for start_day in range(starts):
+            found = []  # Heap of the best tours for this start date, worst on top
+            for start_name in start_names:
+                if not feasible[0].get(start_name, 0) >> start_day & 1:
+                    continue
+                for hut_names, hops in self._search(start_name, start_day, nights, neighbors, feasible, found,
+                                                    per_date_limit, best, limit):
+                    sequence += 1
+                    tour = TourItinerary(date.fromordinal(first + start_day), hut_names, hops,
+                                         [int(places[name][start_day + night]) for night, name in enumerate(hut_names)])
+                    entry = (-tour.total_distance_km, sequence, tour)
+                    if len(found) < per_date_limit:
+                        heapq.heappush(found, entry)
+                    else:
+                        heapq.heappushpop(found, entry)
+            for total, _, tour in found:
+                entry = (total, -start_day, sequence, tour)
+                sequence += 1
+                if len(best) < limit:
+                    heapq.heappush(best, entry)
+                else:
+                    heapq.heappushpop(best, entry)
+        return [tour for _, _, _, tour in sorted(best, key=lambda entry: (-entry[0], -entry[1]))]
+
+    def _search(self, start_name, start_day, nights, neighbors, feasible, found, per_date_limit, best, limit):
+        """Depth-first search for tours from one hut and day, yielding (hut names, hop distances)"""
+        path = [start_name]
+        hops = []
+
+        def bound():
+            # Tours at least this long cannot enter either list of best tours
+            bounds = []
+            if len(found) >= per_date_limit:
+                bounds.append(-found[0][0])
+            if len(best) >= limit:
+                bounds.append(-best[0][0])
+            return min(bounds) if bounds else float('inf')
+
+        def extend(total):
+            night = len(path)
+            if night == nights:
+                yield list(path), list(hops)
+                return
+            day = start_day + night
+            later = feasible[night]
+            for other, km in neighbors[path[-1]]:
+                if total + km >= bound():
+                    break  # Neighbors are sorted by distance, so the rest are longer still
+                if other in path or not later.get(other, 0) >> day & 1:
+                    continue
+                path.append(other)
+                hops.append(km)
+                yield from extend(total + km)
+                path.pop()
+                hops.pop()
+
+        yield from extend(0.0)
@@ -1,15 +1,13 @@
 #!/usr/bin/env python3
 import os
 import time
-import json
-import pickle
 from datetime import datetime
 from pathlib import Path
 from hut_collection import HutCollection
 
 # Use the same constants as in your app
 DATA_DIR = "data"
-HUT_DATA_FILE = os.path.join(DATA_DIR, "hut_data.json")
+HUT_STORE_FILE = HutCollection.cache_file
 
 def ensure_data_dir():
     """Ensure the data directory exists"""
@@ -32,11 +30,8 @@ def update_hut_data():
         # Save the data
         ensure_data_dir()
         
-        # Save the hut data
-        with open(HUT_DATA_FILE, 'wb') as f:
-            pickle.dump(hut_collection, f)
-            
-        return True
+        # Save the hut data (written to a temporary file and renamed, so readers never see a partial store)
+        return hut_collection.save(HUT_STORE_FILE)
         
     except Exception as e:
         import traceback